@@ -0,0 +1,1350 @@
+"""Benchmarks de desempenho do simulador (uso: python benchmarks.py --help)"""
+import argparse
+import asyncio
+import gc
+import io
+import json
+import os
+import pickle
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.graph_objects as go
+import pyarrow as pa
+
+import busca
+import catalogo
+import dosimetria
+import graficos
+import instrumentacao
+import intervalos
+import lote
+import progressao
+
+PALAVRAS_DESCRICAO = [
+    'matar', 'alguém', 'subtrair', 'coisa', 'alheia', 'móvel', 'ofender', 'integridade',
+    'corporal', 'saúde', 'outrem', 'violência', 'grave', 'ameaça', 'fraude', 'documento',
+    'público', 'falsificar', 'vantagem', 'indevida', 'funcionário', 'lesão', 'homicídio',
+    'roubo', 'furto', 'estelionato', 'apropriação', 'receptação', 'patrimônio', 'dano'
+]
+TIPOS_PENAIS = [
+    'Crime Base (Caput) - Reclusão', 'Crime Base (Caput) - Detenção',
+    'Qualificadora - Reclusão', 'Forma Privilegiada - Detenção', None
+]
+UNIDADES = ['ano', 'mês', 'dia', None]
+ROTULOS_CASOS = {
+    'atenuantes': ['Menor de 21 anos na data do fato', 'Confissão espontânea perante autoridade',
+                   'Reparação do dano antes do julgamento'],
+    'agravantes': ['Reincidência', 'Motivo fútil ou torpe', 'Emprego de veneno, fogo, explosivo, tortura'],
+    'majorantes': ['Uso de arma (1/6 a 1/2)', 'Concurso de 2+ pessoas (1/4 a 1/2)'],
+    'minorantes': ['Arrependimento posterior (1/6 a 1/3)']
+}
+
+
+def gerar_catalogo_sintetico(n_linhas, semente=0):
+    """Gera um DataFrame no formato do CSV de crimes com n_linhas linhas"""
+    rng = np.random.default_rng(semente)
+    artigos = rng.integers(1, 360, n_linhas)
+    paragrafos = rng.integers(0, 6, n_linhas)
+    artigo_base = np.char.add('Art. ', artigos.astype(str))
+    artigo_completo = np.where(
+        paragrafos > 0,
+        np.char.add(np.char.add(artigo_base, ', §'), paragrafos.astype(str)),
+        artigo_base
+    )
+    # Vocabulário com frequências decrescentes (lei de Zipf), como em textos legais reais
+    vocabulario = np.array(PALAVRAS_DESCRICAO + [f'termo{i}' for i in range(5_000)])
+    posicoes = np.minimum(rng.zipf(1.3, (n_linhas, 12)) - 1, len(vocabulario) - 1)
+    palavras = vocabulario[posicoes]
+    descricoes = [' '.join(linha) for linha in palavras]
+    unidades = np.array(UNIDADES, dtype=object)
+    unidade_min = unidades[rng.integers(0, len(UNIDADES), n_linhas)]
+    pena_min = rng.integers(1, 13, n_linhas).astype(float)
+    pena_max = pena_min * rng.integers(2, 6, n_linhas)
+    pena_max[rng.random(n_linhas) < 0.02] = np.nan
+    return pd.DataFrame({
+        'Artigo_Base': artigo_base,
+        'Artigo_Completo': np.where(rng.random(n_linhas) < 0.05, None, artigo_completo),
+        'Descricao_Crime': descricoes,
+        'Pena_Minima_Valor': pena_min,
+        'Pena_Minima_Unidade': unidade_min,
+        'Pena_Maxima_Valor': pena_max,
+        'Pena_Maxima_Unidade': unidade_min,
+        'Tipo_Penal_Estrutural': np.array(TIPOS_PENAIS, dtype=object)[rng.integers(0, len(TIPOS_PENAIS), n_linhas)]
+    })
+
+
+def processar_dados_crimes_referencia(df):
+    """Implementação original linha a linha, mantida como referência de desempenho"""
+    if df.empty:
+        return {}
+
+    crimes_dict = {}
+
+    for idx, row in df.iterrows():
+        artigo_base = row['Artigo_Base'] if pd.notna(row['Artigo_Base']) else ''
+        artigo_completo = row['Artigo_Completo'] if pd.notna(row['Artigo_Completo']) else artigo_base
+        descricao = row['Descricao_Crime'] if pd.notna(row['Descricao_Crime']) else ''
+        pena_min_valor = row['Pena_Minima_Valor'] if pd.notna(row['Pena_Minima_Valor']) else 0
+        pena_min_unidade = row['Pena_Minima_Unidade'] if pd.notna(row['Pena_Minima_Unidade']) else 'mês'
+        pena_max_valor = row['Pena_Maxima_Valor'] if pd.notna(row['Pena_Maxima_Valor']) else 0
+        pena_max_unidade = row['Pena_Maxima_Unidade'] if pd.notna(row['Pena_Maxima_Unidade']) else 'mês'
+        tipo_penal = row['Tipo_Penal_Estrutural'] if pd.notna(row['Tipo_Penal_Estrutural']) else 'Crime Base (Caput)'
+
+        if pena_min_unidade == 'mês':
+            pena_min_anos = pena_min_valor / 12
+        elif pena_min_unidade == 'dia':
+            pena_min_anos = pena_min_valor / 360
+        else:
+            pena_min_anos = pena_min_valor
+
+        if pena_max_unidade == 'mês':
+            pena_max_anos = pena_max_valor / 12
+        elif pena_max_unidade == 'dia':
+            pena_max_anos = pena_max_valor / 360
+        else:
+            pena_max_anos = pena_max_valor
+
+        if pd.notna(artigo_completo) and pd.notna(descricao):
+            chave = f"{artigo_completo} - {descricao[:80]}..."
+            crimes_dict[chave] = {
+                'artigo': artigo_completo,
+                'artigo_base': artigo_base,
+                'descricao_completa': descricao,
+                'pena_min': pena_min_anos,
+                'pena_max': pena_max_anos,
+                'tipo_penal': tipo_penal,
+                'pena_min_original': pena_min_valor,
+                'pena_max_original': pena_max_valor,
+                'unidade_original': pena_min_unidade
+            }
+
+    return crimes_dict
+
+
+def cronometrar(funcao, *args, repeticoes=3):
+    """Retorna o menor tempo (s) entre algumas execuções e o último resultado"""
+    melhor = float('inf')
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def tipos_campos(crimes_dict):
+    """Tipo de cada campo de cada crime (0 e 0.0 são iguais na comparação de valores)"""
+    return [[type(valor) for valor in crime.values()] for crime in crimes_dict.values()]
+
+
+def bench_ingestao(tamanhos, repeticoes):
+    """Compara a ingestão linha a linha com a ingestão vetorizada"""
+    print(f"{'linhas':>10} {'iterrows (s)':>14} {'vetorizado (s)':>16} {'ganho':>8}")
+    for n in tamanhos:
+        df = gerar_catalogo_sintetico(n)
+        t_ref, esperado = cronometrar(processar_dados_crimes_referencia, df, repeticoes=1)
+        t_vet, obtido = cronometrar(catalogo.processar_dados_crimes, df, repeticoes=repeticoes)
+        if list(esperado.items()) != list(obtido.items()) or tipos_campos(esperado) != tipos_campos(obtido):
+            raise AssertionError(f"crimes_dict divergente para {n} linhas")
+        print(f"{n:>10} {t_ref:>14.3f} {t_vet:>16.4f} {t_ref / t_vet:>7.1f}x")
+
+
+def gerar_casos_sinteticos(n_crimes, n_casos, semente=0):
+    """Gera arrays de casos (ids de crime, circunstância e contagens) para o cálculo em lote"""
+    rng = np.random.default_rng(semente)
+    return {
+        'crime_ids': rng.integers(0, n_crimes, n_casos),
+        'circunstancias': rng.integers(0, len(dosimetria.CIRCUNSTANCIAS), n_casos),
+        'n_atenuantes': rng.integers(0, 3, n_casos),
+        'n_agravantes': rng.integers(0, 3, n_casos),
+        'n_majorantes': rng.integers(0, 2, n_casos),
+        'n_minorantes': rng.integers(0, 2, n_casos),
+        'reincidente': rng.random(n_casos) < 0.3
+    }
+
+
+def gerar_arquivo_casos(chaves, n_casos, semente=0):
+    """Gera um DataFrame no formato do arquivo de casos de lote.py"""
+    rng = np.random.default_rng(semente)
+    casos = pd.DataFrame({
+        'crime': np.array(chaves, dtype=object)[rng.integers(0, len(chaves), n_casos)],
+        'circunstancia': np.array(dosimetria.CIRCUNSTANCIAS, dtype=object)[rng.integers(0, 3, n_casos)]
+    })
+    for coluna, rotulos in ROTULOS_CASOS.items():
+        combinacoes = np.array([';'.join(rotulos[:k]) for k in range(len(rotulos) + 1)], dtype=object)
+        casos[coluna] = combinacoes[rng.integers(0, len(combinacoes), n_casos)]
+    return casos
+
+
+def bench_dosimetria(n_casos, repeticoes):
+    """Compara o cálculo individual (um caso por chamada) com o cálculo em lote"""
+    crimes = catalogo.processar_dados_crimes(gerar_catalogo_sintetico(10_000))
+    registros = list(crimes.values())
+    tabela = dosimetria.tabela_crimes(crimes)
+    casos = gerar_casos_sinteticos(len(registros), n_casos)
+
+    def individual(limite):
+        for k in range(limite):
+            dosimetria.calcular_dosimetria(
+                registros[casos['crime_ids'][k]], dosimetria.CIRCUNSTANCIAS[casos['circunstancias'][k]],
+                casos['n_atenuantes'][k], casos['n_agravantes'][k], casos['n_majorantes'][k],
+                casos['n_minorantes'][k], casos['reincidente'][k])
+
+    amostra = min(n_casos, 20_000)
+    t_ind, _ = cronometrar(individual, amostra, repeticoes=1)
+    t_lote, _ = cronometrar(lambda: dosimetria.calcular_lote(tabela, **casos), repeticoes=repeticoes)
+    print(f"individual: {amostra / t_ind:>14,.0f} casos/s")
+    print(f"lote:       {n_casos / t_lote:>14,.0f} casos/s ({n_casos:,} casos em {t_lote:.3f} s)")
+
+
+def calcular_lote_float_referencia(tabela, crime_ids, circunstancias, n_atenuantes, n_agravantes, n_majorantes,
+                                   n_minorantes, reincidente):
+    """Cálculo em lote anterior, em anos float64, mantido como referência de exatidão e desempenho
+
+    tabela tem pena_min e pena_max em anos (float64). Retorna pena_final (anos), regime e pode_substituir.
+    """
+    min_pena = tabela['pena_min'][crime_ids]
+    max_pena = tabela['pena_max'][crime_ids]
+    pena_base_ajustada = min_pena * (1 + np.array([0, 0.2, 0.4])[circunstancias])
+    fracao_16 = pena_base_ajustada * (1/6)
+    fracao_14 = pena_base_ajustada * (1/4)
+
+    def reduzir(pena, reducao, quantidade):
+        for i in range(int(quantidade.max(initial=0))):
+            ativo = quantidade > i
+            cabe = (pena - reducao) >= min_pena
+            pena = np.where(ativo & cabe, pena - reducao, pena)
+            pena = np.where(ativo & ~cabe & ((pena - min_pena) > 0), min_pena, pena)
+        return pena
+
+    pena = reduzir(pena_base_ajustada, fracao_16, n_atenuantes)
+    pena = pena + n_agravantes * fracao_16 + n_majorantes * fracao_14
+    pena = reduzir(pena, fracao_14, n_minorantes)
+    pena_final = np.where(pena < min_pena, min_pena, np.maximum(min_pena, np.minimum(max_pena, pena)))
+
+    tipo_pena = tabela['tipo_pena'][crime_ids]
+    faixa = np.where(pena_final > 8, dosimetria.FECHADO,
+                     np.where(pena_final > 4, dosimetria.SEMIABERTO, dosimetria.ABERTO)).astype(np.int8)
+    regime_reclusao = faixa - (reincidente & (faixa > dosimetria.FECHADO))
+    regime_detencao = np.where(pena_final > 4, dosimetria.SEMIABERTO, dosimetria.ABERTO)
+    return {
+        'pena_final': pena_final,
+        'regime': np.where(tipo_pena == dosimetria.RECLUSAO, regime_reclusao, regime_detencao).astype(np.int8),
+        'pode_substituir': (pena_final <= 4) & ~tabela['violento'][crime_ids]
+    }
+
+
+def bench_ponto_fixo(n_casos, repeticoes):
+    """Cálculo em lote em ponto fixo (int32) x float64: vazão, memória e desfechos que mudam
+
+    Os casos de fronteira (4 e 8 anos) ficam em tests/test_dosimetria.py.
+    """
+    crimes = catalogo.processar_dados_crimes(gerar_catalogo_sintetico(10_000))
+    unidades = dosimetria.tabela_crimes(crimes)
+    anos = dict(unidades, pena_min=dosimetria.em_anos(unidades['pena_min']),
+                pena_max=dosimetria.em_anos(unidades['pena_max']))
+    casos = gerar_casos_sinteticos(len(crimes), n_casos)
+
+    print(f"{n_casos:,} casos")
+    print(f"{'representação':<14} {'casos/s':>14} {'pena_final (MB)':>16} {'pico (MB)':>10}")
+    resultados = {}
+    for rotulo, calcular, tabela in (('float64', calcular_lote_float_referencia, anos),
+                                     ('ponto fixo', dosimetria.calcular_lote, unidades)):
+        t, resultado = cronometrar(calcular, tabela, *casos.values(), repeticoes=repeticoes)
+        gc.collect()
+        tracemalloc.start()
+        calcular(tabela, *casos.values())
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        resultados[rotulo] = resultado
+        print(f"{rotulo:<14} {n_casos / t:>14,.0f} {resultado['pena_final'].nbytes / 1e6:>16.1f} {pico / 1e6:>10.1f}")
+
+    flutuante, exato = resultados['float64'], resultados['ponto fixo']
+    diferenca = np.abs(flutuante['pena_final'] - dosimetria.em_anos(exato['pena_final'])).max(initial=0)
+    print(f"maior diferença de pena final em relação ao float64: {diferenca * 360 * 24 * 60:.2f} minutos")
+    regimes = int((flutuante['regime'] != exato['regime']).sum())
+    substituicoes = int((flutuante['pode_substituir'] != exato['pode_substituir']).sum())
+    print(f"desfechos que mudam em relação ao float64: regime {regimes:,}, substituição {substituicoes:,}")
+
+
+def bench_paralelo(n_casos, processos, tamanho_bloco):
+    """Vazão de lote.py com diferentes quantidades de processos"""
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_catalogo = os.path.join(pasta, 'catalogo.csv')
+        caminho_casos = os.path.join(pasta, 'casos.csv')
+        caminho_saida = os.path.join(pasta, 'saida.csv')
+        df = gerar_catalogo_sintetico(10_000)
+        df.to_csv(caminho_catalogo, index=False)
+        chaves = list(catalogo.processar_dados_crimes(df))
+        gerar_arquivo_casos(chaves, n_casos).to_csv(caminho_casos, index=False)
+
+        print(f"CPUs disponíveis: {os.cpu_count()}")
+        print(f"{'processos':>10} {'tempo (s)':>10} {'casos/s':>12} {'ganho':>7}")
+        base = None
+        for n in processos:
+            t, _ = cronometrar(lote.processar_arquivo, caminho_catalogo, caminho_casos, caminho_saida,
+                               tamanho_bloco, n, repeticoes=1)
+            base = base or t
+            print(f"{n:>10} {t:>10.2f} {n_casos / t:>12,.0f} {base / t:>6.2f}x")
+
+
+def bench_relatorios(n_casos, processos, tamanho_bloco):
+    """Relatórios por caso (lote.py relatorios): páginas/s e tamanho da saída em ZIP e em HTML único"""
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_catalogo = os.path.join(pasta, 'catalogo.csv')
+        caminho_casos = os.path.join(pasta, 'casos.csv')
+        df = gerar_catalogo_sintetico(10_000)
+        df.to_csv(caminho_catalogo, index=False)
+        chaves = list(catalogo.processar_dados_crimes(df))
+        gerar_arquivo_casos(chaves, n_casos).to_csv(caminho_casos, index=False)
+
+        print(f"CPUs disponíveis: {os.cpu_count()}")
+        print(f"{'saída':<6} {'processos':>10} {'tempo (s)':>10} {'páginas/s':>10} {'MB':>8}")
+        for extensao in ('zip', 'html'):
+            caminho_saida = os.path.join(pasta, f'relatorios.{extensao}')
+            for n in processos:
+                t, total = cronometrar(lote.gerar_relatorios, caminho_catalogo, caminho_casos, caminho_saida,
+                                       tamanho_bloco, n, repeticoes=1)
+                if total != n_casos:
+                    raise AssertionError(f"{total} relatórios para {n_casos} casos")
+                print(f"{extensao:<6} {n:>10} {t:>10.2f} {total / t:>10,.0f} "
+                      f"{os.path.getsize(caminho_saida) / 1e6:>8.1f}")
+
+
+def bench_painel(tamanhos, limite_bruto, tamanho_bloco=1_000_000):
+    """Painel de resultados em lote: contagens pré-agregadas x histograma com um ponto por caso
+
+    Os casos são calculados e agregados em blocos (a agregação cresce com a quantidade de casos);
+    montar e serializar o painel depende só do tamanho das contagens. Os tamanhos não incluem o
+    plotly.js.
+    """
+    crimes = catalogo.processar_dados_crimes(gerar_catalogo_sintetico(10_000))
+    tabela = dosimetria.tabela_crimes(crimes)
+    print(f"{'casos':>12} {'agregação (s)':>14} {'painel (s)':>11} {'painel (MB)':>12} "
+          f"{'bruto (s)':>10} {'bruto (MB)':>11}")
+    for n in tamanhos:
+        agregados = []
+        t_agregacao = 0
+        t_bruto = tamanho_bruto = None
+        for semente, inicio in enumerate(range(0, n, tamanho_bloco)):
+            casos = gerar_casos_sinteticos(len(crimes), min(tamanho_bloco, n - inicio), semente)
+            resultado = dosimetria.calcular_lote(tabela, **casos)
+            t, agregado = cronometrar(lote.agregar_resultados, resultado['pena_final'], resultado['tipo_pena'],
+                                      resultado['regime'], resultado['pode_substituir'],
+                                      resultado['aplicou_sumula_231'], repeticoes=1)
+            t_agregacao += t
+            agregados.append(agregado)
+            if n <= limite_bruto:
+                figura = lambda: go.Figure(go.Histogram(x=dosimetria.em_anos(resultado['pena_final']))).to_html(
+                    full_html=False, include_plotlyjs=False)
+                t_bruto, pagina = cronometrar(figura, repeticoes=1)
+                tamanho_bruto = len(pagina) / 1e6
+        agregado = lote.somar_agregados(agregados)
+        if agregado['penas'].sum() != n or agregado['regimes'].sum() != n:
+            raise AssertionError(f"contagens do painel não somam {n} casos")
+        t_painel, pagina = cronometrar(lote.html_painel, agregado, "Painel", False, repeticoes=3)
+        bruto = "—" if t_bruto is None else f"{t_bruto:>10.2f} {tamanho_bruto:>11.2f}"
+        print(f"{n:>12,} {t_agregacao:>14.3f} {t_painel:>11.3f} {len(pagina) / 1e6:>12.2f} {bruto:>10}")
+
+
+def projetar_referencia(regime, pena_final, hediondo, inicio, meses):
+    """Ocupação mensal pessoa a pessoa e mês a mês (referência para progressao.ocupacao_mensal)"""
+    ocupacao = np.zeros((len(dosimetria.REGIMES), meses), dtype=np.int64)
+    for r, pena, grave, comeco in zip(regime.tolist(), pena_final.tolist(), hediondo.tolist(), inicio.tolist()):
+        numerador, denominador = progressao.FRACAO_HEDIONDO if grave else progressao.FRACAO_COMUM
+        datas = [comeco * progressao.UNIDADES_POR_MES]
+        restante = pena
+        for regime_atual in range(len(dosimetria.REGIMES) - 1):
+            permanencia = -(-restante * numerador // denominador) if r <= regime_atual else 0
+            datas.append(datas[-1] + permanencia)
+            restante -= permanencia
+        datas.append(datas[0] + pena)
+        for mes in range(meses):
+            instante = mes * progressao.UNIDADES_POR_MES
+            for codigo in range(len(dosimetria.REGIMES)):
+                if datas[codigo] <= instante < datas[codigo + 1]:
+                    ocupacao[codigo, mes] += 1
+    return ocupacao
+
+
+def bench_progressao(tamanhos, meses, repeticoes, amostra=2_000):
+    """Progressão de regime e ocupação mensal de coortes: progressao.projetar + ocupacao_mensal
+
+    Regime e pena final vêm de calcular_lote; 10% dos casos são hediondos e o início do
+    cumprimento é sorteado nos primeiros 5 anos. Uma amostra é conferida com a referência
+    pessoa a pessoa, cuja vazão é exibida para comparação.
+    """
+    crimes = catalogo.processar_dados_crimes(gerar_catalogo_sintetico(10_000))
+    tabela = dosimetria.tabela_crimes(crimes)
+    print(f"{'pessoas':>12} {'projeção (ms)':>14} {'ocupação (ms)':>14} {'total (ms)':>11} {'pessoas/s':>14}")
+    for n in tamanhos:
+        resultado = dosimetria.calcular_lote(tabela, **gerar_casos_sinteticos(len(crimes), n))
+        rng = np.random.default_rng(n)
+        hediondo = rng.random(n) < 0.1
+        inicio = rng.integers(0, 60, n)
+        t_projecao, projecao = cronometrar(progressao.projetar, resultado['regime'], resultado['pena_final'],
+                                           hediondo, inicio, repeticoes=repeticoes)
+        t_ocupacao, ocupacao = cronometrar(progressao.ocupacao_mensal, projecao, meses, repeticoes=repeticoes)
+        if ocupacao[:, 0].sum() != (inicio == 0).sum() - (resultado['pena_final'][inicio == 0] == 0).sum():
+            raise AssertionError("ocupação do primeiro mês diverge das pessoas que começam no mês 0")
+        total = t_projecao + t_ocupacao
+        print(f"{n:>12,} {t_projecao * 1000:>14.1f} {t_ocupacao * 1000:>14.1f} {total * 1000:>11.1f} {n / total:>14,.0f}")
+
+    k = min(amostra, n)
+    t_referencia, esperado = cronometrar(projetar_referencia, resultado['regime'][:k], resultado['pena_final'][:k],
+                                         hediondo[:k], inicio[:k], meses, repeticoes=1)
+    obtido = progressao.ocupacao_mensal(progressao.projetar(resultado['regime'][:k], resultado['pena_final'][:k],
+                                                            hediondo[:k], inicio[:k]), meses)
+    if not np.array_equal(esperado, obtido):
+        raise AssertionError("ocupação diverge da referência pessoa a pessoa")
+    print(f"referência pessoa a pessoa ({k:,} pessoas): {k / t_referencia:,.0f} pessoas/s")
+
+
+def gerar_concurso_sintetico(n_crimes, n_linhas, max_crimes_caso=6, semente=0):
+    """Código do caso (1 a max_crimes_caso crimes consecutivos) e do concurso de cada crime"""
+    rng = np.random.default_rng(semente)
+    tamanhos = rng.integers(1, max_crimes_caso + 1, n_linhas)
+    casos = np.repeat(np.arange(n_linhas), tamanhos)[:n_linhas]
+    concurso = rng.integers(0, len(dosimetria.CONCURSOS), n_linhas)[casos]
+    return casos, concurso
+
+
+def concurso_referencia(crimes, casos, concurso, entradas):
+    """Combinação caso a caso com calcular_pena, determinar_regime e analisar_substituicao (referência)"""
+    registros = list(crimes.values())
+    por_caso = {}
+    for k, codigo in enumerate(casos.tolist()):
+        info = registros[entradas['crime_ids'][k]]
+        pena = dosimetria.calcular_pena(
+            info['pena_min'], info['pena_max'], dosimetria.CIRCUNSTANCIAS[entradas['circunstancias'][k]],
+            entradas['n_atenuantes'][k], entradas['n_agravantes'][k], entradas['n_majorantes'][k],
+            entradas['n_minorantes'][k])['pena_final_unidades']
+        por_caso.setdefault(codigo, []).append(
+            (pena, dosimetria.classificar_tipo_pena(info['tipo_penal']), dosimetria.violento_do_crime(info),
+             bool(entradas['reincidente'][k]), int(concurso[k])))
+    resultado = []
+    for codigo, itens in por_caso.items():
+        penas = [item[0] for item in itens]
+        tipo = min(item[1] for item in itens)
+        violento = any(item[2] for item in itens)
+        reincidente = any(item[3] for item in itens)
+        pena = sum(penas)
+        if itens[0][4] != dosimetria.MATERIAL and len(penas) > 1:
+            fracoes = dosimetria.EXASPERACAO[itens[0][4]]
+            numerador, denominador = fracoes[min(len(penas) - 2, len(fracoes) - 1)]
+            pena = min(max(penas) + max(penas) * numerador // denominador, pena)
+        regime = dosimetria.determinar_regime(pena, reincidente, tipo)[0]
+        resultado.append((codigo, len(penas), pena, tipo, dosimetria.REGIMES.index(regime),
+                          dosimetria.analisar_substituicao(pena, reincidente, violento)[0]))
+    return resultado
+
+
+def bench_concurso(tamanhos, repeticoes, n_arquivo, amostra=5_000):
+    """Concurso de crimes (Arts. 69 a 71): calcular_concurso_lote em memória e lote.py concurso em arquivo
+
+    Os casos têm de 1 a 6 crimes com concurso sorteado. Uma amostra é conferida com a
+    combinação caso a caso, cuja vazão é exibida para comparação.
+    """
+    df = gerar_catalogo_sintetico(10_000)
+    crimes = catalogo.processar_dados_crimes(df)
+    tabela = dosimetria.tabela_crimes(crimes)
+    print(f"{'crimes':>12} {'casos':>10} {'tempo (ms)':>11} {'crimes/s':>14}")
+    for n in tamanhos:
+        entradas = gerar_casos_sinteticos(len(crimes), n)
+        casos, concurso = gerar_concurso_sintetico(len(crimes), n)
+        t, resultado = cronometrar(dosimetria.calcular_concurso_lote, tabela, casos, concurso, *entradas.values(),
+                                   repeticoes=repeticoes)
+        print(f"{n:>12,} {len(resultado['caso']):>10,} {t * 1000:>11.1f} {n / t:>14,.0f}")
+
+    k = min(amostra, n)
+    parciais = {nome: valores[:k] for nome, valores in entradas.items()}
+    t_referencia, esperado = cronometrar(concurso_referencia, crimes, casos[:k], concurso[:k], parciais, repeticoes=1)
+    obtido = dosimetria.calcular_concurso_lote(tabela, casos[:k], concurso[:k], *parciais.values())
+    obtido = list(zip(*(obtido[nome].tolist() for nome in
+                        ('caso', 'crimes', 'pena_final', 'tipo_pena', 'regime', 'pode_substituir'))))
+    if obtido != esperado:
+        raise AssertionError("concurso diverge da combinação caso a caso")
+    exasperados = sum(1 for _, quantidade, *_ in esperado if quantidade > 1)
+    print(f"referência caso a caso ({k:,} crimes, {exasperados:,} casos com mais de um crime): "
+          f"{k / t_referencia:,.0f} crimes/s")
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_catalogo = os.path.join(pasta, 'catalogo.csv')
+        caminho_casos = os.path.join(pasta, 'casos.csv')
+        df.to_csv(caminho_catalogo, index=False)
+        casos, concurso = gerar_concurso_sintetico(len(crimes), n_arquivo)
+        arquivo = gerar_arquivo_casos(list(crimes), n_arquivo)
+        arquivo.insert(0, 'concurso', np.array(dosimetria.CONCURSOS, dtype=object)[concurso])
+        arquivo.insert(0, 'caso', casos)
+        arquivo.to_csv(caminho_casos, index=False)
+        t, (total, n_casos) = cronometrar(lote.processar_arquivo_concurso, caminho_catalogo, caminho_casos,
+                                          os.path.join(pasta, 'saida.csv'), repeticoes=1)
+        print(f"lote.py concurso: {total:,} crimes em {n_casos:,} casos em {t:.2f} s ({total / t:,.0f} crimes/s)")
+
+
+CONSULTAS_BUSCA = ['lesao', 'lesão corporal', 'Art. 121', '121', 'roubo furto', 'termo1234', 'homic']
+
+
+def bench_busca(n_linhas, repeticoes):
+    """Compara a varredura linear da sidebar com o IndiceBusca"""
+    crimes = catalogo.processar_dados_crimes(gerar_catalogo_sintetico(n_linhas))
+    t_indice, indice = cronometrar(busca.IndiceBusca.do_catalogo, crimes, repeticoes=1)
+    print(f"{len(crimes):,} crimes; índice construído em {t_indice:.2f} s")
+    print(f"{'consulta':<18} {'linear (ms)':>12} {'índice (ms)':>12} {'resultados':>11}")
+    for consulta in CONSULTAS_BUSCA:
+        t_linear, _ = cronometrar(
+            lambda: {k: v for k, v in crimes.items() if consulta.lower() in k.lower()}, repeticoes=repeticoes)
+        t_busca, posicoes = cronometrar(indice.buscar, consulta, repeticoes=repeticoes)
+        print(f"{consulta:<18} {t_linear * 1000:>12.2f} {t_busca * 1000:>12.3f} {len(posicoes):>11,}")
+
+
+def bench_inicializacao(tamanhos, repeticoes):
+    """Tempo até o app ficar interativo: upload do CSV x catálogo compilado mapeado em memória"""
+    print(f"{'linhas':>10} {'CSV (s)':>10} {'compilado (s)':>14} {'ganho':>7} {'CSV (MB)':>9} {'compilado (MB)':>15}")
+    with tempfile.TemporaryDirectory() as pasta:
+        for n in tamanhos:
+            conteudo = gerar_catalogo_sintetico(n).to_csv(index=False).encode('utf-8')
+            caminho = os.path.join(pasta, f'catalogo_{n}{catalogo.EXTENSAO_COMPILADO}')
+            catalogo.gravar_compilado(catalogo.compilar_catalogo(conteudo), caminho)
+            t_csv, _ = cronometrar(catalogo.Catalogo.do_csv, conteudo, repeticoes=repeticoes)
+            t_compilado, _ = cronometrar(catalogo.Catalogo.do_arquivo, caminho, repeticoes=repeticoes)
+            print(f"{n:>10,} {t_csv:>10.3f} {t_compilado:>14.3f} {t_csv / t_compilado:>6.1f}x "
+                  f"{len(conteudo) / 1e6:>9.1f} {os.path.getsize(caminho) / 1e6:>15.1f}")
+
+
+def editar_catalogo(df, n_edicoes, semente=0):
+    """Nova versão do CSV de crimes: n_edicoes penas alteradas e outras tantas linhas removidas e incluídas"""
+    rng = np.random.default_rng(semente)
+    df = df.copy()
+    alteradas = df.index[rng.choice(len(df), n_edicoes, replace=False)]
+    df.loc[alteradas, 'Pena_Maxima_Valor'] = df.loc[alteradas, 'Pena_Maxima_Valor'] + 1
+    df = df.drop(df.index[rng.choice(len(df), n_edicoes, replace=False)])
+    novas = gerar_catalogo_sintetico(n_edicoes, semente + 1)
+    novas['Artigo_Completo'] = [f'Art. {1000 + i}' for i in range(n_edicoes)]
+    meio = len(df) // 2
+    return pd.concat([df.iloc[:meio], novas, df.iloc[meio:]], ignore_index=True)
+
+
+def bench_atualizacao(tamanhos, edicoes, repeticoes):
+    """Nova versão do catálogo: reprocessamento completo x Catalogo.atualizar (só linhas que mudaram)"""
+    print(f"{'linhas':>10} {'edições':>8} {'completo (s)':>13} {'incremental (s)':>16} {'ganho':>7}")
+    for n in tamanhos:
+        df = gerar_catalogo_sintetico(n)
+        anterior = catalogo.Catalogo.do_csv(df.to_csv(index=False).encode('utf-8'))
+        for n_edicoes in edicoes:
+            conteudo = editar_catalogo(df, n_edicoes).to_csv(index=False).encode('utf-8')
+            t_completo, completo = cronometrar(catalogo.Catalogo.do_csv, conteudo, repeticoes=repeticoes)
+            t_incremental, atualizado = cronometrar(anterior.atualizar, conteudo, repeticoes=repeticoes)
+            if atualizado.chaves != completo.chaves or not np.array_equal(atualizado.hashes, completo.hashes):
+                raise AssertionError(f"versão incremental diverge da completa ({n} linhas, {n_edicoes} edições)")
+            for consulta in CONSULTAS_BUSCA:
+                if not np.array_equal(atualizado.indice_busca.buscar(consulta), completo.indice_busca.buscar(consulta)):
+                    raise AssertionError(f"busca por {consulta!r} diverge após a atualização")
+            if not np.array_equal(atualizado.com_pena_entre(1, 8), completo.com_pena_entre(1, 8)):
+                raise AssertionError("filtro por pena diverge após a atualização")
+            print(f"{n:>10,} {n_edicoes:>8,} {t_completo:>13.3f} {t_incremental:>16.3f} "
+                  f"{t_completo / t_incremental:>6.1f}x")
+
+
+def memoria_alocada():
+    """Bytes alocados pelo Python/NumPy (tracemalloc) e pelo pyarrow"""
+    return tracemalloc.get_traced_memory()[0] + pa.total_allocated_bytes()
+
+
+def bench_sessoes(n_linhas, n_sessoes):
+    """Memória por sessão: cópia do catálogo por sessão x catálogo compartilhado no processo"""
+    conteudo = gerar_catalogo_sintetico(n_linhas).to_csv(index=False).encode('utf-8')
+
+    def original(_):
+        # Upload mantido pela sessão, DataFrame lido por ela e cópia devolvida por st.cache_data
+        upload = bytearray(conteudo)
+        df = pd.read_csv(io.BytesIO(upload))
+        return upload, df, pickle.loads(pickle.dumps(catalogo.processar_dados_crimes(df)))
+
+    def upload_em_cache(compartilhado):
+        # Cada sessão ainda envia o CSV, mas recebe o catálogo em cache (st.cache_resource)
+        return bytearray(conteudo), compartilhado
+
+    def servidor(compartilhado):
+        return compartilhado
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'catalogo' + catalogo.EXTENSAO_COMPILADO)
+        catalogo.gravar_compilado(catalogo.compilar_catalogo(conteudo), caminho)
+        cenarios = [
+            ('cópia por sessão (cache_data)', lambda: None, original),
+            ('upload + catálogo em cache', lambda: catalogo.Catalogo.do_csv(conteudo), upload_em_cache),
+            ('catálogo do servidor (mmap)', lambda: catalogo.Catalogo.do_arquivo(caminho), servidor),
+        ]
+        print(f"{n_linhas:,} crimes, {n_sessoes} sessões (CSV de {len(conteudo) / 1e6:.1f} MB)")
+        print(f"{'cenário':<32} {'compartilhado (MB)':>19} {'por sessão (MB)':>16} {'total (MB)':>11}")
+        for rotulo, carregar, sessao in cenarios:
+            gc.collect()
+            tracemalloc.start()
+            inicio = memoria_alocada()
+            compartilhado = carregar()
+            depois_da_carga = memoria_alocada()
+            sessoes = [sessao(compartilhado) for _ in range(n_sessoes)]
+            fim = memoria_alocada()
+            tracemalloc.stop()
+            por_sessao = (fim - depois_da_carga) / n_sessoes
+            print(f"{rotulo:<32} {(depois_da_carga - inicio) / 1e6:>19.1f} {por_sessao / 1e6:>16.3f} "
+                  f"{(fim - inicio) / 1e6:>11.1f}")
+            del sessoes, compartilhado
+
+
+def bench_memoria(tamanhos):
+    """Memória do catálogo: dicionário de dicionários x VisaoCrimes (struct-of-arrays)"""
+    def como_dicionario(tabela):
+        return catalogo.dicionario_crimes(tabela.select(['chave'] + catalogo.CAMPOS_CRIME).to_pandas())
+
+    print(f"{'linhas':>10} {'representação':<22} {'MB':>8} {'bytes/crime':>12} {'montagem (s)':>13} {'acesso (µs)':>12}")
+    with tempfile.TemporaryDirectory() as pasta:
+        for n in tamanhos:
+            conteudo = gerar_catalogo_sintetico(n).to_csv(index=False).encode('utf-8')
+            caminho = os.path.join(pasta, f'catalogo_{n}{catalogo.EXTENSAO_COMPILADO}')
+            catalogo.gravar_compilado(catalogo.compilar_catalogo(conteudo), caminho)
+            tabela = catalogo.ler_compilado(caminho)
+            for rotulo, montar in (('dict de dicts', como_dicionario), ('VisaoCrimes', catalogo.VisaoCrimes)):
+                gc.collect()
+                tracemalloc.start()
+                inicio_memoria = memoria_alocada()
+                inicio = time.perf_counter()
+                crimes = montar(tabela)
+                duracao = time.perf_counter() - inicio
+                gc.collect()
+                tamanho = memoria_alocada() - inicio_memoria
+                tracemalloc.stop()
+                chaves = list(crimes)[::max(1, n // 1000)]
+                t_acesso, _ = cronometrar(lambda: [dict(crimes[c]) for c in chaves])
+                print(f"{n:>10,} {rotulo:<22} {tamanho / 1e6:>8.1f} {tamanho / n:>12.0f} {duracao:>13.3f} "
+                      f"{t_acesso / len(chaves) * 1e6:>12.1f}")
+                del crimes
+
+
+def tamanho_seletor(opcoes):
+    """Bytes da mensagem do selectbox enviada ao navegador a cada rerun com estas opções"""
+    from streamlit.proto.Selectbox_pb2 import Selectbox
+    mensagem = Selectbox(label="Selecione o Crime:", default=0)
+    mensagem.options.extend(opcoes)
+    return len(mensagem.SerializeToString())
+
+
+def bench_seletor(n_linhas, opcoes_por_pagina, repeticoes):
+    """Compara o seletor com o catálogo inteiro com a janela filtrada do IndiceBusca"""
+    crimes = catalogo.processar_dados_crimes(gerar_catalogo_sintetico(n_linhas))
+    indice = busca.IndiceBusca.do_catalogo(crimes)
+    print(f"{len(crimes):,} crimes; janela de {opcoes_por_pagina} opções")
+    print(f"{'seletor':<28} {'opções':>9} {'payload (KB)':>13} {'rerun (ms)':>11}")
+
+    def completo():
+        opcoes = list(crimes.keys())
+        return opcoes, tamanho_seletor(opcoes)
+
+    def janela(consulta, prefixo, tipo):
+        posicoes = indice.filtrar(consulta, prefixo, tipo)
+        opcoes = indice.janela(posicoes, 1, opcoes_por_pagina)
+        return opcoes, tamanho_seletor(opcoes)
+
+    cenarios = [('lista completa', completo, ())]
+    cenarios += [(f'janela {rotulo}', janela, filtros) for rotulo, filtros in (
+        ('sem filtro', ('', '', None)),
+        ('artigo "Art. 1"', ('', 'Art. 1', None)),
+        ('tipo penal', ('', '', TIPOS_PENAIS[0])),
+        ('termo "lesão"', ('lesão', '', None)),
+    )]
+    for rotulo, funcao, argumentos in cenarios:
+        tempo, (opcoes, tamanho) = cronometrar(funcao, *argumentos, repeticoes=repeticoes)
+        print(f"{rotulo:<28} {len(opcoes):>9,} {tamanho / 1024:>13.1f} {tempo * 1000:>11.2f}")
+
+
+def bench_penas(n_linhas, repeticoes):
+    """Consultas por faixa de pena: varredura linear de crimes_dict e de arrays x IndiceIntervalos"""
+    crimes = catalogo.processar_dados_crimes(gerar_catalogo_sintetico(n_linhas))
+    registros = list(crimes.values())
+    pena_min = np.array([c['pena_min'] for c in registros])
+    pena_max = np.maximum(pena_min, [c['pena_max'] for c in registros])
+    t_indice, indice = cronometrar(intervalos.IndiceIntervalos, pena_min, pena_max, repeticoes=1)
+    print(f"{len(crimes):,} crimes; índice construído em {t_indice * 1000:.1f} ms")
+
+    consultas = [
+        ('mínima <= 4', lambda c: c['pena_min'] <= 4, lambda: pena_min <= 4,
+         lambda: indice.com_inicio_entre(maximo=4)),
+        ('mínima em [10, 12]', lambda c: 10 <= c['pena_min'] <= 12, lambda: (pena_min >= 10) & (pena_min <= 12),
+         lambda: indice.com_inicio_entre(10, 12)),
+        ('máxima > 8', lambda c: max(c['pena_min'], c['pena_max']) > 8, lambda: pena_max > 8,
+         lambda: indice.com_fim_entre(minimo=np.nextafter(8, np.inf))),
+        ('sobrepõe [2, 3]', lambda c: c['pena_min'] <= 3 and max(c['pena_min'], c['pena_max']) >= 2,
+         lambda: (pena_min <= 3) & (pena_max >= 2), lambda: indice.sobrepostos(2, 3)),
+        ('contém 0.5', lambda c: c['pena_min'] <= 0.5 <= max(c['pena_min'], c['pena_max']),
+         lambda: (pena_min <= 0.5) & (pena_max >= 0.5), lambda: indice.contendo(0.5)),
+        ('atravessa 4 anos', lambda c: c['pena_min'] <= 4 < max(c['pena_min'], c['pena_max']),
+         lambda: (pena_min <= 4) & (pena_max > 4), lambda: indice.atravessando(4)),
+    ]
+    print(f"{'consulta':<18} {'dict (ms)':>10} {'arrays (ms)':>12} {'índice (ms)':>12} {'resultados':>11}")
+    for rotulo, condicao, mascara, consulta in consultas:
+        t_dict, esperado = cronometrar(lambda: [k for k, c in enumerate(registros) if condicao(c)], repeticoes=1)
+        t_arrays, _ = cronometrar(lambda: np.flatnonzero(mascara()), repeticoes=repeticoes)
+        t_consulta, posicoes = cronometrar(consulta, repeticoes=repeticoes)
+        if posicoes.tolist() != esperado:
+            raise AssertionError(f"resultado divergente para {rotulo}")
+        print(f"{rotulo:<18} {t_dict * 1000:>10.1f} {t_arrays * 1000:>12.2f} {t_consulta * 1000:>12.3f} {len(posicoes):>11,}")
+    t_contagem, _ = cronometrar(indice.contar_atravessando, 4, repeticoes=repeticoes)
+    print(f"contagem sem listar (atravessa 4 anos): {t_contagem * 1e6:.1f} µs")
+
+
+def bench_violencia(n_linhas, n_casos, repeticoes):
+    """Classificação de crimes violentos: por descrição a cada caso x coluna calculada na ingestão"""
+    crimes = catalogo.processar_dados_crimes(gerar_catalogo_sintetico(n_linhas))
+    descricoes = [c['descricao_completa'] for c in crimes.values()]
+    print(f"{len(crimes):,} crimes")
+    print(f"{'termos':>7} {'linha a linha (s)':>18} {'contem_termos (s)':>18} {'ganho':>7}")
+    termos_extras = [f'termo{k}' for k in range(0, 1000, 20)]
+    for termos in (dosimetria.CRIMES_VIOLENTOS, dosimetria.CRIMES_VIOLENTOS + termos_extras):
+        t_linhas, esperado = cronometrar(lambda: [dosimetria.crime_violento(d, termos) for d in descricoes], repeticoes=1)
+        t_vetor, obtido = cronometrar(busca.contem_termos, descricoes, termos, repeticoes=repeticoes)
+        if obtido.to_pylist() != esperado:
+            raise AssertionError(f"classificação divergente com {len(termos)} termos")
+        print(f"{len(termos):>7} {t_linhas:>18.3f} {t_vetor:>18.3f} {t_linhas / t_vetor:>6.1f}x")
+
+    tabela = dosimetria.tabela_crimes(crimes)
+    casos = gerar_casos_sinteticos(len(crimes), n_casos)
+
+    def classificando_por_caso():
+        ids = casos['crime_ids']
+        por_caso = {nome: tabela[nome][ids] for nome in ('pena_min', 'pena_max', 'tipo_pena')}
+        por_caso['violento'] = np.array([dosimetria.crime_violento(descricoes[i]) for i in ids])
+        return dosimetria.calcular_lote(por_caso, np.arange(len(ids)), **{
+            nome: valores for nome, valores in casos.items() if nome != 'crime_ids'})
+
+    t_por_caso, esperado = cronometrar(classificando_por_caso, repeticoes=1)
+    t_coluna, obtido = cronometrar(lambda: dosimetria.calcular_lote(tabela, **casos), repeticoes=repeticoes)
+    if not np.array_equal(esperado['pode_substituir'], obtido['pode_substituir']):
+        raise AssertionError("substituição divergente")
+    print(f"lote classificando a cada caso: {n_casos / t_por_caso:>12,.0f} casos/s")
+    print(f"lote com a coluna 'violento':   {n_casos / t_coluna:>12,.0f} casos/s ({t_por_caso / t_coluna:.0f}x)")
+
+
+def bench_varredura(n_linhas, amostra):
+    """Varredura de desfechos do catálogo: grade_cenarios crime a crime x varrer_perfis"""
+    crimes = catalogo.processar_dados_crimes(gerar_catalogo_sintetico(n_linhas))
+    registros = list(crimes.values())
+    tabela = dosimetria.tabela_crimes(crimes)
+    limites = list(lote.LIMITES_VARREDURA.values())
+    pares = len(np.unique(np.column_stack([tabela['pena_min'], tabela['pena_max']]), axis=0))
+    print(f"{len(crimes):,} crimes; {pares:,} pares (pena mínima, pena máxima) distintos")
+
+    def crime_a_crime(limite):
+        for k in range(limite):
+            dosimetria.grade_cenarios(registros[k]['pena_min'], registros[k]['pena_max'], tabela['tipo_pena'][k],
+                                      tabela['violento'][k], *limites)
+
+    t_grade, _ = cronometrar(crime_a_crime, amostra, repeticoes=1)
+    t_varredura, _ = cronometrar(dosimetria.varrer_perfis, tabela, *limites, repeticoes=1)
+    celulas = len(crimes) * 3 * 2 * np.prod(np.array(limites) + 1)
+    print(f"crime a crime: {amostra / t_grade:>12,.0f} crimes/s (estimado {len(crimes) * t_grade / amostra:.1f} s)")
+    print(f"varrer_perfis: {len(crimes) / t_varredura:>12,.0f} crimes/s ({t_varredura:.2f} s; "
+          f"{celulas / t_varredura:,.0f} cenários/s)")
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_catalogo = os.path.join(pasta, f'catalogo{catalogo.EXTENSAO_COMPILADO}')
+        caminho_banco = os.path.join(pasta, 'varredura.sqlite')
+        conteudo = gerar_catalogo_sintetico(n_linhas).to_csv(index=False).encode('utf-8')
+        catalogo.gravar_compilado(catalogo.compilar_catalogo(conteudo), caminho_catalogo)
+        t_total, saida = cronometrar(lote.varrer_catalogo, caminho_catalogo, repeticoes=1)
+        t_gravar, _ = cronometrar(lote.gravar_varredura, saida, caminho_banco, repeticoes=1)
+        print(f"lote.py varrer (compilado): {t_total:.2f} s; gravação SQLite: {t_gravar:.2f} s")
+        for onde in ("tipo_pena = 'RECLUSÃO' AND aberto_sem_atenuantes",
+                     "substituicao_possivel AND NOT violento AND substituicao_min_reducoes <= 2"):
+            t_consulta, resultado = cronometrar(lote.consultar_varredura, caminho_banco, onde, repeticoes=3)
+            print(f"  {onde:<75} {len(resultado):>8,} crimes em {t_consulta * 1000:.1f} ms")
+
+
+async def _requisitar(leitor, escritor, metodo, caminho, dados=None):
+    """Envia um pedido HTTP/1.1 pela conexão aberta; retorna (status, JSON da resposta)"""
+    corpo = b'' if dados is None else json.dumps(dados).encode('utf-8')
+    escritor.write(f"{metodo} {caminho} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(corpo)}\r\n\r\n".encode()
+                   + corpo)
+    await escritor.drain()
+    status = int((await leitor.readline()).split()[1])
+    tamanho = 0
+    while (linha := await leitor.readline()) not in (b'\r\n', b''):
+        if linha.lower().startswith(b'content-length:'):
+            tamanho = int(linha.split(b':')[1])
+    return status, json.loads(await leitor.readexactly(tamanho))
+
+
+def gerar_pedidos(chaves, n_pedidos, casos_por_lote, semente=0):
+    """Mistura de pedidos ao serviço: 85% /calcular, 10% /buscar e 5% /lote"""
+    rng = np.random.default_rng(semente)
+
+    def caso():
+        return {'crime': chaves[rng.integers(len(chaves))],
+                'circunstancia': dosimetria.CIRCUNSTANCIAS[rng.integers(3)],
+                'atenuantes': int(rng.integers(3)), 'agravantes': int(rng.integers(3)),
+                'majorantes': int(rng.integers(2)), 'minorantes': int(rng.integers(2)),
+                'reincidente': bool(rng.random() < 0.3)}
+
+    pedidos = []
+    for sorteio in rng.random(n_pedidos):
+        if sorteio < 0.85:
+            pedidos.append(('POST', '/calcular', caso()))
+        elif sorteio < 0.95:
+            termo = CONSULTAS_BUSCA[rng.integers(len(CONSULTAS_BUSCA))]
+            pedidos.append(('GET', f'/buscar?consulta={termo.replace(" ", "+")}&tamanho=20', None))
+        else:
+            pedidos.append(('POST', '/lote', {'casos': [caso() for _ in range(casos_por_lote)]}))
+    return pedidos
+
+
+async def _carga(host, porta, pedidos, conexoes):
+    """Envia os pedidos por várias conexões simultâneas; retorna (duração, [(rota, status, latência)])"""
+    fila = iter(pedidos)
+    medidas = []
+
+    async def cliente():
+        leitor, escritor = await asyncio.open_connection(host, porta)
+        for metodo, caminho, dados in fila:
+            inicio = time.perf_counter()
+            status, _ = await _requisitar(leitor, escritor, metodo, caminho, dados)
+            medidas.append((caminho.split('?')[0], status, time.perf_counter() - inicio))
+        escritor.close()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(conexoes)))
+    return time.perf_counter() - inicio, medidas
+
+
+async def _chaves_do_servico(host, porta, quantidade=200):
+    leitor, escritor = await asyncio.open_connection(host, porta)
+    _, resposta = await _requisitar(leitor, escritor, 'GET', f'/buscar?tamanho={quantidade}')
+    _, saude = await _requisitar(leitor, escritor, 'GET', '/saude')
+    escritor.close()
+    return [crime['crime'] for crime in resposta['crimes']], saude
+
+
+def _porta_livre():
+    with socket.socket() as soquete:
+        soquete.bind(('127.0.0.1', 0))
+        return soquete.getsockname()[1]
+
+
+def _aguardar_conexoes(processo, porta, nome):
+    """Espera o processo começar a aceitar conexões na porta; retorna (processo, porta)"""
+    for _ in range(600):
+        try:
+            socket.create_connection(('127.0.0.1', porta), timeout=0.1).close()
+            return processo, porta
+        except OSError:
+            time.sleep(0.05)
+    processo.kill()
+    raise RuntimeError(f"{nome} não começou a aceitar conexões")
+
+
+def _iniciar_servico(caminho_catalogo, espera_ms):
+    """Sobe servico.py em outro processo e espera que aceite conexões; retorna (processo, porta)"""
+    porta = _porta_livre()
+    processo = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'servico.py'),
+         caminho_catalogo, '--porta', str(porta), '--espera-ms', str(espera_ms)],
+        stderr=subprocess.DEVNULL)
+    return _aguardar_conexoes(processo, porta, 'servico.py')
+
+
+def _relatorio_carga(duracao, medidas):
+    print(f"  {'rota':<10} {'pedidos':>8} {'erros':>6} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for rota in sorted({rota for rota, _, _ in medidas}):
+        latencias = np.array([t for r, _, t in medidas if r == rota]) * 1000
+        erros = sum(1 for r, status, _ in medidas if r == rota and status != 200)
+        print(f"  {rota:<10} {len(latencias):>8,} {erros:>6} {np.percentile(latencias, 50):>9.2f} "
+              f"{np.percentile(latencias, 99):>9.2f}")
+    latencias = np.array([t for _, _, t in medidas]) * 1000
+    print(f"  {'total':<10} {len(medidas):>8,} {'':>6} {np.percentile(latencias, 50):>9.2f} "
+          f"{np.percentile(latencias, 99):>9.2f}   {len(medidas) / duracao:,.0f} pedidos/s")
+
+
+def bench_servico(n_linhas, n_pedidos, conexoes, esperas_ms, casos_por_lote, endereco=None):
+    """Teste de carga do servico.py: latência p50/p99 e pedidos/s com e sem agrupamento de /calcular
+
+    Com endereco (host:porta) mede um serviço já em execução em vez de subir um por espera.
+    """
+    def medir(host, porta):
+        chaves, _ = asyncio.run(_chaves_do_servico(host, porta))
+        pedidos = gerar_pedidos(chaves, n_pedidos, casos_por_lote)
+        asyncio.run(_carga(host, porta, pedidos[:conexoes * 10], conexoes))
+        duracao, medidas = asyncio.run(_carga(host, porta, pedidos, conexoes))
+        _, saude = asyncio.run(_chaves_do_servico(host, porta, 1))
+        _relatorio_carga(duracao, medidas)
+        if saude['lotes_agrupados']:
+            print(f"  /calcular: {saude['casos_agrupados'] / saude['lotes_agrupados']:.1f} casos por lote em média")
+
+    print(f"{n_pedidos:,} pedidos por {conexoes} conexões simultâneas")
+    if endereco:
+        host, porta = endereco.rsplit(':', 1)
+        medir(host, int(porta))
+        return
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, f'catalogo{catalogo.EXTENSAO_COMPILADO}')
+        conteudo = gerar_catalogo_sintetico(n_linhas).to_csv(index=False).encode('utf-8')
+        catalogo.gravar_compilado(catalogo.compilar_catalogo(conteudo), caminho)
+        for espera_ms in esperas_ms:
+            print(f"espera para agrupar /calcular: {espera_ms} ms")
+            processo, porta = _iniciar_servico(caminho, espera_ms)
+            try:
+                medir('127.0.0.1', porta)
+            finally:
+                processo.terminate()
+                processo.wait()
+
+
+# Interações medidas em `reruns`: rótulo do widget e valores alternados a cada repetição
+INTERACOES_APP = {
+    'atenuante': ('Selecione as atenuantes:', [['Menor de 21 anos na data do fato'], []]),
+    'circunstancia': ('Circunstância do Crime:', ['Desfavorável', 'Neutra']),
+    'calcular': ('🎯 Calcular Pena Definitiva', [True]),
+    'cenarios': ('Calcular todos os cenários para este crime', [True, False]),
+    'busca': ('Digite o artigo ou descrição:', ['roubo', 'furto'])
+}
+
+
+def _estado_widget(tipo, identificador, valor):
+    """WidgetState que o navegador envia para o novo valor do widget"""
+    from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+    estado = WidgetState(id=identificador)
+    if tipo == 'button':
+        estado.trigger_value = valor
+    elif tipo == 'checkbox':
+        estado.bool_value = valor
+    elif tipo == 'multiselect':
+        estado.string_array_value.data.extend(valor)
+    else:
+        estado.string_value = valor
+    return estado
+
+
+async def _interagir_com_app(porta, interacoes, repeticoes):
+    """Abre uma sessão do app e mede, para cada interação, o tempo até o fim da execução que ela dispara
+
+    interacoes mapeia nomes a (rótulo do widget, valores alternados). As mensagens são as do
+    navegador: o estado de todos os widgets alterados e, quando o widget está dentro de um
+    fragmento, o id do fragmento (só ele é executado de novo). Retorna as latências (s) por
+    interação e o id do fragmento de cada widget ('' fora de fragmentos).
+    """
+    import websockets  # dependência do servidor do Streamlit
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    widgets = {}
+    estados = {}
+
+    async def executar(conexao, trigger=None, fragmento=''):
+        mensagem = BackMsg()
+        mensagem.rerun_script.query_string = ''
+        mensagem.rerun_script.fragment_id = fragmento
+        mensagem.rerun_script.widget_states.widgets.extend(list(estados.values()) + ([trigger] if trigger else []))
+        inicio = time.perf_counter()
+        await conexao.send(mensagem.SerializeToString())
+        while True:
+            resposta = ForwardMsg()
+            resposta.ParseFromString(await conexao.recv())
+            tipo = resposta.WhichOneof('type')
+            if tipo == 'script_finished':
+                return time.perf_counter() - inicio
+            if tipo == 'delta' and resposta.delta.WhichOneof('type') == 'new_element':
+                elemento = resposta.delta.new_element
+                widget = getattr(elemento, elemento.WhichOneof('type'))
+                if 'label' in widget.DESCRIPTOR.fields_by_name and getattr(widget, 'id', ''):
+                    widgets[widget.label] = (elemento.WhichOneof('type'), widget.id, resposta.delta.fragment_id)
+
+    latencias = {nome: [] for nome in interacoes}
+    async with websockets.connect(f'ws://127.0.0.1:{porta}/_stcore/stream', max_size=None) as conexao:
+        await executar(conexao)
+        for k in range(repeticoes):
+            for nome, (rotulo, valores) in interacoes.items():
+                tipo, identificador, fragmento = widgets[rotulo]
+                estado = _estado_widget(tipo, identificador, valores[k % len(valores)])
+                if tipo == 'button':
+                    latencias[nome].append(await executar(conexao, estado, fragmento))
+                else:
+                    estados[identificador] = estado
+                    latencias[nome].append(await executar(conexao, fragmento=fragmento))
+    return latencias, {rotulo: fragmento for rotulo, (_, _, fragmento) in widgets.items()}
+
+
+def _medir_app(script, ambiente, interacoes, repeticoes):
+    """Serve o script com `streamlit run` e mede as interações (ver _interagir_com_app)"""
+    porta = _porta_livre()
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', script, '--server.headless', 'true',
+         '--server.port', str(porta), '--browser.gatherUsageStats', 'false'],
+        env=dict(os.environ, **ambiente), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _aguardar_conexoes(processo, porta, 'streamlit run')
+        return asyncio.run(_interagir_com_app(porta, interacoes, repeticoes))
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def bench_reruns(n_linhas, interacoes, repeticoes):
+    """Latência das interações com o app servido pelo `streamlit run` (execução completa x fragmento)
+
+    O piso é a latência de um app com um único widget, custo do próprio Streamlit a cada rerun.
+    Para comparar versões do app, execute nas duas e compare as latências acima do piso e os
+    tempos no servidor.
+    """
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, f'catalogo{catalogo.EXTENSAO_COMPILADO}')
+        caminho_metricas = os.path.join(pasta, 'metricas.jsonl')
+        conteudo = gerar_catalogo_sintetico(n_linhas).to_csv(index=False).encode('utf-8')
+        catalogo.gravar_compilado(catalogo.compilar_catalogo(conteudo), caminho)
+        script_piso = os.path.join(pasta, 'piso.py')
+        with open(script_piso, 'w', encoding='utf-8') as arquivo:
+            arquivo.write('import streamlit as st\nst.toggle("piso")\n')
+
+        piso, _ = _medir_app(script_piso, {}, {'piso': ('piso', [True, False])}, repeticoes)
+        latencias, fragmentos = _medir_app(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'code2.py'),
+            {'CATALOGO_DOSIMETRIA': caminho, 'METRICAS_DOSIMETRIA': caminho_metricas},
+            {nome: INTERACOES_APP[nome] for nome in interacoes}, repeticoes)
+        execucoes = instrumentacao.ler_json_linhas(caminho_metricas)
+
+    piso = np.percentile(piso['piso'][1:], 50) * 1000
+    print(f"{n_linhas:,} crimes; {repeticoes} repetições por interação (a primeira é descartada)")
+    print(f"piso do Streamlit (app com um widget): p50 {piso:.1f} ms")
+    print(f"{'interação':<14} {'escopo':<10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'acima do piso (ms)':>19}")
+    for nome, valores in latencias.items():
+        valores = np.array(valores[1:]) * 1000
+        escopo = 'fragmento' if fragmentos[INTERACOES_APP[nome][0]] else 'app'
+        p50 = np.percentile(valores, 50)
+        print(f"{nome:<14} {escopo:<10} {p50:>9.1f} {np.percentile(valores, 95):>9.1f} {p50 - piso:>19.1f}")
+    print("tempo no servidor (METRICAS_DOSIMETRIA):")
+    for escopo, valores in instrumentacao.resumir(execucoes).items():
+        if escopo.startswith('total'):
+            print(f"  {escopo:<30} {valores['execucoes']:>5} execuções  p50 {valores['p50']:>8.1f} ms  "
+                  f"p95 {valores['p95']:>8.1f} ms")
+
+# Suíte de referência: codificações aceitas pelo upload e limites das medidas que não escalam com o lote
+CODIFICACOES_SUITE = ['utf-8', 'utf-8-sig', 'cp1252', 'latin-1']
+CASOS_INDIVIDUAIS_SUITE = 5_000
+FIGURAS_SUITE = 20
+# Versão do formato do arquivo de baseline gravado por `suite`
+FORMATO_BASELINE = 1
+
+
+def ambiente_execucao():
+    """Versões, plataforma e commit da execução (tempos de máquinas diferentes não são comparáveis)"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+        'pyarrow': pa.__version__, 'plotly': plotly.__version__, 'plataforma': platform.platform(),
+        'processador': platform.processor() or platform.machine(), 'cpus': os.cpu_count(), 'commit': commit
+    }
+
+
+def medidas_suite(n_linhas, repeticoes, semente=0):
+    """Medidas da suíte para um catálogo sintético e um lote de casos com n_linhas linhas cada
+
+    Cada medida é {'medida', 'linhas', 'itens', 'segundos'}: o menor tempo entre as repetições
+    para processar `itens` elementos (linhas, consultas, casos ou figuras).
+    """
+    medidas = []
+
+    def anotar(nome, itens, segundos):
+        medidas.append({'medida': nome, 'linhas': n_linhas, 'itens': itens, 'segundos': segundos})
+        print(f"{n_linhas:>10,} {nome:<24} {segundos * 1000:>12.2f} {itens / segundos:>14,.0f}")
+
+    def medir(nome, itens, funcao, *args):
+        gc.collect()
+        segundos, resultado = cronometrar(funcao, *args, repeticoes=repeticoes)
+        anotar(nome, itens, segundos)
+        return resultado
+
+    texto = gerar_catalogo_sintetico(n_linhas, semente).to_csv(index=False)
+    for codificacao in CODIFICACOES_SUITE:
+        # Travessões tipográficos (0x96 em cp1252), como nos CSV exportados pelo Excel; sem eles
+        # o arquivo cp1252 teria os mesmos bytes do latin-1
+        conteudo = (texto.replace(' - ', ' – ') if codificacao == 'cp1252' else texto).encode(codificacao)
+        _, relatorio = medir(f'csv_{codificacao}', n_linhas, catalogo.ler_csv, conteudo)
+        if relatorio['codificacao'] != codificacao:
+            raise AssertionError(f"{codificacao} detectado como {relatorio['codificacao']}")
+
+    # Fases de Catalogo.do_csv pelo relatório do próprio catálogo (menor tempo de cada fase)
+    conteudo = texto.encode('utf-8')
+    tempos = {}
+    for _ in range(repeticoes):
+        gc.collect()
+        cat = catalogo.Catalogo.do_csv(conteudo)
+        for fase, segundos in cat.relatorio['tempos'].items():
+            tempos[fase] = min(tempos.get(fase, np.inf), segundos)
+    for fase in ('processamento', 'indice_busca', 'indice_penas'):
+        anotar(f'catalogo_{fase}', n_linhas, tempos[fase])
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, f'catalogo{catalogo.EXTENSAO_COMPILADO}')
+        catalogo.gravar_compilado(cat.tabela, caminho)
+        medir('catalogo_compilado', n_linhas, catalogo.Catalogo.do_arquivo, caminho)
+
+    indice = cat.indice_busca
+    medir('busca', len(CONSULTAS_BUSCA), lambda: [indice.buscar(consulta) for consulta in CONSULTAS_BUSCA])
+    medir('busca_filtros', len(CONSULTAS_BUSCA), lambda: [
+        indice.filtrar(consulta, prefixo_artigo='Art. 1', dentre=cat.indice_penas.contidos_em(0, 8))
+        for consulta in CONSULTAS_BUSCA])
+
+    casos = gerar_casos_sinteticos(len(cat), n_linhas, semente)
+    amostra = min(n_linhas, CASOS_INDIVIDUAIS_SUITE)
+
+    def individual():
+        return [dosimetria.calcular_dosimetria(
+            cat.crimes.registro(casos['crime_ids'][k]), dosimetria.CIRCUNSTANCIAS[casos['circunstancias'][k]],
+            casos['n_atenuantes'][k], casos['n_agravantes'][k], casos['n_majorantes'][k],
+            casos['n_minorantes'][k], casos['reincidente'][k]) for k in range(amostra)]
+
+    individuais = medir('dosimetria_individual', amostra, individual)
+    medir('dosimetria_lote', n_linhas, lambda: dosimetria.calcular_lote(cat.tabela_lote(), **casos))
+
+    # Figuras do app: composição da pena e mapa atenuantes × agravantes da grade de cenários
+    figuras = individuais[:FIGURAS_SUITE]
+    medir('figura_composicao', len(figuras), lambda: [graficos.figura_composicao(r) for r in figuras])
+    tabela = cat.tabela_lote()
+    fatia = (0, slice(None), slice(None), 0, 0, 0)
+    grades = [dosimetria.grade_cenarios(cat.pena_min[k], cat.pena_max[k], tabela['tipo_pena'][k],
+                                        tabela['violento'][k], 3, 6, 0, 0)
+              for k in range(min(len(cat), FIGURAS_SUITE))]
+    medir('figura_grade', len(grades), lambda: [graficos.figura_grade(
+        dosimetria.em_anos(g['pena_final'][fatia]), g['regime'][fatia], g['pode_substituir'][fatia], g['valido'][fatia])
+        for g in grades])
+    return medidas
+
+
+def bench_suite(tamanhos, repeticoes, saida, semente=0):
+    """Executa a suíte para cada tamanho e grava as medidas como baseline JSON"""
+    print(f"{'linhas':>10} {'medida':<24} {'tempo (ms)':>12} {'itens/s':>14}")
+    medidas = []
+    for n in tamanhos:
+        medidas += medidas_suite(n, repeticoes, semente)
+    baseline = {
+        'formato': FORMATO_BASELINE,
+        'criado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'ambiente': ambiente_execucao(),
+        'parametros': {'linhas': tamanhos, 'repeticoes': repeticoes, 'semente': semente},
+        'medidas': medidas
+    }
+    if saida:
+        with open(saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(baseline, arquivo, ensure_ascii=False, indent=1)
+        print(f"baseline gravada em {saida}")
+    return baseline
+
+
+def ler_baseline(caminho):
+    """Medidas de um arquivo gravado por `suite`, indexadas por (medida, linhas)"""
+    with open(caminho, encoding='utf-8') as arquivo:
+        baseline = json.load(arquivo)
+    if baseline.get('formato') != FORMATO_BASELINE:
+        raise ValueError(f"{caminho} não é uma baseline no formato {FORMATO_BASELINE}")
+    return baseline, {(m['medida'], m['linhas']): m for m in baseline['medidas']}
+
+
+def comparar_baselines(caminho_base, caminho_atual, tolerancia, minimo_ms):
+    """Compara o tempo por item de cada medida; retorna as regressões
+
+    Uma medida regride quando o tempo por item cresce mais que `tolerancia` (fração) e a
+    diferença absoluta passa de minimo_ms, que descarta o ruído das medidas muito curtas.
+    """
+    base, medidas_base = ler_baseline(caminho_base)
+    atual, medidas_atuais = ler_baseline(caminho_atual)
+    for campo in ('plataforma', 'processador', 'python'):
+        if base['ambiente'].get(campo) != atual['ambiente'].get(campo):
+            print(f"aviso: {campo} difere ({base['ambiente'].get(campo)} x {atual['ambiente'].get(campo)})")
+    print(f"{'medida':<24} {'linhas':>10} {'base (ms)':>11} {'atual (ms)':>11} {'variação':>9}")
+    regressoes = []
+    for chave, medida in medidas_atuais.items():
+        anterior = medidas_base.get(chave)
+        if anterior is None:
+            print(f"{chave[0]:<24} {chave[1]:>10,} {'—':>11} {medida['segundos'] * 1000:>11.2f} {'nova':>9}")
+            continue
+        # Tempo da base escalado para a quantidade de itens da medida atual
+        t_base = anterior['segundos'] * medida['itens'] / anterior['itens']
+        t_atual = medida['segundos']
+        variacao = t_atual / t_base - 1
+        situacao = ''
+        if variacao > tolerancia and (t_atual - t_base) * 1000 > minimo_ms:
+            situacao = 'REGRESSÃO'
+            regressoes.append(chave)
+        elif variacao < -tolerancia and (t_base - t_atual) * 1000 > minimo_ms:
+            situacao = 'melhora'
+        print(f"{chave[0]:<24} {chave[1]:>10,} {t_base * 1000:>11.2f} {t_atual * 1000:>11.2f} "
+              f"{variacao:>+8.0%} {situacao}")
+    for chave in medidas_base.keys() - medidas_atuais.keys():
+        print(f"{chave[0]:<24} {chave[1]:>10,} ausente na execução atual")
+    print(f"{len(regressoes)} regressão(ões) acima de {tolerancia:.0%}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p = sub.add_parser('ingestao', help='processar_dados_crimes: iterrows x vetorizado')
+    p.add_argument('--linhas', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    p.add_argument('--repeticoes', type=int, default=3)
+
+    p = sub.add_parser('dosimetria', help='cálculo individual x calcular_lote')
+    p.add_argument('--casos', type=int, default=1_000_000)
+    p.add_argument('--repeticoes', type=int, default=3)
+
+    p = sub.add_parser('fixo', help='cálculo em lote em ponto fixo (int32) x float64: vazão e memória')
+    p.add_argument('--casos', type=int, default=1_000_000)
+    p.add_argument('--repeticoes', type=int, default=3)
+
+    p = sub.add_parser('paralelo', help='lote.py com 1, 2, 4 e 8 processos')
+    p.add_argument('--casos', type=int, default=1_000_000)
+    p.add_argument('--processos', type=int, nargs='+', default=[1, 2, 4, 8])
+    p.add_argument('--tamanho-bloco', type=int, default=lote.TAMANHO_BLOCO)
+
+    p = sub.add_parser('relatorios', help='relatórios por caso em ZIP e HTML único com 1, 2 e 4 processos')
+    p.add_argument('--casos', type=int, default=20_000)
+    p.add_argument('--processos', type=int, nargs='+', default=[1, 2, 4])
+    p.add_argument('--tamanho-bloco', type=int, default=lote.TAMANHO_BLOCO_RELATORIOS)
+
+    p = sub.add_parser('painel', help='painel de resultados em lote: contagens agregadas x um ponto por caso')
+    p.add_argument('--casos', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000, 10_000_000])
+    p.add_argument('--limite-bruto', type=int, default=1_000_000,
+                   help='maior lote medido também com o histograma de um ponto por caso')
+
+    p = sub.add_parser('progressao', help='progressão de regime e ocupação mensal de coortes (até 1M de pessoas)')
+    p.add_argument('--pessoas', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    p.add_argument('--meses', type=int, default=progressao.MESES_PROJECAO)
+    p.add_argument('--repeticoes', type=int, default=3)
+
+    p = sub.add_parser('concurso', help='concurso de crimes: casos com vários crimes em memória e em arquivo')
+    p.add_argument('--crimes', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000])
+    p.add_argument('--repeticoes', type=int, default=3)
+    p.add_argument('--arquivo', type=int, default=1_000_000, help='crimes no arquivo processado por lote.py')
+
+    p = sub.add_parser('busca', help='busca da sidebar: varredura linear x IndiceBusca')
+    p.add_argument('--linhas', type=int, default=100_000)
+    p.add_argument('--repeticoes', type=int, default=5)
+
+    p = sub.add_parser('inicializacao', help='tempo até interativo: CSV x catálogo compilado')
+    p.add_argument('--linhas', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    p.add_argument('--repeticoes', type=int, default=3)
+
+    p = sub.add_parser('atualizacao', help='nova versão do catálogo: reprocessamento completo x só as linhas alteradas')
+    p.add_argument('--linhas', type=int, nargs='+', default=[10_000, 100_000])
+    p.add_argument('--edicoes', type=int, nargs='+', default=[1, 100, 1_000])
+    p.add_argument('--repeticoes', type=int, default=3)
+
+    p = sub.add_parser('sessoes', help='memória por sessão: cópia por sessão x catálogo compartilhado')
+    p.add_argument('--linhas', type=int, default=10_000)
+    p.add_argument('--sessoes', type=int, default=50)
+
+    p = sub.add_parser('memoria', help='memória do catálogo: dict de dicts x VisaoCrimes')
+    p.add_argument('--linhas', type=int, nargs='+', default=[10_000, 100_000])
+
+    p = sub.add_parser('seletor', help='seletor de crime: catálogo inteiro x janela filtrada')
+    p.add_argument('--linhas', type=int, default=100_000)
+    p.add_argument('--opcoes', type=int, default=200)
+    p.add_argument('--repeticoes', type=int, default=5)
+
+    p = sub.add_parser('penas', help='filtros por faixa de pena: varredura linear x IndiceIntervalos')
+    p.add_argument('--linhas', type=int, default=100_000)
+    p.add_argument('--repeticoes', type=int, default=5)
+
+    p = sub.add_parser('violencia', help='crime violento: classificação por caso x coluna da ingestão')
+    p.add_argument('--linhas', type=int, default=100_000)
+    p.add_argument('--casos', type=int, default=200_000)
+    p.add_argument('--repeticoes', type=int, default=3)
+
+    p = sub.add_parser('servico', help='teste de carga do servico.py: latência p50/p99 e pedidos/s')
+    p.add_argument('--linhas', type=int, default=100_000)
+    p.add_argument('--pedidos', type=int, default=20_000)
+    p.add_argument('--conexoes', type=int, default=64)
+    p.add_argument('--espera-ms', type=float, nargs='+', default=[0, 2], help='esperas de agrupamento comparadas')
+    p.add_argument('--casos-por-lote', type=int, default=100, help='casos em cada pedido de /lote')
+    p.add_argument('--endereco', help='host:porta de um serviço já em execução')
+
+    p = sub.add_parser('varredura', help='desfechos alcançáveis: grade_cenarios crime a crime x varrer_perfis')
+    p.add_argument('--linhas', type=int, default=100_000)
+    p.add_argument('--amostra', type=int, default=200, help='crimes calculados um a um para a estimativa')
+
+    p = sub.add_parser('reruns', help='latência das interações com o app (streamlit run): execução completa x fragmento')
+    p.add_argument('--linhas', type=int, default=100_000)
+    p.add_argument('--interacoes', nargs='+', choices=list(INTERACOES_APP), default=list(INTERACOES_APP))
+    p.add_argument('--repeticoes', type=int, default=20)
+
+    p = sub.add_parser('suite', help='suíte de referência (CSV, catálogo, busca, dosimetria, figuras) gravada em JSON')
+    p.add_argument('--linhas', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                   help='tamanhos do catálogo e do lote de casos (ex.: 1000 10000 100000 1000000)')
+    p.add_argument('--repeticoes', type=int, default=5)
+    p.add_argument('--semente', type=int, default=0)
+    p.add_argument('-o', '--saida', help='arquivo JSON da baseline')
+
+    p = sub.add_parser('comparar', help='compara duas baselines da suíte; sai com código 1 se houver regressão')
+    p.add_argument('base', help='baseline de referência')
+    p.add_argument('atual', help='baseline da versão avaliada')
+    p.add_argument('--tolerancia', type=float, default=0.2, help='aumento relativo tolerado (0.2 = 20%%)')
+    p.add_argument('--minimo-ms', type=float, default=1.0, help='diferenças menores que isto são ignoradas')
+
+    args = parser.parse_args()
+    if args.comando == 'ingestao':
+        bench_ingestao(args.linhas, args.repeticoes)
+    elif args.comando == 'dosimetria':
+        bench_dosimetria(args.casos, args.repeticoes)
+    elif args.comando == 'fixo':
+        bench_ponto_fixo(args.casos, args.repeticoes)
+    elif args.comando == 'busca':
+        bench_busca(args.linhas, args.repeticoes)
+    elif args.comando == 'inicializacao':
+        bench_inicializacao(args.linhas, args.repeticoes)
+    elif args.comando == 'atualizacao':
+        bench_atualizacao(args.linhas, args.edicoes, args.repeticoes)
+    elif args.comando == 'sessoes':
+        bench_sessoes(args.linhas, args.sessoes)
+    elif args.comando == 'memoria':
+        bench_memoria(args.linhas)
+    elif args.comando == 'seletor':
+        bench_seletor(args.linhas, args.opcoes, args.repeticoes)
+    elif args.comando == 'penas':
+        bench_penas(args.linhas, args.repeticoes)
+    elif args.comando == 'violencia':
+        bench_violencia(args.linhas, args.casos, args.repeticoes)
+    elif args.comando == 'servico':
+        bench_servico(args.linhas, args.pedidos, args.conexoes, args.espera_ms, args.casos_por_lote, args.endereco)
+    elif args.comando == 'varredura':
+        bench_varredura(args.linhas, args.amostra)
+    elif args.comando == 'paralelo':
+        bench_paralelo(args.casos, args.processos, args.tamanho_bloco)
+    elif args.comando == 'relatorios':
+        bench_relatorios(args.casos, args.processos, args.tamanho_bloco)
+    elif args.comando == 'painel':
+        bench_painel(args.casos, args.limite_bruto)
+    elif args.comando == 'progressao':
+        bench_progressao(args.pessoas, args.meses, args.repeticoes)
+    elif args.comando == 'concurso':
+        bench_concurso(args.crimes, args.repeticoes, args.arquivo)
+    elif args.comando == 'reruns':
+        bench_reruns(args.linhas, args.interacoes, args.repeticoes)
+    elif args.comando == 'suite':
+        bench_suite(args.linhas, args.repeticoes, args.saida, args.semente)
+    elif args.comando == 'comparar':
+        if comparar_baselines(args.base, args.atual, args.tolerancia, args.minimo_ms):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+import re
+import unicodedata
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import intervalos
+
+# Tokens: sequências de letras e dígitos do texto já normalizado (sem acentos, minúsculo)
+_PADRAO_TOKEN = '[0-9a-z]+'
+_PADRAO_SEPARADOR = '[^0-9a-z]+'
+_MARCAS_ACENTO = '[\u0300-\u036f]'
+# Maior caractere possível: limite superior das buscas por prefixo no vocabulário ordenado
+_FIM_PREFIXO = '\U0010ffff'
+
+
+def normalizar(texto):
+    """Minúsculas sem acentos, para comparações insensíveis a acentuação"""
+    texto = unicodedata.normalize('NFKD', str(texto))
+    return re.sub(_MARCAS_ACENTO, '', texto).lower()
+
+
+def normalizar_serie(serie):
+    """Versão vetorizada de normalizar() para uma coluna de textos"""
+    return pd.Series(_normalizar_arrow(serie), index=serie.index, dtype=str)
+
+
+def _normalizar_arrow(valores):
+    """Normaliza uma sequência de textos com as funções do pyarrow; retorna um pa.Array"""
+    textos = pa.array([str(v) for v in valores], type=pa.string())
+    textos = pc.utf8_normalize(textos, form='NFKD')
+    return pc.utf8_lower(pc.replace_substring_regex(textos, _MARCAS_ACENTO, ''))
+
+
+def contem_termos(textos, termos, normalizados=False):
+    """Para cada texto, se contém algum dos termos (sem diferenciar acentos e maiúsculas); retorna um pa.Array
+
+    Os termos formam uma única alternação de literais, que o RE2 do pyarrow compila em um
+    autômato: cada texto é percorrido uma vez, qualquer que seja a quantidade de termos.
+    Com normalizados=True, textos já vêm normalizados (ex.: descricao_busca de colunas_busca()).
+    """
+    termos = sorted({normalizar(t).strip() for t in termos} - {''})
+    if not normalizados:
+        textos = _normalizar_arrow(textos)
+    if not termos:
+        return pa.array(np.zeros(len(textos), dtype=bool))
+    return pc.match_substring_regex(textos, '|'.join(re.escape(t) for t in termos))
+
+
+def colunas_busca(artigos, descricoes):
+    """Colunas por crime de que o índice precisa: artigo e texto normalizados e a lista de tokens
+
+    Inclui também a descrição normalizada (descricao_busca), reaproveitada na classificação do catálogo.
+    """
+    artigos = _normalizar_arrow(artigos)
+    descricoes = _normalizar_arrow(descricoes)
+    textos = pc.binary_join_element_wise(artigos, descricoes, ' ')
+    return {
+        'artigo_busca': artigos,
+        'descricao_busca': descricoes,
+        'texto_busca': textos,
+        'tokens': pc.split_pattern_regex(textos, _PADRAO_SEPARADOR)
+    }
+
+
+def _tokens_por_linha(listas):
+    """(vocabulário, código de cada token, posição da lista de origem) de uma coluna de listas de tokens"""
+    tokens = pc.list_flatten(listas)
+    linhas = pc.list_parent_indices(listas).to_numpy()
+    if not pa.types.is_dictionary(tokens.type):
+        tokens = pc.dictionary_encode(tokens)
+    codigos = tokens.indices.to_numpy(zero_copy_only=False)
+    vocabulario = tokens.dictionary.to_numpy(zero_copy_only=False).astype(str)
+    return vocabulario, codigos, linhas
+
+
+class IndiceBusca:
+    """Índice invertido de tokens normalizados sobre artigo e descrição dos crimes
+
+    Cada termo da consulta casa com os tokens que começam por ele ("lesa" encontra "lesão");
+    todos os termos precisam casar. Os resultados vêm ordenados por relevância: artigo que começa
+    pela consulta, depois quantidade de termos que casam com tokens inteiros, depois a ordem do
+    catálogo. Se nenhum crime casar por tokens, a consulta é procurada como trecho do texto.
+
+    filtrar() combina a consulta com filtros por prefixo de artigo e por tipo penal.
+    """
+
+    def __init__(self, chaves, artigos, descricoes, tipos_penais=None):
+        self._montar(chaves, colunas_busca(artigos, descricoes), tipos_penais)
+
+    @classmethod
+    def das_colunas(cls, chaves, colunas, tipos_penais=None):
+        """Constrói o índice a partir de colunas já calculadas por colunas_busca() (ex.: catálogo compilado)"""
+        indice = cls.__new__(cls)
+        indice._montar(chaves, colunas, tipos_penais)
+        return indice
+
+    def _montar(self, chaves, colunas, tipos_penais):
+        self.chaves = list(chaves)
+        self._guardar_tipos(tipos_penais)
+        self._textos = colunas['texto_busca']
+
+        # Tokens de cada crime, achatados, com a posição do crime de origem. O catálogo
+        # compilado já guarda os tokens codificados em dicionário
+        vocabulario, codigos, linhas = _tokens_por_linha(colunas['tokens'])
+
+        # Pares (token, crime) distintos, ordenados por token: as linhas de cada token ficam
+        # contíguas em self._linhas, e um prefixo corresponde a uma faixa do vocabulário
+        vocabulario, posicao_no_vocabulario = np.unique(vocabulario, return_inverse=True)
+        total = max(len(self.chaves), 1)
+        self._guardar_pares(vocabulario, np.unique(posicao_no_vocabulario[codigos].astype(np.int64) * total + linhas))
+
+        # Artigos normalizados ordenados, para a busca por prefixo de artigo
+        artigos = colunas['artigo_busca'].to_numpy(zero_copy_only=False).astype(str)
+        self._ordem_artigos = np.argsort(artigos, kind='stable').astype(np.int32)
+        self._artigos_ordenados = artigos[self._ordem_artigos].tolist()
+
+    def _guardar_tipos(self, tipos_penais):
+        # Tipo penal de cada crime como código em self.tipos_penais
+        codigos_tipo, tipos = pd.factorize(pd.Series(list(tipos_penais or []), dtype=object), sort=True)
+        self.tipos_penais = [str(t) for t in tipos]
+        self._codigos_tipo = codigos_tipo.astype(np.int32)
+
+    def _guardar_pares(self, vocabulario, pares):
+        """Guarda o vocabulário ordenado e os pares token * total + crime (ordenados, sem repetição)
+
+        Tokens vazios ou que não aparecem em nenhum crime são descartados.
+        """
+        total = max(len(self.chaves), 1)
+        tokens = pares // total
+        usados = np.zeros(len(vocabulario), dtype=bool)
+        usados[tokens] = True
+        usados &= vocabulario != ''
+        if not usados.all():
+            mantidos = usados[tokens]
+            pares = pares[mantidos]
+            tokens = (np.cumsum(usados) - 1)[tokens[mantidos]]
+            vocabulario = vocabulario[usados]
+        self._vocabulario = vocabulario.tolist()
+        self._inicios = np.searchsorted(tokens, np.arange(len(vocabulario) + 1))
+        self._linhas = (pares % total).astype(np.int32)
+
+    def atualizado(self, chaves, colunas, mapa, posicoes_novas, tipos_penais=None):
+        """Índice de uma nova versão do catálogo, tokenizando só as linhas incluídas ou alteradas
+
+        colunas tem artigo_busca e texto_busca de todas as linhas da nova versão e tokens só das
+        linhas em posicoes_novas; mapa dá a nova posição de cada crime deste índice (-1 se
+        removido ou alterado). Os pares mantidos já estão ordenados e os novos são intercalados
+        por busca binária. Este índice não é alterado.
+        """
+        indice = IndiceBusca.__new__(IndiceBusca)
+        indice.chaves = list(chaves)
+        indice._guardar_tipos(tipos_penais)
+        indice._textos = colunas['texto_busca']
+        total = max(len(indice.chaves), 1)
+
+        # Vocabulário: os tokens novos entram por busca binária no vocabulário ordenado
+        anterior = np.array(self._vocabulario, dtype=str)
+        vocabulario_novo, codigos, linhas = _tokens_por_linha(colunas['tokens'])
+        vocabulario_novo, posicao_no_novo = np.unique(vocabulario_novo, return_inverse=True)
+        pontos = np.searchsorted(anterior, vocabulario_novo)
+        existentes = np.zeros(len(vocabulario_novo), dtype=bool)
+        if len(anterior):
+            existentes = anterior[np.minimum(pontos, len(anterior) - 1)] == vocabulario_novo
+        vocabulario = np.insert(anterior, pontos[~existentes], vocabulario_novo[~existentes])
+        posicao_anterior = np.arange(len(anterior)) + np.searchsorted(vocabulario_novo[~existentes], anterior)
+
+        # Pares mantidos (continuam ordenados se os crimes mantidos não mudaram de ordem) e novos
+        tokens_anteriores = np.repeat(posicao_anterior, np.diff(self._inicios))
+        linhas_anteriores = mapa[self._linhas]
+        mantidos = linhas_anteriores >= 0
+        pares = tokens_anteriores[mantidos].astype(np.int64) * total + linhas_anteriores[mantidos]
+        posicoes_mantidas = mapa[mapa >= 0]
+        if np.any(posicoes_mantidas[1:] < posicoes_mantidas[:-1]):
+            pares = np.sort(pares)
+        codigos = np.searchsorted(vocabulario, vocabulario_novo)[posicao_no_novo][codigos]
+        novos = np.unique(codigos.astype(np.int64) * total + np.asarray(posicoes_novas)[linhas])
+        indice._guardar_pares(vocabulario, np.insert(pares, np.searchsorted(pares, novos), novos))
+
+        artigos_novos = colunas['artigo_busca'].take(pa.array(posicoes_novas)).to_numpy(zero_copy_only=False).astype(str)
+        indice._ordem_artigos, artigos_ordenados = intervalos.atualizar_ordem(
+            self._ordem_artigos, np.array(self._artigos_ordenados, dtype=str), mapa, posicoes_novas, artigos_novos)
+        indice._artigos_ordenados = artigos_ordenados.tolist()
+        return indice
+
+    @classmethod
+    def do_catalogo(cls, crimes):
+        """Constrói o índice a partir de crimes_dict (as posições seguem a ordem das chaves)"""
+        registros = crimes.values()
+        return cls(crimes.keys(), [c['artigo'] for c in registros], [c['descricao_completa'] for c in registros],
+                   [c['tipo_penal'] for c in registros])
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def _faixa(self, inicio, fim):
+        """Linhas dos tokens do vocabulário entre as posições inicio e fim"""
+        return self._linhas[self._inicios[inicio]:self._inicios[fim]]
+
+    def _linhas_prefixo(self, termo):
+        """Crimes com algum token começando por termo (ordenados, sem repetição)
+
+        Retorna também se mais de um token do vocabulário começa por termo.
+        """
+        inicio = bisect_left(self._vocabulario, termo)
+        fim = bisect_left(self._vocabulario, termo + _FIM_PREFIXO, inicio)
+        if fim - inicio <= 1:
+            return self._faixa(inicio, fim), False
+        return np.flatnonzero(self._mascara(self._faixa(inicio, fim))).astype(np.int32), True
+
+    def _linhas_exatas(self, termo):
+        """Crimes que contêm exatamente o token termo"""
+        posicao = bisect_left(self._vocabulario, termo)
+        if posicao < len(self._vocabulario) and self._vocabulario[posicao] == termo:
+            return self._faixa(posicao, posicao + 1)
+        return self._linhas[:0]
+
+    def _mascara(self, linhas):
+        mascara = np.zeros(len(self.chaves), dtype=bool)
+        mascara[linhas] = True
+        return mascara
+
+    def buscar(self, consulta):
+        """Posições dos crimes que casam com a consulta, da mais para a menos relevante"""
+        consulta = normalizar(consulta).strip()
+        termos = re.findall(_PADRAO_TOKEN, consulta)
+        if not termos:
+            return np.empty(0, dtype=np.int32)
+
+        # Começa pelo termo mais seletivo e filtra os candidatos pelos demais
+        por_termo = [self._linhas_prefixo(t) for t in termos]
+        selecao = sorted((linhas for linhas, _ in por_termo), key=len)
+        candidatos = selecao[0]
+        for linhas in selecao[1:]:
+            if not len(candidatos):
+                break
+            if len(linhas) < len(self.chaves):
+                candidatos = candidatos[self._mascara(linhas)[candidatos]]
+
+        if not len(candidatos):
+            encontrados = pc.match_substring(self._textos, consulta).to_numpy(zero_copy_only=False)
+            candidatos = np.flatnonzero(encontrados).astype(np.int32)
+            if not len(candidatos):
+                return candidatos
+
+        # Só termos que casam com vários tokens distinguem os candidatos entre si
+        pontuacao = np.zeros(len(candidatos), dtype=np.int32)
+        for termo, (_, varios_tokens) in zip(termos, por_termo):
+            if varios_tokens:
+                pontuacao += self._mascara(self._linhas_exatas(termo))[candidatos]
+        inicio = bisect_left(self._artigos_ordenados, consulta)
+        fim = bisect_left(self._artigos_ordenados, consulta + _FIM_PREFIXO, inicio)
+        if fim > inicio:
+            pontuacao += (len(termos) + 1) * self._mascara(self._ordem_artigos[inicio:fim])[candidatos]
+
+        if not pontuacao.any():
+            return candidatos
+        return candidatos[np.lexsort((candidatos, -pontuacao))]
+
+    def com_prefixo_artigo(self, prefixo):
+        """Posições (em ordem de catálogo) dos crimes cujo artigo começa por prefixo"""
+        prefixo = normalizar(prefixo).strip()
+        inicio = bisect_left(self._artigos_ordenados, prefixo)
+        fim = bisect_left(self._artigos_ordenados, prefixo + _FIM_PREFIXO, inicio)
+        return np.sort(self._ordem_artigos[inicio:fim])
+
+    def filtrar(self, consulta='', prefixo_artigo='', tipo_penal=None, dentre=None):
+        """Posições dos crimes que atendem a todos os filtros informados
+
+        Com consulta, a ordem é a de relevância de buscar(); sem ela, a ordem do catálogo.
+        dentre restringe o resultado a um conjunto de posições (ex.: de um filtro por pena).
+        """
+        if consulta.strip():
+            posicoes = self.buscar(consulta)
+        else:
+            posicoes = np.arange(len(self.chaves), dtype=np.int32)
+        if prefixo_artigo.strip():
+            posicoes = posicoes[self._mascara(self.com_prefixo_artigo(prefixo_artigo))[posicoes]]
+        if tipo_penal is not None:
+            codigo = self.tipos_penais.index(tipo_penal) if tipo_penal in self.tipos_penais else -1
+            posicoes = posicoes[self._codigos_tipo[posicoes] == codigo]
+        if dentre is not None:
+            posicoes = posicoes[self._mascara(dentre)[posicoes]]
+        return posicoes
+
+    def janela(self, posicoes, pagina, tamanho):
+        """Chaves da página (começando em 1) de uma lista de posições"""
+        inicio = (pagina - 1) * tamanho
+        return [self.chaves[p] for p in posicoes[inicio:inicio + tamanho]]
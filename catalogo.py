@@ -0,0 +1,569 @@
+import codecs
+import hashlib
+import io
+import re
+import time
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as pa_ipc
+
+import busca
+import dosimetria
+import intervalos
+
+# Colunas esperadas no CSV de crimes
+COLUNAS_CSV = [
+    'Artigo_Base', 'Artigo_Completo', 'Descricao_Crime',
+    'Pena_Minima_Valor', 'Pena_Minima_Unidade',
+    'Pena_Maxima_Valor', 'Pena_Maxima_Unidade',
+    'Tipo_Penal_Estrutural'
+]
+
+# Campos de cada registro em crimes_dict (na ordem original)
+CAMPOS_CRIME = [
+    'artigo', 'artigo_base', 'descricao_completa', 'pena_min', 'pena_max',
+    'tipo_penal', 'pena_min_original', 'pena_max_original', 'unidade_original'
+]
+
+# Tamanho do prefixo analisado para detectar a codificação
+TAMANHO_AMOSTRA = 64 * 1024
+
+# Bytes 0x80-0x9F: controles em latin-1, caracteres (aspas, travessões...) em cp1252
+_BYTES_CP1252 = re.compile(rb'[\x80-\x9f]')
+_BYTES_INDEFINIDOS_CP1252 = re.compile(rb'[\x81\x8d\x8f\x90\x9d]')
+
+# Catálogo compilado: versão do formato, gravada nos metadados do arquivo
+VERSAO_COMPILADO = b'4'
+EXTENSAO_COMPILADO = '.arrow'
+# Colunas do catálogo compilado além de 'chave' e CAMPOS_CRIME
+COLUNAS_DERIVADAS = ['tipo_pena', 'violento', 'artigo_busca', 'texto_busca', 'tokens', 'hash_linha']
+_COLUNAS_TEXTO = ['chave', 'artigo', 'artigo_base', 'descricao_completa', 'tipo_penal', 'unidade_original']
+# Colunas com poucos valores distintos, gravadas codificadas em dicionário
+_COLUNAS_CATEGORICAS = ['artigo_base', 'tipo_penal', 'unidade_original']
+
+# Campos numéricos de CAMPOS_CRIME: entram no hash da linha como float64
+_CAMPOS_NUMERICOS = ['pena_min', 'pena_max', 'pena_min_original', 'pena_max_original']
+_MULTIPLICADOR_HASH = np.uint64(1_000_003)
+
+# Divisores para converter cada unidade em anos (demais unidades já estão em anos)
+DIVISORES_UNIDADE = {'mês': 12, 'dia': 360}
+
+
+def _converter_para_anos(valores, unidades):
+    """Converte uma coluna de penas para anos conforme a unidade de cada linha
+
+    Penas já em anos mantêm o valor e o tipo (int ou float) da coluna original.
+    """
+    condicoes = [(unidades == unidade).to_numpy() for unidade in DIVISORES_UNIDADE]
+    divisores = np.select(condicoes, list(DIVISORES_UNIDADE.values()), 1)
+    anos = valores.astype(float) / divisores
+    em_anos = ~np.logical_or.reduce(condicoes)
+    if valores.dtype != anos.dtype and em_anos.any():
+        anos = anos.astype(object).where(~em_anos, valores.astype(object))
+    return anos
+
+
+def _preencher_pena(valores):
+    """Troca as penas ausentes pelo int 0, mantendo o tipo das demais, como na conversão linha a linha"""
+    ausentes = valores.isna()
+    if not ausentes.any():
+        return valores
+    return valores.astype(object).where(~ausentes, 0)
+
+
+def _coluna_pena(valores):
+    """Coluna Arrow de uma pena original; as ausentes no CSV (o int 0 em uma coluna decimal) ficam nulas"""
+    if valores.dtype != object:
+        return pa.array(valores)
+    ausentes = (valores.map(type) == int).to_numpy()
+    return pa.array(valores.astype(float), mask=ausentes)
+
+
+def normalizar_catalogo(df):
+    """Converte o CSV bruto em uma tabela com uma linha por chave de crime, coluna a coluna"""
+    if df.empty:
+        return pd.DataFrame(columns=['chave'] + CAMPOS_CRIME)
+
+    artigo_base = df['Artigo_Base'].fillna('')
+    artigo_completo = df['Artigo_Completo'].fillna(artigo_base)
+    descricao = df['Descricao_Crime'].fillna('')
+    pena_min_valor = _preencher_pena(df['Pena_Minima_Valor'])
+    pena_min_unidade = df['Pena_Minima_Unidade'].fillna('mês')
+    pena_max_valor = _preencher_pena(df['Pena_Maxima_Valor'])
+    pena_max_unidade = df['Pena_Maxima_Unidade'].fillna('mês')
+    tipo_penal = df['Tipo_Penal_Estrutural'].fillna('Crime Base (Caput)')
+
+    # Criar chave única para o crime
+    chave = artigo_completo.astype(str) + ' - ' + descricao.astype(str).str[:80] + '...'
+
+    tabela = pd.DataFrame({
+        'chave': chave,
+        'artigo': artigo_completo,
+        'artigo_base': artigo_base,
+        'descricao_completa': descricao,
+        'pena_min': _converter_para_anos(pena_min_valor, pena_min_unidade),
+        'pena_max': _converter_para_anos(pena_max_valor, pena_max_unidade),
+        'tipo_penal': tipo_penal,
+        'pena_min_original': pena_min_valor,
+        'pena_max_original': pena_max_valor,
+        'unidade_original': pena_min_unidade
+    }).reset_index(drop=True)
+
+    # Chaves repetidas: mantém a posição da primeira ocorrência com os dados da última,
+    # como acontecia ao sobrescrever o dicionário linha a linha
+    if not tabela['chave'].is_unique:
+        ordem = tabela['chave'].drop_duplicates(keep='first')
+        ultimas = tabela.drop_duplicates('chave', keep='last').set_index('chave')
+        tabela = ultimas.loc[ordem.values].reset_index()
+
+    return tabela
+
+
+def processar_dados_crimes(df):
+    """Processa os dados dos crimes para o formato necessário"""
+    return dicionario_crimes(normalizar_catalogo(df))
+
+
+def dicionario_crimes(tabela):
+    """Monta crimes_dict a partir da tabela normalizada, coluna a coluna"""
+    if tabela.empty:
+        return {}
+    colunas = [tabela[campo].tolist() for campo in CAMPOS_CRIME]
+    return {
+        chave: dict(zip(CAMPOS_CRIME, valores))
+        for chave, valores in zip(tabela['chave'].tolist(), zip(*colunas))
+    }
+
+
+def hashes_linhas(tabela):
+    """Hash de 64 bits do conteúdo de cada linha da tabela normalizada (chave e CAMPOS_CRIME)
+
+    As penas entram como float64: uma coluna lida como inteira em uma versão do CSV e como
+    decimal em outra não muda o hash das linhas.
+    """
+    hashes = np.zeros(len(tabela), dtype=np.uint64)
+    for campo in ['chave'] + CAMPOS_CRIME:
+        if campo in _CAMPOS_NUMERICOS:
+            valores = tabela[campo].to_numpy(dtype=np.float64)
+        else:
+            valores = tabela[campo].astype(str).to_numpy(dtype=object)
+        hashes = hashes * _MULTIPLICADOR_HASH ^ pd.util.hash_array(valores, categorize=False)
+    return hashes
+
+
+def comparar_versoes(ids_anteriores, hashes_anteriores, chaves, hashes):
+    """Diferenças entre duas versões do catálogo, com as linhas identificadas pela chave e comparadas pelo hash
+
+    ids_anteriores dá a posição de cada chave da versão anterior (ex.: {chave: id} de VisaoCrimes).
+
+    Retorna um dict com:
+    - origem: para cada linha nova, a posição na versão anterior se o conteúdo não mudou (-1 se não)
+    - mapa: para cada linha anterior, a posição na nova versão se foi mantida (-1 se removida ou alterada)
+    - posicoes_novas: posições das linhas incluídas ou alteradas, que precisam ser processadas
+    - incluidas, alteradas e removidas: listas de chaves
+    """
+    chaves_anteriores = list(ids_anteriores)
+    posicoes = np.fromiter((ids_anteriores.get(chave, -1) for chave in chaves), dtype=np.int64, count=len(chaves))
+    existiam = posicoes >= 0
+    iguais = existiam.copy()
+    iguais[existiam] = hashes_anteriores[posicoes[existiam]] == hashes[existiam]
+    origem = np.where(iguais, posicoes, -1)
+    mapa = np.full(len(chaves_anteriores), -1, dtype=np.int64)
+    mapa[origem[iguais]] = np.flatnonzero(iguais)
+    presentes = np.zeros(len(chaves_anteriores), dtype=bool)
+    presentes[posicoes[existiam]] = True
+    return {
+        'origem': origem,
+        'mapa': mapa,
+        'posicoes_novas': np.flatnonzero(~iguais),
+        'incluidas': [chaves[i] for i in np.flatnonzero(~existiam)],
+        'alteradas': [chaves[i] for i in np.flatnonzero(existiam & ~iguais)],
+        'removidas': [chaves_anteriores[i] for i in np.flatnonzero(~presentes)]
+    }
+
+
+def hash_conteudo(conteudo):
+    """Hash SHA-256 dos bytes do arquivo, usado como chave de cache do catálogo"""
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+def detectar_codificacao(conteudo, tamanho_amostra=TAMANHO_AMOSTRA):
+    """Detecta a codificação analisando apenas um prefixo limitado dos bytes"""
+    if conteudo.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+
+    amostra = conteudo[:tamanho_amostra]
+    try:
+        # Decodificador incremental: um caractere multibyte cortado no fim da amostra não é erro
+        codecs.getincrementaldecoder('utf-8')().decode(amostra, final=len(amostra) == len(conteudo))
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    if _BYTES_CP1252.search(amostra) and not _BYTES_INDEFINIDOS_CP1252.search(amostra):
+        return 'cp1252'
+    return 'latin-1'
+
+
+def ler_csv(conteudo):
+    """Lê o CSV a partir dos bytes com uma única decodificação; retorna (df, relatório)"""
+    tempos = {}
+
+    inicio = time.perf_counter()
+    codificacao = detectar_codificacao(conteudo)
+    tempos['deteccao'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    try:
+        texto = conteudo.decode(codificacao)
+    except UnicodeDecodeError:
+        # O prefixo parecia UTF-8 mas o restante do arquivo não é: latin-1 aceita qualquer byte
+        codificacao = 'latin-1'
+        texto = conteudo.decode(codificacao)
+    tempos['decodificacao'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    engine = 'c'
+    try:
+        df = pd.read_csv(io.StringIO(texto))
+    except pd.errors.ParserError:
+        engine = 'python'
+        df = pd.read_csv(io.StringIO(texto), engine=engine)
+    tempos['parse'] = time.perf_counter() - inicio
+
+    relatorio = {'codificacao': codificacao, 'engine': engine, 'tempos': tempos}
+    return df, relatorio
+
+
+def carregar_catalogo(conteudo):
+    """Lê e processa o CSV de crimes; retorna (df, crimes_dict, relatório)"""
+    df, relatorio = ler_csv(conteudo)
+    inicio = time.perf_counter()
+    crimes_dict = processar_dados_crimes(df)
+    relatorio['tempos']['processamento'] = time.perf_counter() - inicio
+    return df, crimes_dict, relatorio
+
+
+def compilar_catalogo(conteudo, termos_violencia=dosimetria.CRIMES_VIOLENTOS):
+    """Processa o CSV de crimes e acrescenta as colunas derivadas; retorna uma pa.Table
+
+    termos_violencia são os termos que classificam o crime como violento (coluna 'violento').
+    """
+    df, relatorio = ler_csv(conteudo)
+    return _tabela_compilada(normalizar_catalogo(df), conteudo, relatorio['codificacao'], termos_violencia)
+
+
+def _colunas_derivadas(tabela, termos_violencia):
+    """Colunas derivadas (busca, tipo de pena, violento) das linhas da tabela normalizada"""
+    colunas = busca.colunas_busca(tabela['artigo'], tabela['descricao_completa'])
+    colunas['tipo_pena'] = pa.array([dosimetria.classificar_tipo_pena(t) for t in tabela['tipo_penal']], type=pa.int8())
+    colunas['violento'] = busca.contem_termos(colunas['descricao_busca'], termos_violencia, normalizados=True)
+    # Tokens codificados em dicionário: o vocabulário é gravado uma vez e o índice não precisa fatorá-los
+    tokens = colunas['tokens']
+    colunas['tokens'] = pa.ListArray.from_arrays(tokens.offsets, pc.dictionary_encode(tokens.values))
+    return colunas
+
+
+def _tabela_compilada(tabela, conteudo, codificacao, termos_violencia, hashes=None, anterior=None, origem=None,
+                      versao=1):
+    """Tabela Arrow do catálogo normalizado com as colunas derivadas e os metadados
+
+    Com anterior (tabela compilada da versão anterior) e origem (ver comparar_versoes), as
+    colunas derivadas das linhas mantidas são copiadas de anterior e só as demais são processadas.
+    """
+    if hashes is None:
+        hashes = hashes_linhas(tabela)
+    novas = np.arange(len(tabela)) if origem is None else np.flatnonzero(origem < 0)
+    colunas = _colunas_derivadas(tabela.iloc[novas], termos_violencia)
+    if origem is not None:
+        mantidas = np.flatnonzero(origem >= 0)
+        ordem = np.empty(len(tabela), dtype=np.int64)
+        ordem[np.concatenate([mantidas, novas])] = np.arange(len(tabela))
+        for nome in COLUNAS_DERIVADAS[:-1]:
+            copiadas = anterior.column(nome).take(origem[mantidas]).chunks
+            colunas[nome] = pa.concat_arrays([*copiadas, colunas[nome]]).take(ordem)
+    colunas['hash_linha'] = pa.array(hashes)
+    penas = {nome: _coluna_pena(tabela[nome]) for nome in ('pena_min_original', 'pena_max_original')}
+    tipos = {c: str for c in _COLUNAS_TEXTO} | {'pena_min': float, 'pena_max': float}
+    tabela = pa.Table.from_pandas(tabela.astype(tipos), preserve_index=False)
+    for nome in _COLUNAS_CATEGORICAS:
+        tabela = tabela.set_column(tabela.column_names.index(nome), nome, pc.dictionary_encode(tabela.column(nome)))
+    for nome, coluna in penas.items():
+        tabela = tabela.set_column(tabela.column_names.index(nome), nome, coluna)
+    for nome in COLUNAS_DERIVADAS:
+        tabela = tabela.append_column(nome, colunas[nome])
+    metadados = {b'versao_compilado': VERSAO_COMPILADO, b'sha256_csv': hash_conteudo(conteudo).encode(),
+                 b'codificacao_csv': codificacao.encode(), b'termos_violencia': '\n'.join(termos_violencia).encode(),
+                 b'versao_catalogo': str(versao).encode()}
+    return tabela.replace_schema_metadata(metadados).combine_chunks()
+
+
+def gravar_compilado(tabela, caminho):
+    """Grava o catálogo compilado como arquivo Arrow IPC sem compressão (pode ser mapeado em memória)"""
+    with pa_ipc.new_file(caminho, tabela.schema) as arquivo:
+        arquivo.write_table(tabela)
+
+
+def ler_compilado(caminho):
+    """Mapeia o catálogo compilado em memória; as colunas numéricas são lidas sem cópia"""
+    with pa.memory_map(caminho) as origem:
+        tabela = pa_ipc.open_file(origem).read_all()
+    if tabela.schema.metadata is None or tabela.schema.metadata.get(b'versao_compilado') != VERSAO_COMPILADO:
+        raise ValueError(f"{caminho} não é um catálogo compilado na versão {VERSAO_COMPILADO.decode()}")
+    return tabela.combine_chunks()
+
+
+class Catalogo:
+    """Catálogo de crimes somente leitura, compartilhado por todas as sessões do app
+
+    Guarda a tabela Arrow do catálogo compilado (mapeada em memória quando lida de arquivo), a
+    visão somente leitura `crimes` (VisaoCrimes, com a interface de crimes_dict), o índice de busca e índices
+    ordenados por artigo e por pena. Nenhum método altera o catálogo: as sessões recebem o mesmo
+    objeto em vez de cópias, e atualizar() devolve uma nova versão.
+
+    Com anterior (a versão anterior) e diferencas (ver comparar_versoes), os índices são
+    atualizados a partir dos da versão anterior em vez de reconstruídos.
+    """
+
+    def __init__(self, tabela, relatorio, anterior=None, diferencas=None):
+        self.tabela = tabela
+        self.relatorio = relatorio
+        tempos = relatorio['tempos']
+        # Versão (1 na primeira carga, somada a cada atualizar()) e hash do conteúdo de cada linha
+        self.versao = int(tabela.schema.metadata.get(b'versao_catalogo', b'1'))
+        self.hashes = _somente_leitura(tabela.column('hash_linha').to_numpy())
+
+        inicio = time.perf_counter()
+        self.crimes = VisaoCrimes(tabela)
+        self.chaves = self.crimes.chaves
+        tempos['processamento'] = tempos.get('processamento', 0) + time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        colunas_busca = {nome: tabela.column(nome).chunk(0) for nome in ('artigo_busca', 'texto_busca', 'tokens')}
+        tipos_penais = self.crimes.categorias('tipo_penal')
+        if anterior is None:
+            self.indice_busca = busca.IndiceBusca.das_colunas(self.chaves, colunas_busca, tipos_penais)
+        else:
+            novas = diferencas['posicoes_novas']
+            colunas_busca['tokens'] = colunas_busca['tokens'].take(pa.array(novas))
+            self.indice_busca = anterior.indice_busca.atualizado(self.chaves, colunas_busca, diferencas['mapa'],
+                                                                 novas, tipos_penais)
+        tempos['indice_busca'] = time.perf_counter() - inicio
+
+        # Penas em anos (sem cópia quando a tabela está mapeada em memória) e índices ordenados
+        self.pena_min = self.crimes.pena_min
+        self.pena_max = self.crimes.pena_max
+        # As mesmas penas em unidades de ponto fixo, para o cálculo em lote (dosimetria.para_unidades)
+        self.pena_min_unidades = _somente_leitura(dosimetria.para_unidades(self.pena_min))
+        self.pena_max_unidades = _somente_leitura(dosimetria.para_unidades(self.pena_max))
+        artigos = tabela.column('artigo').to_numpy(zero_copy_only=False).astype(str)
+        if anterior is None:
+            self._ordem_artigos = np.argsort(artigos, kind='stable').astype(np.int32)
+            self._artigos_ordenados = artigos[self._ordem_artigos].tolist()
+        else:
+            self._ordem_artigos, artigos_ordenados = intervalos.atualizar_ordem(
+                anterior._ordem_artigos, np.array(anterior._artigos_ordenados, dtype=str), diferencas['mapa'],
+                diferencas['posicoes_novas'], artigos[diferencas['posicoes_novas']])
+            self._artigos_ordenados = artigos_ordenados.tolist()
+
+        inicio = time.perf_counter()
+        if anterior is None:
+            self.indice_penas = intervalos.IndiceIntervalos(self.pena_min, self.pena_max)
+        else:
+            self.indice_penas = anterior.indice_penas.atualizado(self.pena_min, self.pena_max, diferencas['mapa'],
+                                                                 diferencas['posicoes_novas'])
+        tempos['indice_penas'] = time.perf_counter() - inicio
+
+    @classmethod
+    def do_arquivo(cls, caminho):
+        """Carrega o catálogo compilado (.arrow) ou, para outras extensões, o CSV de crimes"""
+        if not caminho.endswith(EXTENSAO_COMPILADO):
+            with open(caminho, 'rb') as arquivo:
+                return cls.do_csv(arquivo.read())
+        inicio = time.perf_counter()
+        tabela = ler_compilado(caminho)
+        metadados = tabela.schema.metadata
+        relatorio = {'codificacao': metadados[b'codificacao_csv'].decode(), 'engine': 'compilado',
+                     'tempos': {'leitura': time.perf_counter() - inicio}}
+        return cls(tabela, relatorio)
+
+    @classmethod
+    def do_csv(cls, conteudo, termos_violencia=dosimetria.CRIMES_VIOLENTOS):
+        """Processa os bytes do CSV de crimes em memória, sem gravar o catálogo compilado"""
+        df, relatorio = ler_csv(conteudo)
+        inicio = time.perf_counter()
+        tabela = _tabela_compilada(normalizar_catalogo(df), conteudo, relatorio['codificacao'], termos_violencia)
+        relatorio['tempos']['processamento'] = time.perf_counter() - inicio
+        return cls(tabela, relatorio)
+
+    def atualizar(self, conteudo):
+        """Nova versão do catálogo a partir do CSV editado, processando só as linhas incluídas ou alteradas
+
+        As linhas são identificadas pela chave e comparadas pelo hash do conteúdo (hashes_linhas);
+        as colunas derivadas e os índices das linhas mantidas vêm desta versão, com os termos de
+        violência dela. Este catálogo não muda: as sessões que o usam seguem com a versão anterior.
+        Os resultados em cache (resultados.calcular, relatorios.corpo_relatorio) são indexados
+        pelos dados do crime, e não pela posição, de modo que os de crimes mantidos continuam
+        valendo e os de crimes alterados deixam de ser consultados.
+        """
+        df, relatorio = ler_csv(conteudo)
+        inicio = time.perf_counter()
+        tabela = normalizar_catalogo(df)
+        hashes = hashes_linhas(tabela)
+        diferencas = comparar_versoes(self.crimes.ids, self.hashes, tabela['chave'].tolist(), hashes)
+        termos = self.tabela.schema.metadata[b'termos_violencia'].decode().split('\n')
+        tabela = _tabela_compilada(tabela, conteudo, relatorio['codificacao'], termos, hashes, self.tabela,
+                                   diferencas['origem'], self.versao + 1)
+        relatorio['tempos']['processamento'] = time.perf_counter() - inicio
+        relatorio['diferencas'] = {campo: len(diferencas[campo]) for campo in ('incluidas', 'alteradas', 'removidas')}
+        return Catalogo(tabela, relatorio, self, diferencas)
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def tabela_lote(self):
+        """Arrays por crime no formato de dosimetria.tabela_crimes, para calcular_lote"""
+        return {
+            'pena_min': self.pena_min_unidades,
+            'pena_max': self.pena_max_unidades,
+            'tipo_pena': _somente_leitura(self.tabela.column('tipo_pena').to_numpy()),
+            'violento': self.crimes.violento
+        }
+
+    def com_artigo(self, artigo):
+        """Posições (em ordem de catálogo) dos crimes com exatamente este artigo"""
+        inicio = bisect_left(self._artigos_ordenados, artigo)
+        fim = bisect_right(self._artigos_ordenados, artigo, inicio)
+        return np.sort(self._ordem_artigos[inicio:fim])
+
+    def com_pena_entre(self, minimo=0, maximo=np.inf):
+        """Posições (em ordem de catálogo) dos crimes com pena mínima e máxima dentro de [minimo, maximo] anos
+
+        Consultas por sobreposição, ponto ou limiar ficam em self.indice_penas (IndiceIntervalos).
+        """
+        return self.indice_penas.contidos_em(minimo, maximo)
+
+
+def _somente_leitura(valores):
+    valores.flags.writeable = False
+    return valores
+
+
+def _menor_inteiro(quantidade):
+    """Menor tipo inteiro com sinal capaz de guardar códigos de 0 a quantidade - 1"""
+    for tipo in (np.int8, np.int16, np.int32):
+        if quantidade <= np.iinfo(tipo).max:
+            return tipo
+    return np.int64
+
+
+class VisaoCrimes(Mapping):
+    """Catálogo em colunas (struct-of-arrays) com a interface de crimes_dict
+
+    Cada crime tem um id inteiro (sua posição). Penas originais ficam em float32 quando a
+    conversão é exata, tipo penal, artigo base e unidade como códigos de categorias, e artigo e
+    descrição nos buffers da tabela Arrow. visao[chave] devolve um RegistroCrime montado sob
+    demanda com os mesmos campos e valores do registro de crimes_dict.
+    """
+
+    def __init__(self, tabela):
+        self.chaves = tabela.column('chave').to_numpy(zero_copy_only=False).tolist()
+        # Posição de cada chave (a ordem de inserção é a do catálogo)
+        self.ids = {chave: id_crime for id_crime, chave in enumerate(self.chaves)}
+
+        # Penas em anos: float64 (as contas da dosimetria dependem do valor exato)
+        self.pena_min = _somente_leitura(tabela.column('pena_min').to_numpy())
+        self.pena_max = _somente_leitura(tabela.column('pena_max').to_numpy())
+
+        self._colunas = {}
+        for campo in ('pena_min_original', 'pena_max_original'):
+            coluna = tabela.column(campo)
+            valores = coluna.to_numpy()
+            compactos = valores.astype(np.float32)
+            if not np.array_equal(compactos.astype(valores.dtype), valores, equal_nan=True):
+                compactos = valores
+            inteiro = pa.types.is_integer(coluna.type)
+            self._colunas[campo] = (_somente_leitura(compactos), int if inteiro else float)
+        self._categorias = {}
+        for campo in ('artigo_base', 'tipo_penal', 'unidade_original'):
+            coluna = tabela.column(campo).chunk(0)
+            if not pa.types.is_dictionary(coluna.type):
+                coluna = pc.dictionary_encode(coluna)
+            categorias = coluna.dictionary.to_pylist()
+            codigos = coluna.indices.to_numpy().astype(_menor_inteiro(len(categorias)))
+            self._categorias[campo] = (_somente_leitura(codigos), categorias)
+        self._textos = {campo: tabela.column(campo).chunk(0) for campo in ('artigo', 'descricao_completa')}
+        # Classificação feita na ingestão; registro['violento'] a expõe sem fazer parte de CAMPOS_CRIME
+        self.violento = _somente_leitura(tabela.column('violento').to_numpy(zero_copy_only=False))
+
+    def __getitem__(self, chave):
+        return RegistroCrime(self, self.ids[chave])
+
+    def __iter__(self):
+        return iter(self.chaves)
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def __contains__(self, chave):
+        return chave in self.ids
+
+    def id(self, chave):
+        """Id inteiro (posição) do crime"""
+        return self.ids[chave]
+
+    def registro(self, id_crime):
+        """Registro do crime pelo id"""
+        return RegistroCrime(self, id_crime)
+
+    def categorias(self, campo):
+        """Valor de um campo categórico (artigo_base, tipo_penal, unidade_original) para cada crime"""
+        codigos, categorias = self._categorias[campo]
+        return [categorias[c] for c in codigos]
+
+    def valor(self, id_crime, campo):
+        """Valor de um campo do crime, com o mesmo tipo Python de crimes_dict"""
+        if campo in self._categorias:
+            codigos, categorias = self._categorias[campo]
+            return categorias[codigos[id_crime]]
+        if campo in self._textos:
+            return self._textos[campo][id_crime].as_py()
+        if campo in self._colunas:
+            valores, tipo = self._colunas[campo]
+            valor = valores[id_crime]
+            # Nulo (NaN): pena ausente no CSV, que crimes_dict registra como o int 0
+            return 0 if np.isnan(valor) else tipo(valor)
+        if campo == 'pena_min':
+            return float(self.pena_min[id_crime])
+        if campo == 'pena_max':
+            return float(self.pena_max[id_crime])
+        if campo == 'violento':
+            return bool(self.violento[id_crime])
+        raise KeyError(campo)
+
+
+class RegistroCrime(Mapping):
+    """Visão de um crime de VisaoCrimes com os campos de CAMPOS_CRIME"""
+
+    __slots__ = ('_visao', 'id')
+
+    def __init__(self, visao, id_crime):
+        self._visao = visao
+        self.id = id_crime
+
+    def __getitem__(self, campo):
+        return self._visao.valor(self.id, campo)
+
+    def __iter__(self):
+        return iter(CAMPOS_CRIME)
+
+    def __len__(self):
+        return len(CAMPOS_CRIME)
+
+    def __repr__(self):
+        return f"RegistroCrime({dict(self)!r})"
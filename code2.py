@@ -1,7 +1,96 @@
+import functools
+import os
+import time
+from collections import deque
+
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
+
+import catalogo
+import dosimetria
+import graficos
+import instrumentacao
+import progressao
+import relatorios
+import resultados
+
+inicio_execucao = time.perf_counter()
+
+
+def nova_medicao():
+    """Medição de uma execução com perfil e memória conforme os controles do painel de diagnóstico"""
+    return instrumentacao.MedicaoExecucao(
+        perfil=st.session_state.get("diagnostico_perfil", False),
+        memoria=st.session_state.get("diagnostico_memoria", False)
+    )
+
+
+# Arquivo JSON lines em que cada execução é acrescentada (opcional), para acompanhar regressões
+ARQUIVO_METRICAS = os.environ.get("METRICAS_DOSIMETRIA")
+
+
+def guardar_medicao(medicao_encerrada):
+    """Encerra a medição e a guarda no histórico da sessão (e no ARQUIVO_METRICAS); retorna o histórico"""
+    historico = st.session_state.setdefault("execucoes", deque(maxlen=instrumentacao.HISTORICO_EXECUCOES))
+    if medicao_encerrada.registro is None:
+        historico.append(medicao_encerrada.encerrar())
+        if ARQUIVO_METRICAS:
+            instrumentacao.gravar_json_linhas([medicao_encerrada.registro], ARQUIVO_METRICAS)
+    return historico
+
+
+def registrar_execucao():
+    """Encerra a medição desta execução e a guarda no histórico da sessão; retorna o histórico"""
+    st.session_state.pop("medicao_em_andamento", None)
+    return guardar_medicao(medicao)
+
+
+# Uma execução completa interrompida (nova interação durante a execução ou erro no script) não chega
+# a registrar_execucao: a medição dela é encerrada aqui, o que desliga o cProfile e o tracemalloc
+interrompida = st.session_state.pop("medicao_em_andamento", None)
+if interrompida is not None:
+    interrompida.anotar(interrompida=True)
+    guardar_medicao(interrompida)
+
+# Tempos por fase desta execução
+medicao = nova_medicao()
+st.session_state["medicao_em_andamento"] = medicao
+
+
+def fragmento(funcao):
+    """st.fragment: uma interação com widgets do fragmento executa de novo só a função, não o script inteiro
+
+    A função usa as variáveis globais da última execução completa. Num rerun só do fragmento a
+    medição da execução completa já foi encerrada: o rerun é medido e registrado à parte, com o
+    nome do fragmento no contexto.
+    """
+    @st.fragment
+    @functools.wraps(funcao)
+    def executar(*args, **kwargs):
+        global medicao
+        if medicao.registro is None:
+            return funcao(*args, **kwargs)
+        medicao = nova_medicao()
+        medicao.anotar(fragmento=funcao.__name__)
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            registrar_execucao()
+    return executar
+
+
+def em_cache_da_sessao(nome, chave, calcular):
+    """Valor intermediário guardado na sessão sob `nome`, recalculado só quando a chave muda
+
+    Guarda um valor por nome (o da chave atual); o acerto fica anotado na medição da execução.
+    """
+    guardado = st.session_state.get(nome)
+    acerto = guardado is not None and guardado[0] == chave
+    medicao.anotar(**{f"{nome}_da_sessao": acerto})
+    if not acerto:
+        guardado = (chave, calcular())
+        st.session_state[nome] = guardado
+    return guardado[1]
+
 
 st.title("⚖️ Simulador de Dosimetria da Pena")
 st.write("**Calculadora completa da dosimetria penal conforme Art. 68 do CP**")
@@ -9,103 +98,202 @@ st.write("**Calculadora completa da dosimetria penal conforme Art. 68 do CP**")
 # Upload do arquivo
 uploaded_file = st.file_uploader("Faça upload do arquivo crimes_cp_final_sem_art68.csv", type=["csv"])
 
-@st.cache_data
-def processar_dados_crimes(df):
-    """Processa os dados dos crimes para o formato necessário"""
-    if df.empty:
-        return {}
-        
-    crimes_dict = {}
-    
-    for idx, row in df.iterrows():
-        artigo_base = row['Artigo_Base'] if pd.notna(row['Artigo_Base']) else ''
-        artigo_completo = row['Artigo_Completo'] if pd.notna(row['Artigo_Completo']) else artigo_base
-        descricao = row['Descricao_Crime'] if pd.notna(row['Descricao_Crime']) else ''
-        pena_min_valor = row['Pena_Minima_Valor'] if pd.notna(row['Pena_Minima_Valor']) else 0
-        pena_min_unidade = row['Pena_Minima_Unidade'] if pd.notna(row['Pena_Minima_Unidade']) else 'mês'
-        pena_max_valor = row['Pena_Maxima_Valor'] if pd.notna(row['Pena_Maxima_Valor']) else 0
-        pena_max_unidade = row['Pena_Maxima_Unidade'] if pd.notna(row['Pena_Maxima_Unidade']) else 'mês'
-        tipo_penal = row['Tipo_Penal_Estrutural'] if pd.notna(row['Tipo_Penal_Estrutural']) else 'Crime Base (Caput)'
-        
-        # Converter para anos
-        if pena_min_unidade == 'mês':
-            pena_min_anos = pena_min_valor / 12
-        elif pena_min_unidade == 'dia':
-            pena_min_anos = pena_min_valor / 360
-        else:
-            pena_min_anos = pena_min_valor
-            
-        if pena_max_unidade == 'mês':
-            pena_max_anos = pena_max_valor / 12
-        elif pena_max_unidade == 'dia':
-            pena_max_anos = pena_max_valor / 360
-        else:
-            pena_max_anos = pena_max_valor
-        
-        # Criar chave única para o crime
-        if pd.notna(artigo_completo) and pd.notna(descricao):
-            chave = f"{artigo_completo} - {descricao[:80]}..."
-            crimes_dict[chave] = {
-                'artigo': artigo_completo,
-                'artigo_base': artigo_base,
-                'descricao_completa': descricao,
-                'pena_min': pena_min_anos,
-                'pena_max': pena_max_anos,
-                'tipo_penal': tipo_penal,
-                'pena_min_original': pena_min_valor,
-                'pena_max_original': pena_max_valor,
-                'unidade_original': pena_min_unidade
-            }
-    
-    return crimes_dict
+# Catálogos enviados mantidos em cache (compartilhados entre sessões); os mais antigos são descartados
+CATALOGOS_ENVIADOS_EM_CACHE = 8
+
+
+@st.cache_resource(show_spinner="Processando catálogo...", max_entries=CATALOGOS_ENVIADOS_EM_CACHE)
+def carregar_catalogo(digest, _arquivo, _anterior=None):
+    """Lê e processa o CSV enviado; o catálogo fica em cache pelo hash do conteúdo e é compartilhado entre sessões
+
+    Com _anterior (o catálogo que a sessão usava antes do novo envio), só as linhas incluídas ou
+    alteradas são processadas (ver catalogo.Catalogo.atualizar).
+    """
+    if _anterior is not None:
+        return _anterior.atualizar(_arquivo.getvalue())
+    return catalogo.Catalogo.do_csv(_arquivo.getvalue())
+
 
-# Carregar dados baseado no upload
-df = pd.DataFrame()
+def ler_envio(arquivo):
+    """Hash do arquivo enviado e os tempos de leitura e hash (feitos uma vez por arquivo, não a cada rerun)"""
+    inicio = time.perf_counter()
+    conteudo = arquivo.getvalue()
+    tempo_leitura = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    digest = catalogo.hash_conteudo(conteudo)
+    return {"digest": digest, "leitura": tempo_leitura, "hash": time.perf_counter() - inicio}
+
+
+# Catálogo do servidor, usado quando nenhum CSV é enviado: compilado (python lote.py compilar ...) ou CSV
+CAMINHO_CATALOGO = os.environ.get(
+    "CATALOGO_DOSIMETRIA",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "crimes_cp_final_sem_art68" + catalogo.EXTENSAO_COMPILADO)
+)
+
+
+@st.cache_resource(show_spinner="Carregando catálogo...", max_entries=2)
+def catalogo_compartilhado(caminho, modificado_em):
+    """Carrega o catálogo do servidor uma vez por processo; é refeito quando o arquivo muda
+
+    Só a versão atual e a anterior (ainda em uso por sessões abertas) ficam em cache.
+    """
+    return catalogo.Catalogo.do_arquivo(caminho)
+
+
+# Resultados da busca exibidos por página na sidebar
+RESULTADOS_POR_PAGINA = 5
+# Opções enviadas ao seletor de crime por vez (o catálogo filtrado é paginado)
+OPCOES_POR_PAGINA = 200
+
+# Carregar dados baseado no upload. Cada sessão guarda só uma referência ao catálogo em cache
+base = None
 crimes_data = {}
+indice_busca = None
+# Identifica o catálogo carregado nas chaves do cache da sessão
+origem_catalogo = None
 
 if uploaded_file is not None:
     try:
-        # Tenta diferentes codificações
-        codificacoes = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252', 'utf-8-sig']
-        
-        for encoding in codificacoes:
-            try:
-                uploaded_file.seek(0)  # Reset file pointer
-                df = pd.read_csv(uploaded_file, encoding=encoding)
-                st.success(f"✅ Dados carregados com sucesso! (Codificação: {encoding})")
-                crimes_data = processar_dados_crimes(df)
-                break
-            except (UnicodeDecodeError, pd.errors.EmptyDataError):
-                continue
-        else:
-            # Se nenhuma codificação funcionou, tenta com engine python
-            try:
-                uploaded_file.seek(0)
-                df = pd.read_csv(uploaded_file, encoding='latin-1', engine='python')
-                st.success("✅ Dados carregados com engine python")
-                crimes_data = processar_dados_crimes(df)
-            except Exception as e:
-                st.error(f"❌ Erro ao carregar arquivo: {e}")
+        # Os bytes são lidos e o hash calculado uma vez por arquivo enviado (file_id muda a cada upload);
+        # o hash identifica o arquivo entre re-uploads
+        inicio = time.perf_counter()
+        envio = em_cache_da_sessao("envio", uploaded_file.file_id, lambda: ler_envio(uploaded_file))
+        tempo_envio = time.perf_counter() - inicio
+
+        # Um novo envio na mesma sessão é tratado como nova versão do catálogo enviado antes
+        inicio = time.perf_counter()
+        base = carregar_catalogo(envio["digest"], uploaded_file, st.session_state.get("catalogo_enviado"))
+        st.session_state["catalogo_enviado"] = base
+        tempo_cache = time.perf_counter() - inicio
+        medicao.registrar("ingestao", tempo_envio + tempo_cache)
+        origem_catalogo = envio["digest"]
+
+        relatorio_carga = base.relatorio
+        st.success(f"✅ Dados carregados com sucesso! (Codificação: {relatorio_carga['codificacao']})")
+        if 'diferencas' in relatorio_carga:
+            diferencas = relatorio_carga['diferencas']
+            st.caption(
+                f"🔄 Versão {base.versao} do catálogo: {diferencas['incluidas']:,} crimes incluídos, "
+                f"{diferencas['alteradas']:,} alterados e {diferencas['removidas']:,} removidos; "
+                "os demais foram aproveitados da versão anterior"
+            )
+        tempos = relatorio_carga['tempos']
+        st.caption(
+            f"⏱️ Leitura: {envio['leitura']*1000:.1f} ms · Hash: {envio['hash']*1000:.1f} ms · "
+            f"Detecção: {tempos['deteccao']*1000:.1f} ms · Decodificação: {tempos['decodificacao']*1000:.1f} ms · "
+            f"Parse ({relatorio_carga['engine']}): {tempos['parse']*1000:.1f} ms · "
+            f"Processamento: {tempos['processamento']*1000:.1f} ms · "
+            f"Índice de busca: {tempos['indice_busca']*1000:.1f} ms · "
+            f"Índice de penas: {tempos['indice_penas']*1000:.1f} ms · "
+            f"Consulta ao cache nesta execução: {tempo_cache*1000:.1f} ms · "
+            f"Pronto em {(time.perf_counter() - inicio_execucao)*1000:.1f} ms nesta execução"
+        )
     except Exception as e:
-        st.error(f"❌ Erro inesperado: {e}")
+        st.error(f"❌ Erro ao carregar arquivo: {e}")
+elif os.path.exists(CAMINHO_CATALOGO):
+    try:
+        with medicao.fase("ingestao"):
+            origem_catalogo = (CAMINHO_CATALOGO, os.path.getmtime(CAMINHO_CATALOGO))
+            base = catalogo_compartilhado(*origem_catalogo)
+        st.success(f"✅ Catálogo do servidor carregado: {os.path.basename(CAMINHO_CATALOGO)}")
+        tempos = base.relatorio['tempos']
+        st.caption(
+            f"⏱️ Leitura: {tempos.get('leitura', tempos.get('parse', 0))*1000:.1f} ms · "
+            f"Processamento: {tempos['processamento']*1000:.1f} ms · "
+            f"Índice de busca: {tempos['indice_busca']*1000:.1f} ms · "
+            f"Índice de penas: {tempos['indice_penas']*1000:.1f} ms · "
+            f"Pronto em {(time.perf_counter() - inicio_execucao)*1000:.1f} ms nesta execução"
+        )
+    except Exception as e:
+        st.error(f"❌ Erro ao carregar catálogo do servidor: {e}")
 else:
     st.info("📁 Faça upload do arquivo CSV para começar")
 
+if base is not None:
+    crimes_data = base.crimes
+    indice_busca = base.indice_busca
+
 # Sidebar
 st.sidebar.header("💡 Sobre")
 st.sidebar.write("**Base Legal:** Art. 68 do Código Penal - Fases: 1.Pena base 2.Atenuantes/Agravantes 3.Majorantes/Minorantes 4.Cálculo 5.Regime 6.Substituição")
 st.sidebar.write(f"**📊 Crimes carregados:** {len(crimes_data)}")
 
-# Busca na sidebar
-st.sidebar.write("**🔍 Buscar crime:**")
-busca = st.sidebar.text_input("Digite o artigo ou descrição:")
 
-if busca and crimes_data:
-    crimes_filtrados = {k: v for k, v in crimes_data.items() if busca.lower() in k.lower()}
-    st.sidebar.write(f"**Resultados ({len(crimes_filtrados)}):**")
-    for chave in list(crimes_filtrados.keys())[:5]:
-        crime_info = crimes_filtrados[chave]
-        st.sidebar.write(f"**{crime_info['artigo']}** - Pena: {crime_info['pena_min']:.1f}-{crime_info['pena_max']:.1f} anos")
+@fragmento
+def busca_sidebar():
+    """Busca na sidebar; digitar ou mudar de página executa de novo só este fragmento"""
+    st.write("**🔍 Buscar crime:**")
+    termo_busca = st.text_input("Digite o artigo ou descrição:")
+
+    if termo_busca and crimes_data:
+        with medicao.fase("busca"):
+            posicoes = indice_busca.buscar(termo_busca)
+        st.write(f"**Resultados ({len(posicoes)}):**")
+        total_paginas = max(1, -(-len(posicoes) // RESULTADOS_POR_PAGINA))
+        pagina = 1
+        if total_paginas > 1:
+            pagina = st.number_input(f"Página (de {total_paginas}):", min_value=1, max_value=total_paginas, value=1)
+        inicio_pagina = (pagina - 1) * RESULTADOS_POR_PAGINA
+        for posicao in posicoes[inicio_pagina:inicio_pagina + RESULTADOS_POR_PAGINA]:
+            crime_info = crimes_data.registro(posicao)
+            st.write(f"**{crime_info['artigo']}** - Pena: {crime_info['pena_min']:.1f}-{crime_info['pena_max']:.1f} anos")
+        st.caption(f"Busca em {medicao.fases['busca']*1000:.2f} ms")
+
+
+with st.sidebar:
+    busca_sidebar()
+
+# Filtro por faixa de pena (IndiceIntervalos do catálogo), aplicado ao seletor de crime da Fase 1
+FILTROS_PENA = [
+    "Sem filtro",
+    "Pena mínima entre",
+    "Pena máxima entre",
+    "Faixa dentro do intervalo",
+    "Faixa sobrepõe o intervalo",
+    "Faixa contém a pena",
+    "Faixa atravessa limite do Art. 33"
+]
+posicoes_pena = None
+
+# Critério e parâmetros do filtro atual (parte da chave das posições do seletor guardadas na sessão)
+filtro_pena_atual = ()
+
+if crimes_data:
+    st.sidebar.write("**📏 Filtrar por pena (anos):**")
+    filtro_pena = st.sidebar.selectbox("Critério:", FILTROS_PENA)
+    indice_penas = base.indice_penas
+    if filtro_pena == "Faixa contém a pena":
+        valor_pena = st.sidebar.number_input("Pena:", min_value=0.0, value=4.0, step=0.5)
+        filtro_pena_atual = (filtro_pena, valor_pena)
+    elif filtro_pena == "Faixa atravessa limite do Art. 33":
+        limiar_pena = st.sidebar.radio("Limite:", [dosimetria.LIMITE_SEMIABERTO, dosimetria.LIMITE_FECHADO],
+                                       format_func=lambda limite: f"{limite} anos", horizontal=True)
+        filtro_pena_atual = (filtro_pena, limiar_pena)
+    elif filtro_pena != "Sem filtro":
+        pena_de, pena_ate = st.sidebar.columns(2)
+        minimo_pena = pena_de.number_input("De:", min_value=0.0, value=0.0, step=0.5)
+        maximo_pena = pena_ate.number_input("Até:", min_value=0.0, value=4.0, step=0.5)
+        filtro_pena_atual = (filtro_pena, minimo_pena, maximo_pena)
+
+    inicio = time.perf_counter()
+    if filtro_pena == "Pena mínima entre":
+        posicoes_pena = indice_penas.com_inicio_entre(minimo_pena, maximo_pena)
+    elif filtro_pena == "Pena máxima entre":
+        posicoes_pena = indice_penas.com_fim_entre(minimo_pena, maximo_pena)
+    elif filtro_pena == "Faixa dentro do intervalo":
+        posicoes_pena = indice_penas.contidos_em(minimo_pena, maximo_pena)
+    elif filtro_pena == "Faixa sobrepõe o intervalo":
+        posicoes_pena = indice_penas.sobrepostos(minimo_pena, maximo_pena)
+    elif filtro_pena == "Faixa contém a pena":
+        posicoes_pena = indice_penas.contendo(valor_pena)
+    elif filtro_pena == "Faixa atravessa limite do Art. 33":
+        posicoes_pena = indice_penas.atravessando(limiar_pena)
+    if posicoes_pena is not None:
+        medicao.registrar("filtro_pena", time.perf_counter() - inicio)
+        st.sidebar.caption(f"{len(posicoes_pena)} crimes ({medicao.fases['filtro_pena']*1000:.2f} ms)")
+
+# Contadores do cache de resultados, preenchidos depois do cálculo da Fase 4
+painel_cache = st.sidebar.empty()
 
 # Se não há dados carregados, mostrar mensagem
 if not crimes_data:
@@ -114,7 +302,7 @@ if not crimes_data:
     
     Para usar o simulador:
     1. **Faça upload do arquivo `crimes_cp_final_sem_art68.csv` acima**
-    2. **Ou certifique-se que o arquivo está no repositório GitHub**
+    2. **Ou compile o catálogo na pasta do app com `python lote.py compilar crimes_cp_final_sem_art68.csv -o crimes_cp_final_sem_art68.arrow`**
     
     O arquivo CSV deve conter as colunas:
     - Artigo_Base, Artigo_Completo, Descricao_Crime
@@ -122,508 +310,338 @@ if not crimes_data:
     - Pena_Maxima_Valor, Pena_Maxima_Unidade
     - Tipo_Penal_Estrutural
     """)
+    registrar_execucao()
     st.stop()
 
-# Fase 1: Pena Base e Circunstâncias
-st.header("1️⃣ Fase 1: Pena Base e Circunstâncias")
-col1, col2 = st.columns([2, 1])
 
-with col1:
-    if crimes_data:
-        crime_selecionado = st.selectbox("Selecione o Crime:", options=list(crimes_data.keys()), format_func=lambda x: x)
-        crime_info = crimes_data[crime_selecionado]
-        min_pena = crime_info['pena_min']
-        max_pena = crime_info['pena_max']
+@fragmento
+def calculadora():
+    """Fases 1 a 3 e os fragmentos de resultado e cenários
+
+    Escolher o crime, a circunstância ou os modificadores executa de novo só este fragmento,
+    não o upload, a sidebar e as referências.
+    """
+    # Fase 1: Pena Base e Circunstâncias
+    st.header("1️⃣ Fase 1: Pena Base e Circunstâncias")
+    col1, col2 = st.columns([2, 1])
+
+    with col1:
+        if crimes_data:
+            # Só a janela atual do catálogo filtrado vai para o navegador
+            filtro1, filtro2, filtro3 = st.columns(3)
+            prefixo_artigo = filtro1.text_input("Artigo começa com:")
+            tipo_filtro = filtro2.selectbox("Tipo penal:", ["Todos"] + indice_busca.tipos_penais)
+            termo_filtro = filtro3.text_input("Filtrar por termo:")
+
+            # Posições guardadas na sessão: mudar a circunstância ou os modificadores não refaz o filtro
+            inicio = time.perf_counter()
+            posicoes_crime = em_cache_da_sessao(
+                "posicoes_crime", (origem_catalogo, filtro_pena_atual, prefixo_artigo, tipo_filtro, termo_filtro),
+                lambda: indice_busca.filtrar(termo_filtro, prefixo_artigo, None if tipo_filtro == "Todos" else tipo_filtro,
+                                             posicoes_pena)
+            )
+            if not len(posicoes_crime):
+                st.warning("Nenhum crime atende aos filtros.")
+                return
+            total_paginas_crime = -(-len(posicoes_crime) // OPCOES_POR_PAGINA)
+            pagina_crime = 1
+            if total_paginas_crime > 1:
+                pagina_crime = st.number_input(f"Página de crimes (de {total_paginas_crime}):", min_value=1,
+                                               max_value=total_paginas_crime, value=1)
+            opcoes_crime = indice_busca.janela(posicoes_crime, pagina_crime, OPCOES_POR_PAGINA)
+            tempo_filtro = time.perf_counter() - inicio
+            medicao.registrar("seletor", tempo_filtro)
+
+            crime_selecionado = st.selectbox("Selecione o Crime:", options=opcoes_crime, format_func=lambda x: x)
+            primeira_opcao = (pagina_crime - 1) * OPCOES_POR_PAGINA + 1
+            st.caption(
+                f"Mostrando {primeira_opcao}-{primeira_opcao + len(opcoes_crime) - 1} de {len(posicoes_crime)} crimes "
+                f"(filtro em {tempo_filtro*1000:.2f} ms)"
+            )
+            crime_info = crimes_data[crime_selecionado]
+            min_pena = crime_info['pena_min']
+            max_pena = crime_info['pena_max']
         
-        st.write(f"**Artigo:** {crime_info['artigo']}")
-        st.write(f"**Tipo penal:** {crime_info['tipo_penal']}")
-        st.write(f"**Descrição:** {crime_info['descricao_completa']}")
-        st.write(f"**Pena original:** {crime_info['pena_min_original']} {crime_info['unidade_original']} a {crime_info['pena_max_original']} {crime_info['unidade_original']}")
-    else:
-        st.error("Erro ao carregar dados dos crimes.")
-
-with col2:
-    circunstancia = st.radio("Circunstância do Crime:", ["Neutra", "Desfavorável", "Gravemente Desfavorável"])
-    pena_base_inicial = min_pena
-    ajuste_circunstancia = {"Neutra": 0, "Desfavorável": 0.2, "Gravemente Desfavorável": 0.4}
-    fator_circunstancia = ajuste_circunstancia[circunstancia]
-    pena_base_ajustada = pena_base_inicial * (1 + fator_circunstancia)
-    
-    st.write(f"**Pena prevista:** {min_pena:.1f} a {max_pena:.1f} anos")
-    st.write(f"**Pena base inicial:** {pena_base_inicial:.1f} anos")
-    st.write(f"**Circunstância {circunstancia.lower()}:** {fator_circunstancia*100:.0f}%")
-    st.success(f"**PENA BASE APÓS CIRCUNSTÂNCIAS: {pena_base_ajustada:.1f} anos**")
-
-# Fase 2: Atenuantes e Agravantes
-st.header("2️⃣ Fase 2: Atenuantes e Agravantes Gerais")
-col1, col2 = st.columns(2)
-
-with col1:
-    st.subheader("🔽 Atenuantes (Art. 65 CP)")
-    atenuantes = st.multiselect("Selecione as atenuantes:", [
-        "Menor de 21 anos na data do fato",
-        "Maior de 70 anos na data da sentença",
-        "Desconhecimento da lei",
-        "Motivo de relevante valor social ou moral",
-        "Arrependimento espontâneo eficiente",
-        "Reparação do dano antes do julgamento",
-        "Coação a que podia resistir",
-        "Cumprimento de ordem superior",
-        "Violenta emoção por ato injusto da vítima",
-        "Confissão espontânea perante autoridade",
-        "Influência de multidão em tumulto (sem provocação)",
-        "Circunstância relevante não prevista em lei (Art. 66)"
-    ])
-
-with col2:
-    st.subheader("🔼 Agravantes (Art. 61 e 62 CP)")
-    agravantes = st.multiselect("Selecione as agravantes:", [
-        "Reincidência",
-        "Motivo fútil ou torpe",
-        "Facilitar/assegurar execução de outro crime",
-        "Traição, emboscada ou dissimulação",
-        "Emprego de veneno, fogo, explosivo, tortura",
-        "Meio insidioso ou cruel",
-        "Perigo comum resultante",
-        "Crime contra ascendente/descendente/irmão/cônjuge",
-        "Abuso de autoridade",
-        "Abuso de relações domésticas/coabitação/hospitalidade",
-        "Violência contra a mulher",
-        "Abuso de poder ou violação de dever profissional",
-        "Crime contra criança/idoso/enfermo/mulher grávida",
-        "Ofendido sob proteção imediata da autoridade",
-        "Ocasião de calamidade pública/desgraça particular",
-        "Embriaguez preordenada",
-        "Nas dependências de instituição de ensino",
-        "Promotor/organizador do concurso de pessoas",
-        "Coação/indução à execução do crime",
-        "Instigação/determinação a pessoa sob autoridade",
-        "Execução mediante paga ou promessa de recompensa"
-    ])
-
-# Fase 3: Majorantes e Minorantes
-st.header("3️⃣ Fase 3: Causas de Aumento/Diminuição")
-majorantes_minorantes_generico = {
-    "majorantes": [
-        "Uso de arma (1/6 a 1/2)", 
-        "Violência grave (1/3 a 2/3)", 
-        "Concurso de 2+ pessoas (1/4 a 1/2)", 
-        "Restrição à liberdade (1/6 a 1/3)", 
-        "Abuso de confiança (1/6 a 1/3)",
-        "Aumento por continuidade delitiva",
-        "Aumento específico do tipo penal"
-    ],
-    "minorantes": [
-        "Valor ínfimo do dano (1/6 a 1/3)", 
-        "Arrependimento posterior (1/6 a 1/3)", 
-        "Circunstâncias atenuantes não previstas (1/6 a 1/3)",
-        "Diminuição específica do tipo penal",
-        "Causa de diminuição de culpabilidade"
-    ]
-}
-
-col1, col2 = st.columns(2)
-with col1:
-    majorantes = st.multiselect("Causas de aumento (majorantes):", majorantes_minorantes_generico["majorantes"])
-with col2:
-    minorantes = st.multiselect("Causas de diminuição (minorantes):", majorantes_minorantes_generico["minorantes"])
-
-# Fase 4: Cálculo Final
-st.header("4️⃣ Fase 4: Cálculo Final da Pena")
-
-if st.button("🎯 Calcular Pena Definitiva", type="primary"):
-    pena_calculada = pena_base_ajustada
-    
-    st.subheader("📊 Detalhamento do Cálculo")
-    calculo_detalhado = f"| Etapa | Valor | Ajuste |\n|-------|-------|---------|\n| **Pena Base Inicial** | {pena_base_inicial:.1f} anos | - |\n| Circunstância {circunstancia} | {pena_base_ajustada:.1f} anos | {fator_circunstancia*100:+.0f}% |\n"
-    
-    # Aplicar atenuantes COM LIMITE DO MÍNIMO LEGAL (Súmula 231)
-    ajustes_atenuantes = []
-    for i, atenuante in enumerate(atenuantes, 1):
-        reducao = pena_base_ajustada * (1/6)
-        # Verificar se a redução não levará abaixo do mínimo legal
-        if (pena_calculada - reducao) >= min_pena:
-            pena_calculada -= reducao
-            ajustes_atenuantes.append(reducao)
-            calculo_detalhado += f"| Atenuante {i} | {pena_calculada:.1f} anos | -{reducao:.1f} anos |\n"
+            st.write(f"**Artigo:** {crime_info['artigo']}")
+            st.write(f"**Tipo penal:** {crime_info['tipo_penal']}")
+            st.write(f"**Descrição:** {crime_info['descricao_completa']}")
+            st.write(f"**Pena original:** {crime_info['pena_min_original']} {crime_info['unidade_original']} a {crime_info['pena_max_original']} {crime_info['unidade_original']}")
         else:
-            # Aplicar apenas a redução possível sem ultrapassar o mínimo
-            reducao_possivel = pena_calculada - min_pena
-            if reducao_possivel > 0:
-                pena_calculada = min_pena
-                ajustes_atenuantes.append(reducao_possivel)
-                calculo_detalhado += f"| Atenuante {i} | {pena_calculada:.1f} anos | -{reducao_possivel:.1f} anos |\n"
-                calculo_detalhado += f"| **LIMITE MÍNIMO** | **{min_pena:.1f} anos** | **Súmula 231** |\n"
-            else:
-                calculo_detalhado += f"| Atenuante {i} | {pena_calculada:.1f} anos | -0.0 anos (limite mínimo) |\n"
-    
-    # Aplicar agravantes
-    ajustes_agravantes = []
-    for i, agravante in enumerate(agravantes, 1):
-        aumento = pena_base_ajustada * (1/6)
-        pena_calculada += aumento
-        ajustes_agravantes.append(aumento)
-        calculo_detalhado += f"| Agravante {i} | {pena_calculada:.1f} anos | +{aumento:.1f} anos |\n"
-    
-    # Aplicar majorantes
-    ajustes_majorantes = []
-    for i, majorante in enumerate(majorantes, 1):
-        aumento = pena_base_ajustada * (1/4)
-        pena_calculada += aumento
-        ajustes_majorantes.append(aumento)
-        calculo_detalhado += f"| Majorante {i} | {pena_calculada:.1f} anos | +{aumento:.1f} anos |\n"
-    
-    # Aplicar minorantes COM LIMITE DO MÍNIMO LEGAL (Súmula 231)
-    ajustes_minorantes = []
-    for i, minorante in enumerate(minorantes, 1):
-        reducao = pena_base_ajustada * (1/4)
-        # Verificar se a redução não levará abaixo do mínimo legal
-        if (pena_calculada - reducao) >= min_pena:
-            pena_calculada -= reducao
-            ajustes_minorantes.append(reducao)
-            calculo_detalhado += f"| Minorante {i} | {pena_calculada:.1f} anos | -{reducao:.1f} anos |\n"
-        else:
-            # Aplicar apenas a redução possível sem ultrapassar o mínimo
-            reducao_possivel = pena_calculada - min_pena
-            if reducao_possivel > 0:
-                pena_calculada = min_pena
-                ajustes_minorantes.append(reducao_possivel)
-                calculo_detalhado += f"| Minorante {i} | {pena_calculada:.1f} anos | -{reducao_possivel:.1f} anos |\n"
-                calculo_detalhado += f"| **LIMITE MÍNIMO** | **{min_pena:.1f} anos** | **Súmula 231** |\n"
-            else:
-                calculo_detalhado += f"| Minorante {i} | {pena_calculada:.1f} anos | -0.0 anos (limite mínimo) |\n"
-    
-    # Aplicar limites legais (mínimo e máximo)
-    pena_final = max(min_pena, min(max_pena, pena_calculada))
-    
-    # Verificar se houve aplicação da Súmula 231
-    aplicou_sumula_231 = False
-    if pena_calculada < min_pena:
-        aplicou_sumula_231 = True
-        pena_final = min_pena
-        calculo_detalhado += f"| **SÚMULA 231** | **{pena_final:.1f} anos** | **Limite mínimo legal** |\n"
-    else:
-        calculo_detalhado += f"| **LIMITES LEGAIS** | **{pena_final:.1f} anos** | **Ajuste final** |"
-    
-    st.markdown(calculo_detalhado)
-    
-    # Alertas sobre a Súmula 231
-    if aplicou_sumula_231:
-        st.warning("""
-        **⚠️ APLICAÇÃO DA SÚMULA 231 DO STJ**
+            st.error("Erro ao carregar dados dos crimes.")
+
+    with col2:
+        circunstancia = st.radio("Circunstância do Crime:", dosimetria.CIRCUNSTANCIAS)
+        pena_base_inicial = min_pena
+        fator_circunstancia = dosimetria.AJUSTE_CIRCUNSTANCIA[circunstancia]
+        pena_base_ajustada = pena_base_inicial * (1 + fator_circunstancia)
+    
+        st.write(f"**Pena prevista:** {min_pena:.1f} a {max_pena:.1f} anos")
+        st.write(f"**Pena base inicial:** {pena_base_inicial:.1f} anos")
+        st.write(f"**Circunstância {circunstancia.lower()}:** {fator_circunstancia*100:.0f}%")
+        st.success(f"**PENA BASE APÓS CIRCUNSTÂNCIAS: {pena_base_ajustada:.1f} anos**")
+
+    # Fase 2: Atenuantes e Agravantes
+    st.header("2️⃣ Fase 2: Atenuantes e Agravantes Gerais")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("🔽 Atenuantes (Art. 65 CP)")
+        opcoes_atenuantes = [
+            "Menor de 21 anos na data do fato",
+            "Maior de 70 anos na data da sentença",
+            "Desconhecimento da lei",
+            "Motivo de relevante valor social ou moral",
+            "Arrependimento espontâneo eficiente",
+            "Reparação do dano antes do julgamento",
+            "Coação a que podia resistir",
+            "Cumprimento de ordem superior",
+            "Violenta emoção por ato injusto da vítima",
+            "Confissão espontânea perante autoridade",
+            "Influência de multidão em tumulto (sem provocação)",
+            "Circunstância relevante não prevista em lei (Art. 66)"
+        ]
+        atenuantes = st.multiselect("Selecione as atenuantes:", opcoes_atenuantes)
+
+    with col2:
+        st.subheader("🔼 Agravantes (Art. 61 e 62 CP)")
+        opcoes_agravantes = [
+            "Reincidência",
+            "Motivo fútil ou torpe",
+            "Facilitar/assegurar execução de outro crime",
+            "Traição, emboscada ou dissimulação",
+            "Emprego de veneno, fogo, explosivo, tortura",
+            "Meio insidioso ou cruel",
+            "Perigo comum resultante",
+            "Crime contra ascendente/descendente/irmão/cônjuge",
+            "Abuso de autoridade",
+            "Abuso de relações domésticas/coabitação/hospitalidade",
+            "Violência contra a mulher",
+            "Abuso de poder ou violação de dever profissional",
+            "Crime contra criança/idoso/enfermo/mulher grávida",
+            "Ofendido sob proteção imediata da autoridade",
+            "Ocasião de calamidade pública/desgraça particular",
+            "Embriaguez preordenada",
+            "Nas dependências de instituição de ensino",
+            "Promotor/organizador do concurso de pessoas",
+            "Coação/indução à execução do crime",
+            "Instigação/determinação a pessoa sob autoridade",
+            "Execução mediante paga ou promessa de recompensa"
+        ]
+        agravantes = st.multiselect("Selecione as agravantes:", opcoes_agravantes)
+
+    # Fase 3: Majorantes e Minorantes
+    st.header("3️⃣ Fase 3: Causas de Aumento/Diminuição")
+    majorantes_minorantes_generico = {
+        "majorantes": [
+            "Uso de arma (1/6 a 1/2)", 
+            "Violência grave (1/3 a 2/3)", 
+            "Concurso de 2+ pessoas (1/4 a 1/2)", 
+            "Restrição à liberdade (1/6 a 1/3)", 
+            "Abuso de confiança (1/6 a 1/3)",
+            "Aumento por continuidade delitiva",
+            "Aumento específico do tipo penal"
+        ],
+        "minorantes": [
+            "Valor ínfimo do dano (1/6 a 1/3)", 
+            "Arrependimento posterior (1/6 a 1/3)", 
+            "Circunstâncias atenuantes não previstas (1/6 a 1/3)",
+            "Diminuição específica do tipo penal",
+            "Causa de diminuição de culpabilidade"
+        ]
+    }
+
+    col1, col2 = st.columns(2)
+    with col1:
+        majorantes = st.multiselect("Causas de aumento (majorantes):", majorantes_minorantes_generico["majorantes"])
+    with col2:
+        minorantes = st.multiselect("Causas de diminuição (minorantes):", majorantes_minorantes_generico["minorantes"])
+    st.caption("Casos com vários crimes (concurso material, formal ou continuado – Arts. 69 a 71) são combinados "
+               "com python lote.py concurso catalogo.csv crimes.csv -o casos.csv")
+
+    resultado_do_calculo(crime_info, crime_selecionado, circunstancia, atenuantes, agravantes, majorantes, minorantes)
+    limites = (len(opcoes_atenuantes), len(opcoes_agravantes),
+               len(majorantes_minorantes_generico["majorantes"]), len(majorantes_minorantes_generico["minorantes"]))
+    cenarios(crime_info, circunstancia, agravantes, majorantes, minorantes, limites)
+
+
+@fragmento
+def resultado_do_calculo(crime_info, crime_selecionado, circunstancia, atenuantes, agravantes, majorantes, minorantes):
+    """Fases 4 a 7 e gráfico; o botão executa de novo só este fragmento"""
+    # Fase 4: Cálculo Final
+    st.header("4️⃣ Fase 4: Cálculo Final da Pena")
+
+    if st.button("🎯 Calcular Pena Definitiva", type="primary"):
+        # Verificar reincidência
+        reincidente = "Reincidência" in agravantes
+        # Resultado, tabela e gráfico dependem só da chave canônica; cenários repetidos vêm do cache
+        inicio = time.perf_counter()
+        chave_resultado = resultados.chave_canonica(crime_info, circunstancia, atenuantes, agravantes, majorantes, minorantes)
+        acertos_antes = resultados.estatisticas()['acertos']
+        calculo = resultados.calcular(chave_resultado)
+        tempo_calculo = time.perf_counter() - inicio
+        veio_do_cache = resultados.estatisticas()['acertos'] > acertos_antes
+        medicao.registrar("calculo", tempo_calculo)
+        medicao.anotar(crime=crime_selecionado, resultado_do_cache=veio_do_cache)
+        resultado = calculo['resultado']
+        pena_final = resultado['pena_final']
+        aplicou_sumula_231 = resultado['aplicou_sumula_231']
+
+        st.subheader("📊 Detalhamento do Cálculo")
+        st.caption(f"{'Resultado do cache' if veio_do_cache else 'Calculado'} em {tempo_calculo*1000:.2f} ms")
+        calculo_detalhado = calculo['tabela']
+        st.markdown(calculo_detalhado)
+    
+        # Alertas sobre a Súmula 231
+        if aplicou_sumula_231:
+            st.warning("""
+            **⚠️ APLICAÇÃO DA SÚMULA 231 DO STJ**
         
-        *"A incidência da circunstância atenuante não pode conduzir à redução da pena abaixo do mínimo legal."*
+            *"A incidência da circunstância atenuante não pode conduzir à redução da pena abaixo do mínimo legal."*
         
-        **Fundamento:** A pena foi limitada ao mínimo legal previsto para o crime, conforme jurisprudência consolidada.
-        """)
+            **Fundamento:** A pena foi limitada ao mínimo legal previsto para o crime, conforme jurisprudência consolidada.
+            """)
 
-    # Fase 5: Tipo de Pena Privativa
-    st.header("5️⃣ Fase 5: Tipo de Pena Privativa")
-    
-    # Determinar tipo de pena (Reclusão ou Detenção)
-    tipo_pena_info = crime_info.get('tipo_penal', '')
-    if 'Reclusão' in str(tipo_pena_info):
-        tipo_pena = "RECLUSÃO"
-        cor_tipo_pena = "#ff4444"
-        descricao_tipo = "Pena mais grave - Regimes: Fechado, Semiaberto ou Aberto"
-    elif 'Detenção' in str(tipo_pena_info):
-        tipo_pena = "DETENÇÃO"
-        cor_tipo_pena = "#ffaa00"
-        descricao_tipo = "Pena menos grave - Regimes: Semiaberto ou Aberto"
-    else:
-        tipo_pena = "PENA PRIVATIVA DE LIBERDADE"
-        cor_tipo_pena = "#666666"
-        descricao_tipo = "Tipo de pena a ser definido conforme a natureza do crime"
-    
-    st.markdown(f"""
-    <div style="background-color: {cor_tipo_pena}20; padding: 15px; border-radius: 10px; border-left: 5px solid {cor_tipo_pena};">
-        <h3 style="color: {cor_tipo_pena}; margin: 0;">📋 TIPO DE PENA: {tipo_pena}</h3>
-        <p style="margin: 5px 0 0 0;">{descricao_tipo}</p>
-    </div>
-    """, unsafe_allow_html=True)
-
-    # Fase 6: Regime de Cumprimento - CORREÇÃO COMPLETA
-    st.header("6️⃣ Fase 6: Regime de Cumprimento")
-    
-    # Verificar reincidência
-    reincidente = "Reincidência" in agravantes
-    
-    # DEBUG: Mostrar valores importantes
-    st.write(f"**🔍 VALORES PARA CÁLCULO DO REGIME:**")
-    st.write(f"- Pena final: {pena_final:.2f} anos")
-    st.write(f"- Réu reincidente: {'SIM' if reincidente else 'NÃO'}")
-    st.write(f"- Tipo de pena: {tipo_pena}")
-    
-    # LÓGICA CORRIGIDA - VERIFICAÇÃO POR ORDEM DE PRIORIDADE
-    regime = ""
-    cor_regime = ""
-    descricao = ""
-    fundamento = ""
+        # Fase 5: Tipo de Pena Privativa
+        medicao.etapa("regime")
+        st.header("5️⃣ Fase 5: Tipo de Pena Privativa")
     
-    if tipo_pena == "RECLUSÃO":
-        # VERIFICAÇÃO EM ORDEM DECRESCENTE DE PENA
-        if pena_final > 8:
-            regime = "FECHADO"
-            cor_regime = "#ff4444"
-            descricao = "Presídio de segurança máxima/média"
-            fundamento = "Art. 33, §2º, 'a' - Pena superior a 8 anos"
-            st.write("✅ **Condição:** pena_final > 8 → REGIME FECHADO")
-            
-        elif pena_final > 4:  # Maior que 4 e menor ou igual a 8
-            if not reincidente:
-                regime = "SEMIABERTO"
-                cor_regime = "#ffaa00"
-                descricao = "Colônia agrícola, industrial ou similar"
-                fundamento = "Art. 33, §2º, 'b' - Não reincidente, pena superior a 4 até 8 anos"
-                st.write("✅ **Condição:** 4 < pena_final ≤ 8 + não reincidente → SEMIABERTO")
-            else:
-                regime = "FECHADO"
-                cor_regime = "#ff4444"
-                descricao = "Presídio de segurança máxima/média"
-                fundamento = "Art. 33, §2º - Reincidente, pena superior a 4 até 8 anos"
-                st.write("✅ **Condição:** 4 < pena_final ≤ 8 + reincidente → FECHADO")
-                
-        else:  # pena_final <= 4
-            if not reincidente:
-                regime = "ABERTO"
-                cor_regime = "#44cc44"
-                descricao = "Casa de albergado, trabalho externo"
-                fundamento = "Art. 33, §2º, 'c' - Não reincidente, pena até 4 anos"
-                st.write("✅ **Condição:** pena_final ≤ 4 + não reincidente → ABERTO")
-            else:
-                regime = "SEMIABERTO"
-                cor_regime = "#ffaa00"
-                descricao = "Colônia agrícola, industrial ou similar"
-                fundamento = "Art. 33, §2º - Reincidente, pena até 4 anos"
-                st.write("✅ **Condição:** pena_final ≤ 4 + reincidente → SEMIABERTO")
-    
-    else:  # DETENÇÃO
-        if pena_final > 4:
-            regime = "SEMIABERTO"
-            cor_regime = "#ffaa00"
-            descricao = "Colônia agrícola, industrial ou similar"
-            fundamento = "Art. 33 - Detenção: pena superior a 4 anos = semiaberto"
-            st.write("✅ **Condição:** pena_final > 4 (detenção) → SEMIABERTO")
-        else:
-            regime = "ABERTO"
-            cor_regime = "#44cc44"
-            descricao = "Casa de albergado, trabalho externo"
-            fundamento = "Art. 33 - Detenção: pena até 4 anos = aberto"
-            st.write("✅ **Condição:** pena_final ≤ 4 (detenção) → ABERTO")
-    
-    # Verificar se o regime foi determinado
-    if not regime:
-        regime = "INDETERMINADO"
-        cor_regime = "#666666"
-        descricao = "Não foi possível determinar o regime"
-        fundamento = "Erro no cálculo"
-        st.error("❌ **ERRO:** Não foi possível determinar o regime!")
-    
-    st.markdown(f"""
-    <div style="background-color: {cor_regime}20; padding: 20px; border-radius: 10px; border-left: 5px solid {cor_regime};">
-        <h2 style="color: {cor_regime}; margin: 0;">🔒 REGIME {regime}</h2>
-        <p style="margin: 10px 0 0 0; font-size: 16px;"><strong>{descricao}</strong></p>
-        <p style="margin: 5px 0 0 0; font-size: 12px; color: #666;"><em>{fundamento}</em></p>
-    </div>
-    """, unsafe_allow_html=True)
-
-    # Fase 7: Substituição da Pena
-    st.header("7️⃣ Fase 7: Substituição por Pena Restritiva de Direitos")
-    
-    # Verificar condições para substituição (Art. 44 CP)
-    pode_substituir = False
-    condicoes = []
+        # Determinar tipo de pena (Reclusão ou Detenção)
+        tipo_pena = resultado['tipo_pena']
+        st.markdown(relatorios.cartao_tipo_pena(resultado), unsafe_allow_html=True)
+
+        # Fase 6: Regime de Cumprimento - CORREÇÃO COMPLETA
+        st.header("6️⃣ Fase 6: Regime de Cumprimento")
     
-    # Condição I: Pena até 4 anos e crime sem violência
-    if pena_final <= 4:
-        condicoes.append("✅ Pena não superior a 4 anos")
-        # Verificar se é crime violento (simplificado)
-        crimes_violentos = ["homicídio", "lesão corporal", "latrocínio", "estupro", "roubo"]
-        crime_violento = any(violento in crime_info['descricao_completa'].lower() for violento in crimes_violentos)
-        
-        if not crime_violento:
-            condicoes.append("✅ Crime sem violência ou grave ameaça")
-            pode_substituir = True
-        else:
-            condicoes.append("❌ Crime com violência ou grave ameaça")
-    else:
-        condicoes.append("❌ Pena superior a 4 anos")
+        # DEBUG: Mostrar valores importantes
+        st.write("**🔍 VALORES PARA CÁLCULO DO REGIME:**")
+        st.write(f"- Pena final: {pena_final:.2f} anos ({dosimetria.formatar_pena(resultado['pena_final_unidades'])})")
+        st.write(f"- Réu reincidente: {'SIM' if reincidente else 'NÃO'}")
+        st.write(f"- Tipo de pena: {tipo_pena}")
     
-    # Condição II: Não reincidente
-    if not reincidente:
-        condicoes.append("✅ Réu não reincidente")
-        pode_substituir = pode_substituir and True
-    else:
-        condicoes.append("❌ Réu reincidente")
-        # Exceção: Art. 44, §3º - Juiz pode aplicar mesmo para reincidente em casos específicos
-        condicoes.append("⚠️ Juiz pode analisar aplicação excepcional")
+        st.write(f"✅ **Condição:** {resultado['condicao_regime']}")
+        st.markdown(relatorios.cartao_regime(resultado), unsafe_allow_html=True)
+
+        # Progressão de regime projetada a partir do regime inicial e da pena final
+        st.write("**📅 Progressão de regime (tempo desde o início do cumprimento):**")
+        marcos = progressao.marcos_caso(dosimetria.REGIMES.index(resultado['regime']), resultado['pena_final_unidades'])
+        st.dataframe({
+            "Condenação": ["Comum", "Crime hediondo"],
+            "Fração": [fracao for fracao, *_ in marcos],
+            "Semiaberto após": [dosimetria.formatar_pena(semiaberto) if semiaberto is not None else "—"
+                                for _, semiaberto, _, _ in marcos],
+            "Aberto após": [dosimetria.formatar_pena(aberto) if aberto is not None else "—" for _, _, aberto, _ in marcos],
+            "Término": [dosimetria.formatar_pena(termino) for *_, termino in marcos]
+        }, hide_index=True)
+
+        # Fase 7: Substituição da Pena
+        medicao.etapa("substituicao")
+        st.header("7️⃣ Fase 7: Substituição por Pena Restritiva de Direitos")
     
-    # Condição III: Análise do Art. 59
-    condicoes.append("✅ Análise favorável dos critérios do Art. 59")
+        # Verificar condições para substituição (Art. 44 CP)
+        pode_substituir = resultado['pode_substituir']
+        condicoes = resultado['condicoes_substituicao']
     
-    if pode_substituir:
-        substituicao = "**CABE SUBSTITUIÇÃO** por pena restritiva de direitos"
-        cor_subst = "#44cc44"
-        fundamento_subst = "Art. 44 CP - Preenchidos os requisitos legais"
+        if pode_substituir:
+            # Tipos de penas restritivas possíveis
+            st.subheader("📋 Penas Restritivas de Direitos Possíveis (Art. 43 CP)")
         
-        # Tipos de penas restritivas possíveis
-        st.subheader("📋 Penas Restritivas de Direitos Possíveis (Art. 43 CP)")
+            col_penas1, col_penas2 = st.columns(2)
         
-        col_penas1, col_penas2 = st.columns(2)
-        
-        with col_penas1:
-            st.write("""
-            **Penas Restritivas:**
-            - 💰 Prestação pecuniária
-            - 🏛️ Prestação de serviços à comunidade
-            - 🚫 Interdição temporária de direitos
-            - 🎯 Limitação de fim de semana
-            - 📉 Perda de bens e valores
-            """)
+            with col_penas1:
+                st.write("""
+                **Penas Restritivas:**
+                - 💰 Prestação pecuniária
+                - 🏛️ Prestação de serviços à comunidade
+                - 🚫 Interdição temporária de direitos
+                - 🎯 Limitação de fim de semana
+                - 📉 Perda de bens e valores
+                """)
         
-        with col_penas2:
-            st.write("""
-            **Regras de Conversão:**
-            - Pena ≤ 1 ano: multa OU 1 restritiva
-            - Pena > 1 ano: 1 restritiva + multa OU 2 restritivas
-            - Descumprimento: conversão em privativa (Art. 44, §4º)
-            """)
-    
-    else:
-        substituicao = "**NÃO CABE SUBSTITUIÇÃO**"
-        cor_subst = "#ff4444"
-        fundamento_subst = "Art. 44 CP - Não preenchidos os requisitos legais"
-    
-    st.markdown(f"""
-    <div style="background-color: {cor_subst}20; padding: 15px; border-radius: 10px; border-left: 5px solid {cor_subst};">
-        <h3 style="color: {cor_subst}; margin: 0;">{substituicao}</h3>
-        <p style="margin: 5px 0 0 0;">{fundamento_subst}</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Mostrar condições analisadas
-    st.write("**📝 Condições analisadas para substituição:**")
-    for condicao in condicoes:
-        st.write(condicao)
+            with col_penas2:
+                st.write("""
+                **Regras de Conversão:**
+                - Pena ≤ 1 ano: multa OU 1 restritiva
+                - Pena > 1 ano: 1 restritiva + multa OU 2 restritivas
+                - Descumprimento: conversão em privativa (Art. 44, §4º)
+                """)
 
-    # GRÁFICOS PLOTLY
-    st.header("📊 Visualização da Dosimetria")
-    
-    # Gráfico 1: Composição da Pena
-    st.subheader("🎯 Composição da Pena Final")
-    
-    # Preparar dados para o gráfico de composição
-    categorias = []
-    valores = []
-    cores = []
-    textos = []
-    
-    # Pena base
-    categorias.append("Pena Base")
-    valores.append(pena_base_inicial)
-    cores.append("#2196F3")
-    textos.append(f"Base: {pena_base_inicial:.1f} anos")
-    
-    # Ajuste por circunstância
-    if fator_circunstancia > 0:
-        categorias.append(f"Circunstância<br>({circunstancia})")
-        valores.append(pena_base_ajustada - pena_base_inicial)
-        cores.append("#9C27B0")
-        textos.append(f"+{(pena_base_ajustada - pena_base_inicial):.1f} anos")
-    
-    # Atenuantes
-    if ajustes_atenuantes:
-        categorias.append("Atenuantes")
-        valores.append(-sum(ajustes_atenuantes))
-        cores.append("#4CAF50")
-        textos.append(f"-{sum(ajustes_atenuantes):.1f} anos")
-    
-    # Agravantes
-    if ajustes_agravantes:
-        categorias.append("Agravantes")
-        valores.append(sum(ajustes_agravantes))
-        cores.append("#FF9800")
-        textos.append(f"+{sum(ajustes_agravantes):.1f} anos")
-    
-    # Majorantes
-    if ajustes_majorantes:
-        categorias.append("Majorantes")
-        valores.append(sum(ajustes_majorantes))
-        cores.append("#F44336")
-        textos.append(f"+{sum(ajustes_majorantes):.1f} anos")
-    
-    # Minorantes
-    if ajustes_minorantes:
-        categorias.append("Minorantes")
-        valores.append(-sum(ajustes_minorantes))
-        cores.append("#00BCD4")
-        textos.append(f"-{sum(ajustes_minorantes):.1f} anos")
+        st.markdown(relatorios.cartao_substituicao(resultado), unsafe_allow_html=True)
     
-    # Criar gráfico de barras horizontal
-    fig_composicao = go.Figure()
+        # Mostrar condições analisadas
+        st.write("**📝 Condições analisadas para substituição:**")
+        for condicao in condicoes:
+            st.write(condicao)
+
+        # GRÁFICOS PLOTLY
+        medicao.etapa("grafico")
+        st.header("📊 Visualização da Dosimetria")
     
-    for i, (cat, val, cor, texto) in enumerate(zip(categorias, valores, cores, textos)):
-        fig_composicao.add_trace(go.Bar(
-            y=[cat],
-            x=[val],
-            orientation='h',
-            marker_color=cor,
-            text=[texto],
-            textposition='auto',
-            hovertemplate=f"<b>{cat}</b><br>Valor: {val:+.1f} anos<extra></extra>",
-            name=cat
-        ))
+        # Gráfico 1: Composição da Pena
+        st.subheader("🎯 Composição da Pena Final")
     
-    fig_composicao.update_layout(
-        title="Impacto dos Componentes na Pena Final",
-        xaxis_title="Anos de Pena",
-        yaxis_title="Componentes",
-        showlegend=False,
-        height=400,
-        plot_bgcolor='rgba(240,240,240,0.8)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(size=12),
-        margin=dict(l=50, r=50, t=80, b=50)
+        # Figura em cache junto com o resultado (ver resultados.calcular)
+        fig_composicao = calculo['figura']
+
+        st.plotly_chart(fig_composicao, use_container_width=True)
+
+        # Resumo final estilizado
+        medicao.etapa("resumo")
+        st.markdown(relatorios.cartao_resumo(resultado), unsafe_allow_html=True)
+
+    medicao.etapa()
+
+    estatisticas_cache = resultados.estatisticas()
+    painel_cache.caption(
+        f"🧮 Cache de resultados: {estatisticas_cache['acertos']} acertos · {estatisticas_cache['falhas']} falhas · "
+        f"{estatisticas_cache['descartes']} descartes · {estatisticas_cache['tamanho']}/{estatisticas_cache['capacidade']} entradas"
     )
-    
-    # Adicionar linha da pena final
-    fig_composicao.add_vline(x=pena_final, line_dash="dash", line_color="#FF5722", 
-                            annotation_text=f"Pena Final: {pena_final:.1f} anos",
-                            annotation_position="top right")
-    
-    # Adicionar linha do mínimo legal se aplicou Súmula 231
-    if aplicou_sumula_231:
-        fig_composicao.add_vline(x=min_pena, line_dash="dot", line_color="#FF0000",
-                                annotation_text=f"Mínimo Legal: {min_pena:.1f} anos (Súmula 231)",
-                                annotation_position="bottom right")
-    
-    st.plotly_chart(fig_composicao, use_container_width=True)
-
-    # Resumo final estilizado
-    st.markdown(f"""
-    <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 25px; border-radius: 15px; margin: 20px 0; text-align: center; box-shadow: 0 8px 25px rgba(0,0,0,0.2);">
-        <h3 style="color: white; margin: 0 0 15px 0; font-weight: 600;">🎯 RESUMO FINAL DA DOSIMETRIA</h3>
-        <div style="display: flex; justify-content: space-around; align-items: center; flex-wrap: wrap;">
-            <div style="background: rgba(255,255,255,0.9); padding: 15px; border-radius: 10px; margin: 5px; min-width: 200px;">
-                <div style="font-weight: bold; color: #333; font-size: 16px;">Pena Final</div>
-                <div style="font-size: 24px; font-weight: bold; color: #2196F3;">{pena_final:.1f} anos</div>
-            </div>
-            <div style="background: rgba(255,255,255,0.9); padding: 15px; border-radius: 10px; margin: 5px; min-width: 200px;">
-                <div style="font-weight: bold; color: #333; font-size: 16px;">Tipo de Pena</div>
-                <div style="font-size: 16px; font-weight: bold; color: {cor_tipo_pena};">{tipo_pena}</div>
-            </div>
-            <div style="background: rgba(255,255,255,0.9); padding: 15px; border-radius: 10px; margin: 5px; min-width: 200px;">
-                <div style="font-weight: bold; color: #333; font-size: 16px;">Regime</div>
-                <div style="font-size: 16px; font-weight: bold; color: {cor_regime};">{regime}</div>
-            </div>
-            <div style="background: rgba(255,255,255,0.9); padding: 15px; border-radius: 10px; margin: 5px; min-width: 200px;">
-                <div style="font-weight: bold; color: #333; font-size: 16px;">Substituição</div>
-                <div style="font-size: 14px; font-weight: bold; color: {cor_subst};">{substituicao.replace('**', '')}</div>
-            </div>
-        </div>
-        {"<div style='background: rgba(255,255,255,0.9); padding: 10px; border-radius: 10px; margin: 10px;'><div style='font-weight: bold; color: #ff4444;'>⚠️ APLICADA SÚMULA 231 - PENA LIMITADA AO MÍNIMO LEGAL</div></div>" if aplicou_sumula_231 else ""}
-    </div>
-    """, unsafe_allow_html=True)
+
+
+@fragmento
+def cenarios(crime_info, circunstancia, agravantes, majorantes, minorantes, limites):
+    """Grade "e se" com todos os cenários do crime; o interruptor executa de novo só este fragmento
+
+    limites são as quantidades de opções de atenuantes, agravantes, majorantes e minorantes.
+    """
+    st.header("🔮 Cenários: e se...?")
+    if st.toggle("Calcular todos os cenários para este crime"):
+        # A grade depende só do crime: fica na sessão enquanto circunstância e modificadores mudam
+        inicio = time.perf_counter()
+        chave_crime = resultados.chave_crime(crime_info)
+        grade = em_cache_da_sessao("grade_cenarios", chave_crime + limites,
+                                   lambda: dosimetria.grade_cenarios(*chave_crime, *limites))
+        tempo_grade = time.perf_counter() - inicio
+        medicao.registrar("cenarios", tempo_grade)
+        origem_grade = "guardados na sessão" if medicao.contexto["grade_cenarios_da_sessao"] else "calculados"
+        st.caption(f"{int(grade['valido'].sum()):,} cenários {origem_grade} em {tempo_grade*1000:.1f} ms")
+
+        # Resumo por circunstância e reincidência sobre todas as quantidades de modificadores
+        resumo = {"Circunstância": [], "Reincidente": [], "Pena mínima": [], "Pena máxima": [],
+                  "Regimes possíveis": [], "Cenários com substituição": []}
+        for nivel, nome_circunstancia in enumerate(dosimetria.CIRCUNSTANCIAS):
+            for reincidencia in (False, True):
+                validos = grade['valido'][nivel, ..., int(reincidencia)]
+                penas = grade['pena_final'][nivel, ..., int(reincidencia)][validos]
+                regimes = grade['regime'][nivel, ..., int(reincidencia)][validos]
+                substituicoes = grade['pode_substituir'][nivel, ..., int(reincidencia)][validos]
+                resumo["Circunstância"].append(nome_circunstancia)
+                resumo["Reincidente"].append("SIM" if reincidencia else "NÃO")
+                resumo["Pena mínima"].append(dosimetria.formatar_pena(penas.min()))
+                resumo["Pena máxima"].append(dosimetria.formatar_pena(penas.max()))
+                resumo["Regimes possíveis"].append(", ".join(
+                    regime for codigo, regime in enumerate(dosimetria.REGIMES) if (regimes == codigo).any()))
+                resumo["Cenários com substituição"].append(f"{substituicoes.mean()*100:.0f}%")
+        st.dataframe(resumo, hide_index=True)
+
+        # Atenuantes × agravantes com as demais escolhas atuais
+        fatia = (dosimetria.CIRCUNSTANCIAS.index(circunstancia), slice(None), slice(None),
+                 len(majorantes), len(minorantes), int("Reincidência" in agravantes))
+        st.plotly_chart(graficos.figura_grade(dosimetria.em_anos(grade['pena_final'][fatia]), grade['regime'][fatia],
+                                              grade['pode_substituir'][fatia], grade['valido'][fatia]),
+                        use_container_width=True)
+
+
+calculadora()
 
 # SEÇÃO DE REFERÊNCIAS LEGAIS COMPLETAS
 st.header("📚 Referências Legais Completas")
@@ -713,7 +731,21 @@ with tab4:
     - Requer bom comportamento e demais requisitos
     - Análise pelo Juízo da Execução Penal
     """)
+    st.caption("A projeção de cada caso aparece na Fase 6; para coortes, a ocupação mensal por regime é gerada "
+               "com python lote.py projetar resultados.csv -o ocupacao.csv")
 
 st.markdown("---")
 st.write("**⚖️ Ferramenta educacional - Consulte sempre a legislação atual e um profissional do direito**")
-st.write("**📚 Base legal:** Arts. 33, 43-48, 59, 61, 65, 68 do Código Penal Brasileiro")
+st.write("**📚 Base legal:** Arts. 33, 43-48, 59, 61, 65, 68-71 do Código Penal Brasileiro")
+
+# Painel de diagnóstico: tempos por fase das últimas execuções desta sessão
+historico_execucoes = registrar_execucao()
+with st.sidebar.expander("🛠️ Diagnóstico"):
+    st.toggle("Perfil (cProfile) das próximas execuções", key="diagnostico_perfil")
+    st.toggle("Pico de memória (tracemalloc)", key="diagnostico_memoria")
+    st.caption(f"Últimas {len(historico_execucoes)} execuções (tempos em ms; \"outros\" é o restante do script)")
+    st.dataframe(instrumentacao.tabela_execucoes(list(historico_execucoes)), hide_index=True)
+    if historico_execucoes[-1]['perfil']:
+        st.code(historico_execucoes[-1]['perfil'], language=None)
+    st.download_button("Exportar execuções (JSON lines)", instrumentacao.para_json_linhas(historico_execucoes),
+                       file_name="execucoes_dosimetria.jsonl", mime="application/x-ndjson")
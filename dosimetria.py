@@ -0,0 +1,576 @@
+import numpy as np
+
+import busca
+
+# Penas em ponto fixo: unidades inteiras de 1/60 de dia, com ano de 360 dias e mês de 30 (como na
+# conversão do catálogo). Com a pena mínima em dias inteiros, a pena base ajustada (6/5 ou 7/5 da
+# mínima) e as frações de 1/6 e 1/4 sobre ela são exatas; nos demais casos são truncadas na unidade
+DIAS_POR_ANO = 360
+DIAS_POR_MES = 30
+UNIDADES_POR_DIA = 60
+UNIDADES_POR_ANO = DIAS_POR_ANO * UNIDADES_POR_DIA
+
+# Fase 1: ajuste da pena base conforme as circunstâncias (Art. 59)
+AJUSTE_CIRCUNSTANCIA = {"Neutra": 0, "Desfavorável": 0.2, "Gravemente Desfavorável": 0.4}
+CIRCUNSTANCIAS = list(AJUSTE_CIRCUNSTANCIA)
+# O mesmo ajuste em quintos da pena mínima, para o cálculo em ponto fixo
+QUINTOS_CIRCUNSTANCIA = {nome: round(ajuste * 5) for nome, ajuste in AJUSTE_CIRCUNSTANCIA.items()}
+_QUINTOS_POR_NIVEL = np.array(list(QUINTOS_CIRCUNSTANCIA.values()), dtype=np.int32)
+
+# Fases 2 e 3: frações (1/6 e 1/4) aplicadas sobre a pena base ajustada
+DIVISOR_ATENUANTE_AGRAVANTE = 6
+DIVISOR_MAJORANTE_MINORANTE = 4
+
+# Fases 5-7: tipos de pena, regimes (Art. 33) e limite para substituição (Art. 44)
+TIPOS_PENA = ("RECLUSÃO", "DETENÇÃO", "PENA PRIVATIVA DE LIBERDADE")
+RECLUSAO, DETENCAO, PRIVATIVA = range(len(TIPOS_PENA))
+REGIMES = ("FECHADO", "SEMIABERTO", "ABERTO")
+FECHADO, SEMIABERTO, ABERTO = range(len(REGIMES))
+LIMITE_FECHADO = 8
+LIMITE_SEMIABERTO = 4
+LIMITE_SUBSTITUICAO = 4
+_UNIDADES_FECHADO = LIMITE_FECHADO * UNIDADES_POR_ANO
+_UNIDADES_SEMIABERTO = LIMITE_SEMIABERTO * UNIDADES_POR_ANO
+_UNIDADES_SUBSTITUICAO = LIMITE_SUBSTITUICAO * UNIDADES_POR_ANO
+
+# Concurso de crimes: material (Art. 69) soma as penas; formal (Art. 70) e continuado (Art. 71)
+# aumentam a mais grave conforme a quantidade de crimes (2, 3, ...; a última fração vale para mais)
+CONCURSOS = ("MATERIAL", "FORMAL", "CONTINUADO")
+MATERIAL, FORMAL, CONTINUADO = range(len(CONCURSOS))
+EXASPERACAO = {
+    FORMAL: ((1, 6), (1, 5), (1, 4), (1, 3), (1, 2)),
+    CONTINUADO: ((1, 6), (1, 5), (1, 4), (1, 3), (1, 2), (2, 3))
+}
+# Frações de aumento por [concurso, quantidade de crimes] (nenhum aumento com um só crime)
+_QUANTIDADE_MAXIMA_EXASPERACAO = 1 + max(len(fracoes) for fracoes in EXASPERACAO.values())
+_FRACOES_EXASPERACAO = np.zeros((len(CONCURSOS), _QUANTIDADE_MAXIMA_EXASPERACAO + 1, 2), dtype=np.int64)
+_FRACOES_EXASPERACAO[..., 1] = 1
+for _concurso, _fracoes in EXASPERACAO.items():
+    _FRACOES_EXASPERACAO[_concurso, 2:2 + len(_fracoes)] = _fracoes
+    _FRACOES_EXASPERACAO[_concurso, 2 + len(_fracoes):] = _fracoes[-1]
+
+# Verificação simplificada de crime violento (Art. 44, I): termos procurados na descrição, sem
+# diferenciar acentos. O catálogo é classificado uma vez na ingestão (ver busca.contem_termos)
+CRIMES_VIOLENTOS = ["homicídio", "lesão corporal", "latrocínio", "estupro", "roubo"]
+
+# Fundamento e condição de cada desfecho do Art. 33: (tipo, faixa, reincidente) -> textos
+_FUNDAMENTOS_REGIME = {
+    (RECLUSAO, 'acima_8', False): ("Art. 33, §2º, 'a' - Pena superior a 8 anos", "pena_final > 8 → REGIME FECHADO"),
+    (RECLUSAO, 'acima_8', True): ("Art. 33, §2º, 'a' - Pena superior a 8 anos", "pena_final > 8 → REGIME FECHADO"),
+    (RECLUSAO, 'ate_8', False): ("Art. 33, §2º, 'b' - Não reincidente, pena superior a 4 até 8 anos", "4 < pena_final ≤ 8 + não reincidente → SEMIABERTO"),
+    (RECLUSAO, 'ate_8', True): ("Art. 33, §2º - Reincidente, pena superior a 4 até 8 anos", "4 < pena_final ≤ 8 + reincidente → FECHADO"),
+    (RECLUSAO, 'ate_4', False): ("Art. 33, §2º, 'c' - Não reincidente, pena até 4 anos", "pena_final ≤ 4 + não reincidente → ABERTO"),
+    (RECLUSAO, 'ate_4', True): ("Art. 33, §2º - Reincidente, pena até 4 anos", "pena_final ≤ 4 + reincidente → SEMIABERTO"),
+    (DETENCAO, 'acima_4', None): ("Art. 33 - Detenção: pena superior a 4 anos = semiaberto", "pena_final > 4 (detenção) → SEMIABERTO"),
+    (DETENCAO, 'ate_4', None): ("Art. 33 - Detenção: pena até 4 anos = aberto", "pena_final ≤ 4 (detenção) → ABERTO"),
+}
+
+# Etapas que reduzem a pena (exibidas com sinal negativo no detalhamento)
+_ETAPAS_REDUCAO = ('Atenuante', 'Minorante')
+
+
+def para_unidades(anos):
+    """Pena em anos (número ou array) em unidades de ponto fixo, arredondada para a unidade mais próxima
+
+    Arrays viram int32 e números viram int. Penas acima de ~99 mil anos não cabem em int32.
+    """
+    unidades = np.rint(np.asarray(anos, dtype=float) * UNIDADES_POR_ANO)
+    if np.abs(unidades).max(initial=0) > np.iinfo(np.int32).max:
+        raise ValueError("pena fora do intervalo representável em unidades de ponto fixo (int32)")
+    if unidades.ndim == 0:
+        return int(unidades)
+    return unidades.astype(np.int32)
+
+
+def em_anos(unidades):
+    """Pena em unidades de ponto fixo convertida para anos (float), só para exibição e saída"""
+    if np.ndim(unidades) == 0:
+        return int(unidades) / UNIDADES_POR_ANO
+    return np.asarray(unidades) / UNIDADES_POR_ANO
+
+
+def anos_meses_dias(unidades):
+    """(anos, meses, dias) de uma pena em unidades; frações de dia são desprezadas (Art. 11 CP)"""
+    anos, dias = divmod(int(unidades) // UNIDADES_POR_DIA, DIAS_POR_ANO)
+    meses, dias = divmod(dias, DIAS_POR_MES)
+    return anos, meses, dias
+
+
+def formatar_pena(unidades):
+    """Pena em unidades por extenso, ex.: 4 anos, 2 meses e 12 dias"""
+    partes = [f"{quantidade} {singular if quantidade == 1 else plural}"
+              for quantidade, singular, plural in zip(anos_meses_dias(unidades), ('ano', 'mês', 'dia'),
+                                                      ('anos', 'meses', 'dias'))
+              if quantidade]
+    if not partes:
+        return "0 dias"
+    return partes[0] if len(partes) == 1 else f"{', '.join(partes[:-1])} e {partes[-1]}"
+
+
+def classificar_tipo_pena(tipo_penal):
+    """Retorna o código do tipo de pena (RECLUSAO, DETENCAO ou PRIVATIVA) a partir do tipo penal"""
+    if 'Reclusão' in str(tipo_penal):
+        return RECLUSAO
+    if 'Detenção' in str(tipo_penal):
+        return DETENCAO
+    return PRIVATIVA
+
+
+def crime_violento(descricao, termos=CRIMES_VIOLENTOS):
+    """Indica se a descrição menciona crime com violência ou grave ameaça (sem diferenciar acentos)"""
+    descricao = busca.normalizar(descricao)
+    return any(busca.normalizar(termo).strip() in descricao for termo in termos if termo.strip())
+
+
+def violento_do_crime(crime_info):
+    """Classificação gravada na ingestão (campo 'violento') ou, se ausente, crime_violento() da descrição"""
+    violento = crime_info.get('violento')
+    if violento is None:
+        return crime_violento(crime_info['descricao_completa'])
+    return bool(violento)
+
+
+def _reduzir_com_limite(pena, reducao, min_pena):
+    """Aplica uma redução sem ultrapassar o mínimo legal (Súmula 231); retorna (pena, ajuste, situação)"""
+    if (pena - reducao) >= min_pena:
+        return pena - reducao, reducao, 'aplicada'
+    reducao_possivel = pena - min_pena
+    if reducao_possivel > 0:
+        return min_pena, reducao_possivel, 'limitada'
+    return pena, 0, 'sem_efeito'
+
+
+def calcular_pena(min_pena, max_pena, circunstancia, n_atenuantes=0, n_agravantes=0, n_majorantes=0, n_minorantes=0):
+    """Fases 1 a 4: pena base, circunstâncias, atenuantes/agravantes e majorantes/minorantes
+
+    As contas são feitas em unidades de ponto fixo (ver para_unidades). Penas e ajustes do
+    resultado vêm em anos para exibição; pena_final_unidades é a pena final exata.
+    """
+    fator_circunstancia = AJUSTE_CIRCUNSTANCIA[circunstancia]
+    minimo = para_unidades(min_pena)
+    maximo = para_unidades(max_pena)
+    pena_base_ajustada = minimo * (5 + QUINTOS_CIRCUNSTANCIA[circunstancia]) // 5
+    fracao_16 = pena_base_ajustada // DIVISOR_ATENUANTE_AGRAVANTE
+    fracao_14 = pena_base_ajustada // DIVISOR_MAJORANTE_MINORANTE
+    pena_calculada = pena_base_ajustada
+
+    etapas = []
+    ajustes = {'atenuantes': [], 'agravantes': [], 'majorantes': [], 'minorantes': []}
+
+    # Atenuantes COM LIMITE DO MÍNIMO LEGAL (Súmula 231)
+    for i in range(1, n_atenuantes + 1):
+        pena_calculada, reducao, situacao = _reduzir_com_limite(pena_calculada, fracao_16, minimo)
+        if situacao != 'sem_efeito':
+            ajustes['atenuantes'].append(reducao)
+        etapas.append(('Atenuante', i, pena_calculada, reducao, situacao))
+
+    for i in range(1, n_agravantes + 1):
+        pena_calculada += fracao_16
+        ajustes['agravantes'].append(fracao_16)
+        etapas.append(('Agravante', i, pena_calculada, fracao_16, 'aplicada'))
+
+    for i in range(1, n_majorantes + 1):
+        pena_calculada += fracao_14
+        ajustes['majorantes'].append(fracao_14)
+        etapas.append(('Majorante', i, pena_calculada, fracao_14, 'aplicada'))
+
+    # Minorantes COM LIMITE DO MÍNIMO LEGAL (Súmula 231)
+    for i in range(1, n_minorantes + 1):
+        pena_calculada, reducao, situacao = _reduzir_com_limite(pena_calculada, fracao_14, minimo)
+        if situacao != 'sem_efeito':
+            ajustes['minorantes'].append(reducao)
+        etapas.append(('Minorante', i, pena_calculada, reducao, situacao))
+
+    # Limites legais (mínimo e máximo)
+    pena_final = max(minimo, min(maximo, pena_calculada))
+    aplicou_sumula_231 = pena_calculada < minimo
+    if aplicou_sumula_231:
+        pena_final = minimo
+
+    return {
+        'min_pena': min_pena,
+        'max_pena': max_pena,
+        'circunstancia': circunstancia,
+        'fator_circunstancia': fator_circunstancia,
+        'pena_base_inicial': min_pena,
+        'pena_base_ajustada': em_anos(pena_base_ajustada),
+        'etapas': [(nome, i, em_anos(pena), em_anos(ajuste), situacao) for nome, i, pena, ajuste, situacao in etapas],
+        'ajustes_atenuantes': [em_anos(ajuste) for ajuste in ajustes['atenuantes']],
+        'ajustes_agravantes': [em_anos(ajuste) for ajuste in ajustes['agravantes']],
+        'ajustes_majorantes': [em_anos(ajuste) for ajuste in ajustes['majorantes']],
+        'ajustes_minorantes': [em_anos(ajuste) for ajuste in ajustes['minorantes']],
+        'pena_calculada': em_anos(pena_calculada),
+        'pena_final': em_anos(pena_final),
+        'pena_final_unidades': pena_final,
+        'aplicou_sumula_231': aplicou_sumula_231
+    }
+
+
+def determinar_regime(pena_unidades, reincidente, tipo_pena):
+    """Fase 6: regime inicial (Art. 33) para a pena em unidades; retorna (regime, fundamento, condição)"""
+    if tipo_pena == RECLUSAO:
+        if pena_unidades > _UNIDADES_FECHADO:
+            faixa, regime = 'acima_8', FECHADO
+        elif pena_unidades > _UNIDADES_SEMIABERTO:
+            faixa, regime = 'ate_8', FECHADO if reincidente else SEMIABERTO
+        else:
+            faixa, regime = 'ate_4', SEMIABERTO if reincidente else ABERTO
+        fundamento, condicao = _FUNDAMENTOS_REGIME[(RECLUSAO, faixa, bool(reincidente))]
+    else:
+        # Detenção (e tipo não identificado) seguem a regra da detenção
+        if pena_unidades > _UNIDADES_SEMIABERTO:
+            faixa, regime = 'acima_4', SEMIABERTO
+        else:
+            faixa, regime = 'ate_4', ABERTO
+        fundamento, condicao = _FUNDAMENTOS_REGIME[(DETENCAO, faixa, None)]
+    return REGIMES[regime], fundamento, condicao
+
+
+def analisar_substituicao(pena_unidades, reincidente, violento):
+    """Fase 7: substituição por restritiva de direitos (Art. 44) para a pena em unidades
+
+    Retorna (pode_substituir, condições).
+    """
+    pode_substituir = False
+    condicoes = []
+
+    # Condição I: Pena até 4 anos e crime sem violência
+    if pena_unidades <= _UNIDADES_SUBSTITUICAO:
+        condicoes.append("✅ Pena não superior a 4 anos")
+        if not violento:
+            condicoes.append("✅ Crime sem violência ou grave ameaça")
+            pode_substituir = True
+        else:
+            condicoes.append("❌ Crime com violência ou grave ameaça")
+    else:
+        condicoes.append("❌ Pena superior a 4 anos")
+
+    # Condição II: Não reincidente
+    if not reincidente:
+        condicoes.append("✅ Réu não reincidente")
+    else:
+        condicoes.append("❌ Réu reincidente")
+        # Exceção: Art. 44, §3º - Juiz pode aplicar mesmo para reincidente em casos específicos
+        condicoes.append("⚠️ Juiz pode analisar aplicação excepcional")
+
+    # Condição III: Análise do Art. 59
+    condicoes.append("✅ Análise favorável dos critérios do Art. 59")
+
+    return pode_substituir, condicoes
+
+
+def calcular_dosimetria(crime_info, circunstancia, n_atenuantes=0, n_agravantes=0,
+                        n_majorantes=0, n_minorantes=0, reincidente=False):
+    """Fases 1 a 7 para um caso: pena final, tipo de pena, regime e substituição"""
+    return calcular_caso(
+        crime_info['pena_min'], crime_info['pena_max'], classificar_tipo_pena(crime_info.get('tipo_penal', '')),
+        violento_do_crime(crime_info), circunstancia,
+        n_atenuantes, n_agravantes, n_majorantes, n_minorantes, reincidente
+    )
+
+
+def calcular_caso(min_pena, max_pena, tipo_pena, violento, circunstancia, n_atenuantes=0, n_agravantes=0,
+                  n_majorantes=0, n_minorantes=0, reincidente=False):
+    """calcular_dosimetria() a partir apenas dos dados do crime que alteram o resultado"""
+    resultado = calcular_pena(min_pena, max_pena, circunstancia, n_atenuantes, n_agravantes, n_majorantes, n_minorantes)
+    regime, fundamento, condicao = determinar_regime(resultado['pena_final_unidades'], reincidente, tipo_pena)
+    pode_substituir, condicoes = analisar_substituicao(resultado['pena_final_unidades'], reincidente, violento)
+    resultado.update({
+        'reincidente': reincidente,
+        'tipo_pena': TIPOS_PENA[tipo_pena],
+        'regime': regime,
+        'fundamento_regime': fundamento,
+        'condicao_regime': condicao,
+        'pode_substituir': pode_substituir,
+        'condicoes_substituicao': condicoes
+    })
+    return resultado
+
+
+def tabela_calculo(resultado):
+    """Tabela Markdown com o detalhamento de cada etapa do cálculo"""
+    min_pena = resultado['min_pena']
+    linhas = [
+        "| Etapa | Valor | Ajuste |\n|-------|-------|---------|\n",
+        f"| **Pena Base Inicial** | {resultado['pena_base_inicial']:.1f} anos | - |\n",
+        f"| Circunstância {resultado['circunstancia']} | {resultado['pena_base_ajustada']:.1f} anos | {resultado['fator_circunstancia']*100:+.0f}% |\n"
+    ]
+    for nome, i, pena, ajuste, situacao in resultado['etapas']:
+        if situacao == 'sem_efeito':
+            linhas.append(f"| {nome} {i} | {pena:.1f} anos | -0.0 anos (limite mínimo) |\n")
+            continue
+        sinal = '-' if nome in _ETAPAS_REDUCAO else '+'
+        linhas.append(f"| {nome} {i} | {pena:.1f} anos | {sinal}{ajuste:.1f} anos |\n")
+        if situacao == 'limitada':
+            linhas.append(f"| **LIMITE MÍNIMO** | **{min_pena:.1f} anos** | **Súmula 231** |\n")
+
+    if resultado['aplicou_sumula_231']:
+        linhas.append(f"| **SÚMULA 231** | **{resultado['pena_final']:.1f} anos** | **Limite mínimo legal** |\n")
+    else:
+        linhas.append(f"| **LIMITES LEGAIS** | **{resultado['pena_final']:.1f} anos** | **Ajuste final** |")
+    return ''.join(linhas)
+
+
+def tabela_crimes(crimes, termos_violencia=CRIMES_VIOLENTOS):
+    """Arrays por crime (na ordem de crimes.keys()) usados pelo cálculo em lote, com penas em unidades"""
+    registros = list(crimes.values())
+    descricoes = [c['descricao_completa'] for c in registros]
+    return {
+        'pena_min': para_unidades([c['pena_min'] for c in registros]),
+        'pena_max': para_unidades([c['pena_max'] for c in registros]),
+        'tipo_pena': np.array([classificar_tipo_pena(c.get('tipo_penal', '')) for c in registros], dtype=np.int8),
+        'violento': busca.contem_termos(descricoes, termos_violencia).to_numpy(zero_copy_only=False)
+    }
+
+
+def _reduzir_lote(pena, reducao, min_pena, quantidade):
+    """Reduções sucessivas com limite do mínimo legal, na mesma ordem do cálculo individual"""
+    limitou = np.zeros(np.broadcast_shapes(*map(np.shape, (pena, reducao, min_pena, quantidade))), dtype=bool)
+    for i in range(int(quantidade.max(initial=0))):
+        ativo = quantidade > i
+        cabe = (pena - reducao) >= min_pena
+        parcial = ativo & ~cabe & ((pena - min_pena) > 0)
+        pena = np.where(ativo & cabe, pena - reducao, pena)
+        pena = np.where(parcial, min_pena, pena)
+        limitou |= parcial
+    return pena, limitou
+
+
+def _aumentar_lote(pena, aumento, quantidade):
+    """Aumentos sucessivos, na mesma ordem do cálculo individual"""
+    for i in range(int(quantidade.max(initial=0))):
+        pena = np.where(quantidade > i, pena + aumento, pena)
+    return pena
+
+
+def regime_lote(pena_final, reincidente, tipo_pena):
+    """Fase 6 vetorizada: códigos de REGIMES para cada caso (pena_final em unidades)"""
+    faixa = np.where(pena_final > _UNIDADES_FECHADO, FECHADO,
+                     np.where(pena_final > _UNIDADES_SEMIABERTO, SEMIABERTO, ABERTO)).astype(np.int8)
+    # Reclusão: o reincidente sobe um regime (o fechado é o mais grave)
+    regime_reclusao = faixa - (reincidente & (faixa > FECHADO))
+    regime_detencao = np.where(pena_final > _UNIDADES_SEMIABERTO, SEMIABERTO, ABERTO)
+    return np.where(tipo_pena == RECLUSAO, regime_reclusao, regime_detencao).astype(np.int8)
+
+
+def substituicao_lote(pena_final, violento):
+    """Fase 7 vetorizada: possibilidade de substituição (Art. 44), com pena_final em unidades"""
+    return (pena_final <= _UNIDADES_SUBSTITUICAO) & ~violento
+
+
+def calcular_lote(tabela, crime_ids, circunstancias, n_atenuantes, n_agravantes,
+                  n_majorantes, n_minorantes, reincidente):
+    """Fases 1 a 7 para vários casos de uma vez
+
+    crime_ids indexa as linhas de `tabela` (ver tabela_crimes) e circunstancias
+    indexa CIRCUNSTANCIAS. Retorna um dicionário de arrays com pena_final (em unidades de ponto
+    fixo, int32; ver em_anos), tipo_pena, regime (códigos de REGIMES), pode_substituir,
+    aplicou_sumula_231 e atingiu_minimo (alguma redução foi limitada pelo mínimo legal). Os
+    argumentos por caso podem ter formas diferentes, desde que compatíveis por broadcasting (ver
+    grade_cenarios).
+    """
+    crime_ids = np.asarray(crime_ids)
+    n_atenuantes = np.asarray(n_atenuantes)
+    n_agravantes = np.asarray(n_agravantes)
+    n_majorantes = np.asarray(n_majorantes)
+    n_minorantes = np.asarray(n_minorantes)
+    reincidente = np.asarray(reincidente, dtype=bool)
+
+    tipo_pena = tabela['tipo_pena'][crime_ids]
+    resultado = _penas_lote(tabela['pena_min'][crime_ids], tabela['pena_max'][crime_ids], circunstancias,
+                            n_atenuantes, n_agravantes, n_majorantes, n_minorantes)
+    resultado.update({
+        'tipo_pena': tipo_pena,
+        'regime': regime_lote(resultado['pena_final'], reincidente, tipo_pena),
+        'pode_substituir': substituicao_lote(resultado['pena_final'], tabela['violento'][crime_ids])
+    })
+    return resultado
+
+
+def combinar_concurso(casos, pena_final, tipo_pena, violento, reincidente, concurso):
+    """Arts. 69 a 71 vetorizados: combina as penas dos crimes de cada caso e decide regime e substituição
+
+    Os arrays têm um elemento por crime; casos é o código do caso a que o crime pertence (ex.:
+    de pd.factorize) e concurso o código de CONCURSOS do caso, repetido em cada crime. O concurso
+    material soma as penas; o formal e o continuado aumentam a mais grave pela fração de
+    EXASPERACAO, sem passar da soma (Art. 70, parágrafo único). O tipo de pena do caso é o mais
+    grave entre os crimes, e o caso é violento ou reincidente se algum crime for.
+
+    Retorna arrays por caso, em ordem de código: caso, crimes (quantidade), concurso, pena_final
+    (em unidades, int64), tipo_pena, regime e pode_substituir.
+    """
+    casos = np.asarray(casos)
+    ordem = np.argsort(casos, kind='stable')
+    ordenados = casos[ordem]
+    inicios = np.flatnonzero(np.diff(ordenados, prepend=ordenados[:1] - 1))
+    quantidade = np.diff(np.append(inicios, len(casos)))
+    penas = np.asarray(pena_final, dtype=np.int64)[ordem]
+    soma = np.add.reduceat(penas, inicios)
+    mais_grave = np.maximum.reduceat(penas, inicios)
+    concurso = np.asarray(concurso, dtype=np.intp)[ordem][inicios]
+
+    numerador, denominador = _FRACOES_EXASPERACAO[concurso, np.minimum(quantidade, _QUANTIDADE_MAXIMA_EXASPERACAO)].T
+    combinada = np.where(concurso == MATERIAL, soma, np.minimum(mais_grave + mais_grave * numerador // denominador, soma))
+    tipo = np.minimum.reduceat(np.asarray(tipo_pena)[ordem], inicios)
+    algum_violento = np.logical_or.reduceat(np.asarray(violento, dtype=bool)[ordem], inicios)
+    algum_reincidente = np.logical_or.reduceat(np.broadcast_to(np.asarray(reincidente, dtype=bool), casos.shape)[ordem],
+                                               inicios)
+    return {
+        'caso': ordenados[inicios],
+        'crimes': quantidade,
+        'concurso': concurso,
+        'pena_final': combinada,
+        'tipo_pena': tipo,
+        'regime': regime_lote(combinada, algum_reincidente, tipo),
+        'pode_substituir': substituicao_lote(combinada, algum_violento)
+    }
+
+
+def calcular_concurso_lote(tabela, casos, concurso, crime_ids, circunstancias, n_atenuantes, n_agravantes,
+                           n_majorantes, n_minorantes, reincidente):
+    """Fases 1 a 4 de cada crime e combinação por caso (ver combinar_concurso), para casos com vários crimes
+
+    Os argumentos são por crime, como em calcular_lote, mais o código do caso e do concurso.
+    """
+    crime_ids = np.asarray(crime_ids)
+    penas = _penas_lote(tabela['pena_min'][crime_ids], tabela['pena_max'][crime_ids], circunstancias,
+                        np.asarray(n_atenuantes), np.asarray(n_agravantes), np.asarray(n_majorantes),
+                        np.asarray(n_minorantes))
+    return combinar_concurso(casos, penas['pena_final'], tabela['tipo_pena'][crime_ids],
+                             tabela['violento'][crime_ids], reincidente, concurso)
+
+
+def _tipo_penas(min_pena, n_agravantes, n_majorantes):
+    """int32, ou int64 quando a maior pena intermediária possível não cabe em int32"""
+    base = int(np.max(min_pena, initial=0)) * (5 + int(_QUINTOS_POR_NIVEL.max()))
+    aumentos = 12 + 2 * int(np.max(n_agravantes, initial=0)) + 3 * int(np.max(n_majorantes, initial=0))
+    return np.int32 if max(base, base // 5 * aumentos // 12) <= np.iinfo(np.int32).max else np.int64
+
+
+def _penas_lote(min_pena, max_pena, circunstancias, n_atenuantes, n_agravantes, n_majorantes, n_minorantes):
+    """Fases 1 a 4 vetorizadas em unidades de ponto fixo: pena_final, aplicou_sumula_231 e atingiu_minimo"""
+    tipo = _tipo_penas(min_pena, n_agravantes, n_majorantes)
+    min_pena = np.asarray(min_pena).astype(tipo, copy=False)
+    max_pena = np.asarray(max_pena).astype(tipo, copy=False)
+    pena_base_ajustada = min_pena * (5 + _QUINTOS_POR_NIVEL[np.asarray(circunstancias)]).astype(tipo, copy=False) // 5
+    fracao_16 = pena_base_ajustada // DIVISOR_ATENUANTE_AGRAVANTE
+    fracao_14 = pena_base_ajustada // DIVISOR_MAJORANTE_MINORANTE
+
+    pena, limitou_atenuantes = _reduzir_lote(pena_base_ajustada, fracao_16, min_pena, n_atenuantes)
+    pena = _aumentar_lote(pena, fracao_16, n_agravantes)
+    pena = _aumentar_lote(pena, fracao_14, n_majorantes)
+    pena, limitou_minorantes = _reduzir_lote(pena, fracao_14, min_pena, n_minorantes)
+
+    pena_final = np.maximum(min_pena, np.minimum(max_pena, pena))
+    aplicou_sumula_231 = pena < min_pena
+    pena_final = np.where(aplicou_sumula_231, min_pena, pena_final)
+    return {
+        'pena_final': pena_final,
+        'aplicou_sumula_231': aplicou_sumula_231,
+        'atingiu_minimo': limitou_atenuantes | limitou_minorantes
+    }
+
+
+def grade_cenarios(min_pena, max_pena, tipo_pena, violento, max_atenuantes, max_agravantes,
+                   max_majorantes, max_minorantes):
+    """Todas as combinações de circunstância, quantidades de modificadores e reincidência para um crime
+
+    Calcula de uma vez, com calcular_lote, a grade circunstância × atenuantes × agravantes ×
+    majorantes × minorantes × reincidência. Os arrays do resultado têm forma
+    (len(CIRCUNSTANCIAS), max_atenuantes + 1, max_agravantes + 1, max_majorantes + 1,
+    max_minorantes + 1, 2): cada índice é o nível ou a quantidade, e o último eixo indica
+    reincidência. `valido` é falso para reincidente sem agravantes, pois a reincidência é uma delas.
+    """
+    tabela = {
+        'pena_min': para_unidades([min_pena]),
+        'pena_max': para_unidades([max_pena]),
+        'tipo_pena': np.array([tipo_pena], dtype=np.int8),
+        'violento': np.array([violento], dtype=bool)
+    }
+    eixos = _eixos_cenarios(max_atenuantes, max_agravantes, max_majorantes, max_minorantes)
+    forma = np.broadcast_shapes(*(eixo.shape for eixo in eixos))
+    niveis, atenuantes, agravantes, majorantes, minorantes, reincidente = eixos
+    resultado = calcular_lote(tabela, np.zeros((1,) * len(forma), dtype=np.intp), niveis, atenuantes,
+                              agravantes, majorantes, minorantes, reincidente)
+    resultado['valido'] = ~reincidente | (agravantes > 0)
+    return {nome: np.broadcast_to(valores, forma) for nome, valores in resultado.items()}
+
+
+def _eixos_cenarios(max_atenuantes, max_agravantes, max_majorantes, max_minorantes, dimensoes_iniciais=0):
+    """Eixos esparsos da grade de cenários, precedidos de dimensoes_iniciais eixos de tamanho 1"""
+    # Cada etapa só é calculada nas dimensões de que depende (as atenuantes, por exemplo, só para
+    # circunstância × atenuantes) e o broadcasting expande o restante
+    eixos = np.meshgrid(
+        np.arange(len(CIRCUNSTANCIAS)), np.arange(max_atenuantes + 1), np.arange(max_agravantes + 1),
+        np.arange(max_majorantes + 1), np.arange(max_minorantes + 1), np.array([False, True]),
+        indexing='ij', sparse=True
+    )
+    return [eixo.reshape((1,) * dimensoes_iniciais + eixo.shape) for eixo in eixos]
+
+
+# Desfechos avaliados por varrer_perfis: os regimes (na ordem de REGIMES) e a substituição
+DESFECHOS_VARREDURA = ('fechado', 'semiaberto', 'aberto', 'substituicao')
+
+
+def varrer_perfis(tabela, max_atenuantes, max_agravantes, max_majorantes, max_minorantes, tamanho_bloco=16):
+    """Desfechos alcançáveis por cada crime de `tabela` em alguma combinação de grade_cenarios
+
+    A grade de penas é calculada uma vez por par (pena mínima, pena máxima) distinto, em blocos
+    de tamanho_bloco pares; regime e substituição são avaliados sobre ela para cada regra (reclusão
+    ou não, violento ou não). Retorna um dicionário de arrays (um valor por crime) com
+    pena_minima e pena_maxima alcançáveis e, para cada desfecho d de DESFECHOS_VARREDURA:
+    d_possivel, d_sem_atenuantes (alcançável com nenhuma atenuante) e d_min_reducoes (menor soma
+    de atenuantes e minorantes que o alcança; -1 se não é alcançável).
+    """
+    pares, par_de_cada_crime = np.unique(
+        np.column_stack([tabela['pena_min'], tabela['pena_max']]), axis=0, return_inverse=True)
+    par_de_cada_crime = par_de_cada_crime.ravel()
+    eixos = _eixos_cenarios(max_atenuantes, max_agravantes, max_majorantes, max_minorantes, dimensoes_iniciais=1)
+    niveis, atenuantes, agravantes, majorantes, minorantes, reincidente = eixos
+    valido = ~reincidente | (agravantes > 0)
+    # Eixos da grade: 1 circunstância, 2 atenuantes, 3 agravantes, 4 majorantes, 5 minorantes, 6 reincidência
+    eixos_grade = (1, 2, 3, 4, 5, 6)
+    reducoes = (atenuantes + minorantes)[0, 0, :, 0, 0, :, 0]
+    sem_reducao = np.iinfo(np.int32).max
+
+    # Resumo por par e variante da regra: regime com tipo reclusão (1) ou não (0); substituição
+    # para crime violento (1) ou não (0)
+    penas = np.empty((len(pares), 2), dtype=np.int64)
+    resumo = {desfecho: np.empty((3, len(pares), 2), dtype=np.int32) for desfecho in DESFECHOS_VARREDURA}
+    for inicio in range(0, len(pares), tamanho_bloco):
+        fim = min(inicio + tamanho_bloco, len(pares))
+        bloco = pares[inicio:fim].reshape((-1, 2) + (1,) * len(eixos))
+        pena = _penas_lote(bloco[:, 0], bloco[:, 1], niveis, atenuantes, agravantes, majorantes, minorantes)['pena_final']
+        # A pena não depende da reincidência, e sem reincidência toda combinação é válida
+        penas[inicio:fim, 0] = pena.min(axis=eixos_grade)
+        penas[inicio:fim, 1] = pena.max(axis=eixos_grade)
+
+        # Um bit por desfecho e variante (bit 4 * variante + índice em DESFECHOS_VARREDURA): uma só
+        # redução aos eixos de atenuantes × minorantes, os únicos que definem os limiares
+        bits = np.zeros(pena.shape[:-1] + (2,), dtype=np.uint8)
+        for variante in (0, 1):
+            regime = regime_lote(pena, reincidente, RECLUSAO if variante else DETENCAO)
+            bits |= np.uint8(1) << (4 * variante + regime).astype(np.uint8)
+            bits |= substituicao_lote(pena, np.bool_(variante)).astype(np.uint8) << (4 * variante + 3)
+        bits &= np.where(valido, 0xff, 0).astype(np.uint8)
+        bits = np.bitwise_or.reduce(bits, axis=(1, 3, 4, 6))
+
+        for variante in (0, 1):
+            for indice, desfecho in enumerate(DESFECHOS_VARREDURA):
+                por_reducao = (bits >> (4 * variante + indice)) & 1 == 1
+                possivel = por_reducao.any(axis=(1, 2))
+                minimo = np.where(por_reducao, reducoes, sem_reducao).min(axis=(1, 2))
+                resumo[desfecho][0, inicio:fim, variante] = possivel
+                resumo[desfecho][1, inicio:fim, variante] = por_reducao[:, 0].any(axis=1)
+                resumo[desfecho][2, inicio:fim, variante] = np.where(possivel, minimo, -1)
+
+    saida = {'pena_minima': em_anos(penas[par_de_cada_crime, 0]), 'pena_maxima': em_anos(penas[par_de_cada_crime, 1])}
+    reclusao = (np.asarray(tabela['tipo_pena']) == RECLUSAO).astype(np.intp)
+    violento = np.asarray(tabela['violento']).astype(np.intp)
+    for desfecho in DESFECHOS_VARREDURA:
+        variante = violento if desfecho == 'substituicao' else reclusao
+        possivel, sem_atenuantes, min_reducoes = resumo[desfecho][:, par_de_cada_crime, variante]
+        saida[f'{desfecho}_possivel'] = possivel.astype(bool)
+        saida[f'{desfecho}_sem_atenuantes'] = sem_atenuantes.astype(bool)
+        saida[f'{desfecho}_min_reducoes'] = min_reducoes
+    return saida
@@ -0,0 +1,348 @@
+"""Gráficos Plotly da dosimetria e a versão estática (SVG) da composição da pena para os relatórios"""
+import html
+import math
+
+import numpy as np
+import plotly.graph_objects as go
+
+
+def componentes_pena(resultado):
+    """(categoria, valor em anos, cor, texto) de cada componente da pena final, na ordem do gráfico"""
+    pena_base_inicial = resultado['pena_base_inicial']
+    pena_base_ajustada = resultado['pena_base_ajustada']
+    fator_circunstancia = resultado['fator_circunstancia']
+    circunstancia = resultado['circunstancia']
+    ajustes_atenuantes = resultado['ajustes_atenuantes']
+    ajustes_agravantes = resultado['ajustes_agravantes']
+    ajustes_majorantes = resultado['ajustes_majorantes']
+    ajustes_minorantes = resultado['ajustes_minorantes']
+
+    # Preparar dados para o gráfico de composição
+    categorias = []
+    valores = []
+    cores = []
+    textos = []
+
+    # Pena base
+    categorias.append("Pena Base")
+    valores.append(pena_base_inicial)
+    cores.append("#2196F3")
+    textos.append(f"Base: {pena_base_inicial:.1f} anos")
+
+    # Ajuste por circunstância
+    if fator_circunstancia > 0:
+        categorias.append(f"Circunstância<br>({circunstancia})")
+        valores.append(pena_base_ajustada - pena_base_inicial)
+        cores.append("#9C27B0")
+        textos.append(f"+{(pena_base_ajustada - pena_base_inicial):.1f} anos")
+
+    # Atenuantes
+    if ajustes_atenuantes:
+        categorias.append("Atenuantes")
+        valores.append(-sum(ajustes_atenuantes))
+        cores.append("#4CAF50")
+        textos.append(f"-{sum(ajustes_atenuantes):.1f} anos")
+
+    # Agravantes
+    if ajustes_agravantes:
+        categorias.append("Agravantes")
+        valores.append(sum(ajustes_agravantes))
+        cores.append("#FF9800")
+        textos.append(f"+{sum(ajustes_agravantes):.1f} anos")
+
+    # Majorantes
+    if ajustes_majorantes:
+        categorias.append("Majorantes")
+        valores.append(sum(ajustes_majorantes))
+        cores.append("#F44336")
+        textos.append(f"+{sum(ajustes_majorantes):.1f} anos")
+
+    # Minorantes
+    if ajustes_minorantes:
+        categorias.append("Minorantes")
+        valores.append(-sum(ajustes_minorantes))
+        cores.append("#00BCD4")
+        textos.append(f"-{sum(ajustes_minorantes):.1f} anos")
+
+    return list(zip(categorias, valores, cores, textos))
+
+
+def figura_composicao(resultado):
+    """Barras com o impacto de cada componente na pena final (resultado de dosimetria.calcular_caso)"""
+    min_pena = resultado['min_pena']
+    pena_final = resultado['pena_final']
+    aplicou_sumula_231 = resultado['aplicou_sumula_231']
+
+    # Criar gráfico de barras horizontal
+    fig_composicao = go.Figure()
+
+    for cat, val, cor, texto in componentes_pena(resultado):
+        fig_composicao.add_trace(go.Bar(
+            y=[cat],
+            x=[val],
+            orientation='h',
+            marker_color=cor,
+            text=[texto],
+            textposition='auto',
+            hovertemplate=f"<b>{cat}</b><br>Valor: {val:+.1f} anos<extra></extra>",
+            name=cat
+        ))
+
+    fig_composicao.update_layout(
+        title="Impacto dos Componentes na Pena Final",
+        xaxis_title="Anos de Pena",
+        yaxis_title="Componentes",
+        showlegend=False,
+        height=400,
+        plot_bgcolor='rgba(240,240,240,0.8)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(size=12),
+        margin=dict(l=50, r=50, t=80, b=50)
+    )
+
+    # Adicionar linha da pena final
+    fig_composicao.add_vline(x=pena_final, line_dash="dash", line_color="#FF5722",
+                            annotation_text=f"Pena Final: {pena_final:.1f} anos",
+                            annotation_position="top right")
+
+    # Adicionar linha do mínimo legal se aplicou Súmula 231
+    if aplicou_sumula_231:
+        fig_composicao.add_vline(x=min_pena, line_dash="dot", line_color="#FF0000",
+                                annotation_text=f"Mínimo Legal: {min_pena:.1f} anos (Súmula 231)",
+                                annotation_position="bottom right")
+
+    return fig_composicao
+
+
+# Gráfico de composição em SVG: dimensões (px) e moldes, preenchidos a cada relatório
+LARGURA_SVG = 720
+ALTURA_SVG = 400
+_MARGENS_SVG = {'esquerda': 170, 'direita': 40, 'topo': 60, 'base': 50}
+_MOLDE_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="{largura}" height="{altura}" viewBox="0 0 {largura} {altura}" '
+    'font-family="Arial, sans-serif" font-size="12">'
+    '<rect x="{x0}" y="{y0}" width="{largura_area}" height="{altura_area}" fill="#f0f0f0"/>'
+    '<text x="{meio}" y="30" text-anchor="middle" font-size="17">Impacto dos Componentes na Pena Final</text>'
+    '{grade}{barras}{linhas}'
+    '<text x="{meio_area}" y="{y_titulo_x}" text-anchor="middle">Anos de Pena</text>'
+    '</svg>'
+)
+_MOLDE_MARCA = (
+    '<line x1="{x}" y1="{y0}" x2="{x}" y2="{y1}" stroke="#ffffff"/>'
+    '<text x="{x}" y="{y_texto}" text-anchor="middle">{valor}</text>'
+)
+_MOLDE_BARRA = (
+    '<rect x="{x}" y="{y}" width="{largura}" height="{altura}" fill="{cor}"><title>{categoria}: {valor} anos</title></rect>'
+    '<text x="{x_texto}" y="{y_texto}" text-anchor="middle" fill="#ffffff">{texto}</text>'
+    '<text x="{x_categoria}" y="{y_categoria}" text-anchor="end">{linhas_categoria}</text>'
+)
+_MOLDE_LINHA_TEXTO = '<tspan x="{x}" dy="{dy}">{texto}</tspan>'
+_MOLDE_LINHA = (
+    '<line x1="{x}" y1="{y0}" x2="{x}" y2="{y1}" stroke="{cor}" stroke-width="2" stroke-dasharray="{tracejado}"/>'
+    '<text x="{x_texto}" y="{y_texto}" fill="{cor}" text-anchor="{ancora}">{texto}</text>'
+)
+
+
+def _passo_eixo(amplitude, marcas=6):
+    """Passo "redondo" (1, 2 ou 5 × 10^k) para cerca de `marcas` divisões do eixo"""
+    bruto = amplitude / marcas
+    potencia = 10 ** math.floor(math.log10(bruto))
+    return next(passo * potencia for passo in (1, 2, 5, 10) if passo * potencia >= bruto)
+
+
+def svg_composicao(resultado):
+    """Versão estática de figura_composicao em SVG (sem depender do kaleido), para os relatórios"""
+    componentes = componentes_pena(resultado)
+    pena_final = resultado['pena_final']
+    linhas = [(pena_final, "#FF5722", "6,4", f"Pena Final: {pena_final:.1f} anos")]
+    if resultado['aplicou_sumula_231']:
+        min_pena = resultado['min_pena']
+        linhas.append((min_pena, "#FF0000", "2,3", f"Mínimo Legal: {min_pena:.1f} anos (Súmula 231)"))
+
+    valores = [valor for _, valor, _, _ in componentes] + [valor for valor, _, _, _ in linhas]
+    inicio, fim = min(0, *valores), max(0, *valores)
+    passo = _passo_eixo(max(fim - inicio, 1e-9))
+    inicio, fim = math.floor(inicio / passo) * passo, math.ceil(fim / passo) * passo
+    x0, y0 = _MARGENS_SVG['esquerda'], _MARGENS_SVG['topo']
+    largura_area = LARGURA_SVG - x0 - _MARGENS_SVG['direita']
+    altura_area = ALTURA_SVG - y0 - _MARGENS_SVG['base']
+    y1 = y0 + altura_area
+
+    def posicao(valor):
+        return x0 + (valor - inicio) / (fim - inicio) * largura_area
+
+    grade = ''.join(
+        _MOLDE_MARCA.format(x=f"{posicao(valor):.1f}", y0=y0, y1=y1, y_texto=y1 + 16, valor=f"{valor:g}")
+        for valor in np.arange(inicio, fim + passo / 2, passo)
+    )
+    # Como no Plotly, o primeiro componente fica embaixo
+    faixa = altura_area / len(componentes)
+    barras = []
+    for k, (categoria, valor, cor, texto) in enumerate(componentes):
+        esquerda, direita = sorted((posicao(0), posicao(valor)))
+        y = y1 - (k + 1) * faixa + faixa * 0.1
+        # Rótulos com <br> (ex.: a circunstância) ocupam uma linha de texto por parte
+        partes = categoria.split('<br>')
+        barras.append(_MOLDE_BARRA.format(
+            x=f"{esquerda:.1f}", y=f"{y:.1f}", largura=f"{direita - esquerda:.1f}", altura=f"{faixa * 0.8:.1f}",
+            cor=cor, categoria=html.escape(' '.join(partes)), valor=f"{valor:+.1f}",
+            x_texto=f"{(esquerda + direita) / 2:.1f}", y_texto=f"{y + faixa * 0.4 + 4:.1f}", texto=html.escape(texto),
+            x_categoria=x0 - 8, y_categoria=f"{y + faixa * 0.4 + 4 - 7 * (len(partes) - 1):.1f}",
+            linhas_categoria=''.join(_MOLDE_LINHA_TEXTO.format(x=x0 - 8, dy=0 if j == 0 else 14,
+                                                                   texto=html.escape(parte))
+                                     for j, parte in enumerate(partes))))
+    marcas_linhas = ''.join(
+        _MOLDE_LINHA.format(x=f"{posicao(valor):.1f}", y0=y0, y1=y1, cor=cor, tracejado=tracejado,
+                                x_texto=f"{posicao(valor):.1f}", y_texto=y0 - 6 if k == 0 else y1 - 6,
+                                ancora='end' if posicao(valor) > x0 + largura_area / 2 else 'start',
+                                texto=html.escape(texto))
+        for k, (valor, cor, tracejado, texto) in enumerate(linhas)
+    )
+    return _MOLDE_SVG.format(
+        largura=LARGURA_SVG, altura=ALTURA_SVG, x0=x0, y0=y0, largura_area=largura_area, altura_area=altura_area,
+        meio=LARGURA_SVG // 2, meio_area=x0 + largura_area // 2, y_titulo_x=ALTURA_SVG - 12,
+        grade=grade, barras=''.join(barras), linhas=marcas_linhas)
+
+
+# Abreviações dos regimes (na ordem de dosimetria.REGIMES) exibidas nas células da grade
+SIGLAS_REGIME = ("F", "SA", "A")
+# Cores dos regimes, as mesmas dos cartões (relatorios.ESTILO_REGIME)
+CORES_REGIME = ("#ff4444", "#ffaa00", "#44cc44")
+
+
+def figura_grade(penas, regimes, substituicoes, validos):
+    """Mapa de calor da pena final por quantidade de atenuantes (linhas) e agravantes (colunas)
+
+    Cada célula mostra a sigla do regime, com "✓" quando cabe substituição; combinações
+    impossíveis (validos falso) ficam em branco.
+    """
+    penas = np.where(validos, penas, np.nan)
+    siglas = np.asarray(SIGLAS_REGIME, dtype=object)[regimes]
+    textos = np.where(validos, siglas + np.where(substituicoes, " ✓", ""), "")
+
+    fig_grade = go.Figure(go.Heatmap(
+        z=penas,
+        x=np.arange(penas.shape[1]),
+        y=np.arange(penas.shape[0]),
+        text=textos,
+        texttemplate="%{text}",
+        colorscale="YlOrRd",
+        colorbar=dict(title="Anos"),
+        hovertemplate="Atenuantes: %{y}<br>Agravantes: %{x}<br>Pena final: %{z:.2f} anos<br>Regime: %{text}<extra></extra>"
+    ))
+    fig_grade.update_layout(
+        title="Pena final e regime por quantidade de atenuantes e agravantes",
+        xaxis_title="Agravantes",
+        yaxis_title="Atenuantes",
+        height=500,
+        margin=dict(l=50, r=50, t=80, b=50)
+    )
+    return fig_grade
+
+
+# Painel de resultados em lote: cada gráfico é um único trace montado a partir de contagens já
+# agregadas (ver lote.agregar_resultados), então o custo não depende da quantidade de casos
+def figura_histograma_penas(contagens, largura_faixa, marcas=()):
+    """Barras com a quantidade de casos por faixa de pena final (a última reúne as penas acima do limite)
+
+    marcas são penas (anos) destacadas com linhas verticais, como os limites de regime e substituição.
+    """
+    contagens = np.asarray(contagens)
+    inicios = np.arange(len(contagens)) * largura_faixa
+    rotulos = [f"{inicio:g} a {inicio + largura_faixa:g} anos" for inicio in inicios[:-1]]
+    rotulos.append(f"mais de {inicios[-1]:g} anos")
+    fig = go.Figure(go.Bar(
+        x=inicios + largura_faixa / 2,
+        y=contagens,
+        width=largura_faixa,
+        customdata=rotulos,
+        marker_color="#2196F3",
+        hovertemplate="%{customdata}<br>%{y:,} casos<extra></extra>"
+    ))
+    for marca in marcas:
+        fig.add_vline(x=marca, line_dash="dash", line_color="#FF5722", annotation_text=f"{marca:g} anos")
+    fig.update_layout(
+        title="Distribuição da pena final",
+        xaxis_title="Pena final (anos; faixas até o limite inclusive)",
+        yaxis_title="Casos",
+        bargap=0,
+        height=400,
+        margin=dict(l=50, r=50, t=80, b=50)
+    )
+    return fig
+
+
+def figura_regimes_por_tipo(contagens, tipos_pena, regimes):
+    """Mapa de calor com a proporção de cada regime (colunas) dentro de cada tipo de pena (linhas)"""
+    contagens = np.asarray(contagens)
+    totais = contagens.sum(axis=1, keepdims=True)
+    proporcoes = np.divide(contagens, totais, out=np.zeros(contagens.shape), where=totais > 0) * 100
+    textos = np.char.add(np.char.add(np.char.mod('%.1f%%', proporcoes), '<br>'),
+                         np.array([f"{c:,}" for c in contagens.ravel()]).reshape(contagens.shape))
+    fig = go.Figure(go.Heatmap(
+        z=proporcoes,
+        x=list(regimes),
+        y=list(tipos_pena),
+        text=textos,
+        texttemplate="%{text}",
+        colorscale="YlOrRd",
+        zmin=0,
+        zmax=100,
+        colorbar=dict(title="%"),
+        hovertemplate="%{y}<br>%{x}: %{text}<extra></extra>"
+    ))
+    fig.update_layout(
+        title="Regime inicial por tipo de pena",
+        height=400,
+        margin=dict(l=50, r=50, t=80, b=50)
+    )
+    return fig
+
+
+def figura_taxa_por_tipo(ocorrencias, totais, tipos_pena, titulo, cor):
+    """Barras com a porcentagem de casos de cada tipo de pena em que algo ocorreu (ex.: substituição)"""
+    ocorrencias = np.asarray(ocorrencias)
+    totais = np.asarray(totais)
+    taxas = np.divide(ocorrencias, totais, out=np.zeros(len(totais)), where=totais > 0) * 100
+    fig = go.Figure(go.Bar(
+        x=list(tipos_pena),
+        y=taxas,
+        customdata=np.column_stack([ocorrencias, totais]),
+        text=[f"{taxa:.1f}%" for taxa in taxas],
+        textposition='auto',
+        marker_color=cor,
+        hovertemplate="%{x}<br>%{y:.1f}% (%{customdata[0]:,} de %{customdata[1]:,} casos)<extra></extra>"
+    ))
+    fig.update_layout(
+        title=titulo,
+        yaxis_title="% dos casos",
+        yaxis_range=[0, 100],
+        height=400,
+        margin=dict(l=50, r=50, t=80, b=50)
+    )
+    return fig
+
+
+def figura_ocupacao(ocupacao, regimes):
+    """Áreas empilhadas com a quantidade de pessoas em cada regime, mês a mês (ver progressao.ocupacao_mensal)"""
+    meses = np.arange(ocupacao.shape[1])
+    fig = go.Figure()
+    for regime, serie, cor in zip(regimes, ocupacao, CORES_REGIME):
+        fig.add_trace(go.Scatter(
+            x=meses,
+            y=serie,
+            name=regime,
+            mode='lines',
+            stackgroup='ocupacao',
+            line=dict(color=cor, width=0.5),
+            hovertemplate=f"{regime}<br>mês %{{x}}: %{{y:,}} pessoas<extra></extra>"
+        ))
+    fig.update_layout(
+        title="Ocupação projetada por regime",
+        xaxis_title="Meses desde o início da projeção",
+        yaxis_title="Pessoas",
+        hovermode="x unified",
+        height=450,
+        margin=dict(l=50, r=50, t=80, b=50)
+    )
+    return fig
@@ -0,0 +1,174 @@
+"""Tempos por fase das execuções do app, com perfil opcional (cProfile e tracemalloc)
+
+Resumo de um arquivo JSON lines gravado pelo app: python instrumentacao.py metricas.jsonl
+"""
+import argparse
+import cProfile
+import datetime
+import io
+import json
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+# Execuções guardadas por sessão e exibidas no painel de diagnóstico
+HISTORICO_EXECUCOES = 20
+# Funções listadas no resumo do cProfile (ordenadas pelo tempo acumulado)
+LINHAS_PERFIL = 25
+
+
+class MedicaoExecucao:
+    """Tempos (s) de cada fase de uma execução do script, acumulados por nome de fase
+
+    Com perfil=True a execução roda sob cProfile; com memoria=True o tracemalloc registra o
+    pico de memória alocada pelo Python durante a execução. encerrar() devolve o registro.
+    """
+
+    def __init__(self, perfil=False, memoria=False):
+        self.inicio = datetime.datetime.now().isoformat(timespec='milliseconds')
+        self.fases = {}
+        self.contexto = {}
+        self._inicio = time.perf_counter()
+        # Um perfilador já ativo nesta thread (ex.: execução interrompida por exceção) não é substituído
+        self._perfil = cProfile.Profile() if perfil and sys.getprofile() is None else None
+        # tracemalloc vale para o processo inteiro: só quem o iniciou o encerra
+        self._memoria = memoria and not tracemalloc.is_tracing()
+        if self._memoria:
+            tracemalloc.start()
+        if self._perfil is not None:
+            self._perfil.enable()
+        self._etapa = None
+        self._inicio_etapa = None
+        self.registro = None
+
+    @contextmanager
+    def fase(self, nome):
+        """Soma ao tempo da fase `nome` a duração do bloco"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, time.perf_counter() - inicio)
+
+    def etapa(self, nome=None):
+        """Encerra a etapa em andamento e, com nome, inicia a próxima (para seções consecutivas do script)"""
+        agora = time.perf_counter()
+        if self._etapa is not None:
+            self.registrar(self._etapa, agora - self._inicio_etapa)
+        self._etapa = nome
+        self._inicio_etapa = agora
+
+    def registrar(self, nome, segundos):
+        """Soma ao tempo da fase `nome` uma duração medida fora de fase() e etapa()"""
+        self.fases[nome] = self.fases.get(nome, 0) + segundos
+
+    def anotar(self, **valores):
+        """Acrescenta ao registro dados da execução (ex.: crime selecionado, acerto de cache)"""
+        self.contexto.update(valores)
+
+    def encerrar(self):
+        """Encerra a medição (uma única vez) e devolve o registro serializável em JSON"""
+        if self.registro is not None:
+            return self.registro
+        self.etapa()
+        total = time.perf_counter() - self._inicio
+        perfil = None
+        if self._perfil is not None:
+            self._perfil.disable()
+            saida = io.StringIO()
+            pstats.Stats(self._perfil, stream=saida).sort_stats('cumulative').print_stats(LINHAS_PERFIL)
+            perfil = saida.getvalue()
+        pico_memoria = None
+        if self._memoria:
+            pico_memoria = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.registro = {
+            'inicio': self.inicio,
+            'total': total,
+            'fases': dict(self.fases),
+            'outros': max(total - sum(self.fases.values()), 0),
+            'contexto': self.contexto,
+            'pico_memoria': pico_memoria,
+            'perfil': perfil
+        }
+        return self.registro
+
+
+def para_json_linhas(registros, incluir_perfil=False):
+    """Registros de execução em JSON lines (um objeto por linha)"""
+    linhas = []
+    for registro in registros:
+        if not incluir_perfil:
+            registro = {campo: valor for campo, valor in registro.items() if campo != 'perfil'}
+        linhas.append(json.dumps(registro, ensure_ascii=False, default=str))
+    return ''.join(linha + '\n' for linha in linhas)
+
+
+def gravar_json_linhas(registros, caminho, incluir_perfil=False):
+    """Acrescenta os registros ao arquivo JSON lines `caminho`"""
+    with open(caminho, 'a', encoding='utf-8') as arquivo:
+        arquivo.write(para_json_linhas(registros, incluir_perfil))
+
+
+def tabela_execucoes(registros):
+    """Linhas (uma por execução, da mais recente para a mais antiga) com os tempos em ms por fase"""
+    fases = []
+    for registro in registros:
+        fases += [fase for fase in registro['fases'] if fase not in fases]
+    linhas = []
+    for registro in reversed(registros):
+        linha = {'início': registro['inicio'][11:], 'execução': registro['contexto'].get('fragmento', 'completa'),
+                 'total (ms)': round(registro['total'] * 1000, 1)}
+        for fase in fases:
+            tempo = registro['fases'].get(fase)
+            linha[f'{fase} (ms)'] = None if tempo is None else round(tempo * 1000, 2)
+        linha['outros (ms)'] = round(registro['outros'] * 1000, 1)
+        if registro['pico_memoria'] is not None:
+            linha['pico (MB)'] = round(registro['pico_memoria'] / 2**20, 1)
+        linhas.append(linha)
+    return linhas
+
+
+def ler_json_linhas(caminho):
+    """Registros de execução gravados por gravar_json_linhas()"""
+    with open(caminho, encoding='utf-8') as arquivo:
+        return [json.loads(linha) for linha in arquivo if linha.strip()]
+
+
+def resumir(registros):
+    """Mediana, p95 e máximo (ms) de cada fase e do total sobre as execuções em que a fase ocorreu
+
+    O total das execuções de um só fragmento fica separado do das execuções completas, como
+    'total (nome do fragmento)'.
+    """
+    tempos = {'total': []}
+    for registro in registros:
+        fragmento = registro['contexto'].get('fragmento')
+        tempos.setdefault('total' if fragmento is None else f'total ({fragmento})', []).append(registro['total'])
+    for registro in registros:
+        for fase, tempo in registro['fases'].items():
+            tempos.setdefault(fase, []).append(tempo)
+    return {
+        fase: {'execucoes': len(valores), 'p50': np.percentile(valores, 50) * 1000,
+               'p95': np.percentile(valores, 95) * 1000, 'maximo': max(valores) * 1000}
+        for fase, valores in tempos.items() if valores
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('arquivo', help='JSON lines gravado pelo app (variável METRICAS_DOSIMETRIA) ou exportado do painel')
+    args = parser.parse_args(argv)
+    resumo = resumir(ler_json_linhas(args.arquivo))
+    print(f"{'fase':<24} {'execuções':>10} {'p50 (ms)':>10} {'p95 (ms)':>10} {'máx. (ms)':>10}")
+    for fase, valores in resumo.items():
+        print(f"{fase:<24} {valores['execucoes']:>10,} {valores['p50']:>10.2f} {valores['p95']:>10.2f} "
+              f"{valores['maximo']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import numpy as np
+
+
+def atualizar_ordem(ordem, ordenados, mapa, posicoes_novas, valores_novos):
+    """Ordem (posições) e valores ordenados de uma nova versão, sem reordenar as linhas mantidas
+
+    mapa dá a nova posição de cada linha antiga (-1 se removida ou alterada); as linhas em
+    posicoes_novas, com valores_novos, são inseridas por busca binária. Empates podem ficar fora
+    da ordem de posição, por isso as listas devolvidas pelos índices são sempre ordenadas.
+    """
+    novas = mapa[ordem]
+    mantidas = novas >= 0
+    ordem, ordenados = novas[mantidas], ordenados[mantidas]
+    sequencia = np.argsort(valores_novos, kind='stable')
+    valores_novos = np.asarray(valores_novos)[sequencia]
+    pontos = np.searchsorted(ordenados, valores_novos, side='right')
+    return (np.insert(ordem, pontos, np.asarray(posicoes_novas)[sequencia]).astype(np.int32),
+            np.insert(ordenados, pontos, valores_novos))
+
+
+class IndiceIntervalos:
+    """Índice de intervalos [inicio, fim] sobre dois arrays ordenados: por início e por fim
+
+    Os limites de cada consulta são localizados por busca binária: as contagens custam
+    O(log n) e as listas de posições O(log n + k), devolvidas em ordem de catálogo. Um fim
+    menor que o início é tratado como igual ao início, como no cálculo da pena (a pena final
+    nunca fica abaixo da mínima).
+    """
+
+    def __init__(self, inicios, fins):
+        self.inicios = np.asarray(inicios, dtype=float)
+        self.fins = np.maximum(self.inicios, np.asarray(fins, dtype=float))
+        self._ordem_inicios = np.argsort(self.inicios, kind='stable').astype(np.int32)
+        self._inicios_ordenados = self.inicios[self._ordem_inicios]
+        self._ordem_fins = np.argsort(self.fins, kind='stable').astype(np.int32)
+        self._fins_ordenados = self.fins[self._ordem_fins]
+
+    def atualizado(self, inicios, fins, mapa, posicoes_novas):
+        """Índice de uma nova versão com os intervalos inicios/fins, reordenando só as linhas novas
+
+        mapa dá a nova posição de cada intervalo deste índice (-1 se removido ou alterado) e
+        posicoes_novas são as linhas incluídas ou alteradas. Este índice não é alterado.
+        """
+        indice = IndiceIntervalos.__new__(IndiceIntervalos)
+        indice.inicios = np.asarray(inicios, dtype=float)
+        indice.fins = np.maximum(indice.inicios, np.asarray(fins, dtype=float))
+        indice._ordem_inicios, indice._inicios_ordenados = atualizar_ordem(
+            self._ordem_inicios, self._inicios_ordenados, mapa, posicoes_novas, indice.inicios[posicoes_novas])
+        indice._ordem_fins, indice._fins_ordenados = atualizar_ordem(
+            self._ordem_fins, self._fins_ordenados, mapa, posicoes_novas, indice.fins[posicoes_novas])
+        return indice
+
+    def __len__(self):
+        return len(self.inicios)
+
+    @staticmethod
+    def _faixa(ordenados, minimo, maximo):
+        return (np.searchsorted(ordenados, minimo, side='left'),
+                np.searchsorted(ordenados, maximo, side='right'))
+
+    def com_inicio_entre(self, minimo=-np.inf, maximo=np.inf):
+        """Posições dos intervalos com início em [minimo, maximo]"""
+        inicio, fim = self._faixa(self._inicios_ordenados, minimo, maximo)
+        return np.sort(self._ordem_inicios[inicio:fim])
+
+    def com_fim_entre(self, minimo=-np.inf, maximo=np.inf):
+        """Posições dos intervalos com fim em [minimo, maximo]"""
+        inicio, fim = self._faixa(self._fins_ordenados, minimo, maximo)
+        return np.sort(self._ordem_fins[inicio:fim])
+
+    def contar_inicio_entre(self, minimo=-np.inf, maximo=np.inf):
+        """Quantidade de intervalos com início em [minimo, maximo], sem listá-los"""
+        inicio, fim = self._faixa(self._inicios_ordenados, minimo, maximo)
+        return int(max(fim - inicio, 0))
+
+    def contar_fim_entre(self, minimo=-np.inf, maximo=np.inf):
+        """Quantidade de intervalos com fim em [minimo, maximo], sem listá-los"""
+        inicio, fim = self._faixa(self._fins_ordenados, minimo, maximo)
+        return int(max(fim - inicio, 0))
+
+    def contidos_em(self, minimo=-np.inf, maximo=np.inf):
+        """Posições dos intervalos inteiramente dentro de [minimo, maximo]"""
+        candidatos = self.com_inicio_entre(minimo, maximo)
+        return candidatos[self.fins[candidatos] <= maximo]
+
+    def _cruzando(self, maximo_inicio, minimo_fim, fim_estrito):
+        """Limites dos intervalos com início <= maximo_inicio e fim >= minimo_fim (> se fim_estrito)
+
+        Os que ficam de fora são um sufixo da ordem por início e um prefixo da ordem por fim,
+        que não se sobrepõem quando maximo_inicio >= minimo_fim.
+        """
+        ate = np.searchsorted(self._inicios_ordenados, maximo_inicio, side='right')
+        desde = np.searchsorted(self._fins_ordenados, minimo_fim, side='right' if fim_estrito else 'left')
+        return ate, desde
+
+    def _listar_cruzando(self, maximo_inicio, minimo_fim, fim_estrito):
+        ate, desde = self._cruzando(maximo_inicio, minimo_fim, fim_estrito)
+        # Filtra a menor das duas listas de candidatos pela outra condição
+        if ate <= len(self) - desde:
+            candidatos = self._ordem_inicios[:ate]
+            fins = self.fins[candidatos]
+            candidatos = candidatos[fins > minimo_fim if fim_estrito else fins >= minimo_fim]
+        else:
+            candidatos = self._ordem_fins[desde:]
+            candidatos = candidatos[self.inicios[candidatos] <= maximo_inicio]
+        return np.sort(candidatos)
+
+    def sobrepostos(self, minimo, maximo):
+        """Posições dos intervalos com algum ponto em comum com [minimo, maximo]"""
+        if minimo > maximo:
+            return self._ordem_inicios[:0]
+        return self._listar_cruzando(maximo, minimo, False)
+
+    def contar_sobrepostos(self, minimo, maximo):
+        """Quantidade de intervalos com algum ponto em comum com [minimo, maximo], sem listá-los"""
+        if minimo > maximo:
+            return 0
+        ate, desde = self._cruzando(maximo, minimo, False)
+        return int(ate - desde)
+
+    def contendo(self, valor):
+        """Posições dos intervalos que contêm valor (consulta de ponto)"""
+        return self.sobrepostos(valor, valor)
+
+    def atravessando(self, limiar):
+        """Posições dos intervalos com início <= limiar < fim
+
+        São os crimes em que a pena pode ficar de um lado ou do outro do limiar, conforme as
+        circunstâncias (ex.: limites de regime do Art. 33).
+        """
+        return self._listar_cruzando(limiar, limiar, True)
+
+    def contar_atravessando(self, limiar):
+        """Quantidade de intervalos com início <= limiar < fim, sem listá-los"""
+        ate, desde = self._cruzando(limiar, limiar, True)
+        return int(ate - desde)
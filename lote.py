@@ -0,0 +1,698 @@
+"""Cálculo da dosimetria em lote a partir de arquivos CSV (uso: python lote.py --help)
+
+O arquivo de casos deve ter as colunas:
+- crime: chave do crime, como exibida no seletor do simulador
+- circunstancia: Neutra, Desfavorável ou Gravemente Desfavorável
+- atenuantes, agravantes, majorantes, minorantes: rótulos selecionados, separados por ";"
+
+Os resultados e as mensagens de erro identificam cada linha de dados pelo número do registro (1 é a
+primeira linha depois do cabeçalho).
+
+No comando "concurso" cada linha é um crime e o arquivo tem também as colunas:
+- caso: identificador do caso; as linhas de um caso devem ser consecutivas
+- concurso (opcional): material, formal ou continuado (vazio: material), igual em todas as linhas do caso
+"""
+import argparse
+import codecs
+import html
+import io
+import math
+import os
+import sqlite3
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+import catalogo
+import dosimetria
+import graficos
+import progressao
+import relatorios
+
+COLUNAS_CASOS = ['crime', 'circunstancia', 'atenuantes', 'agravantes', 'majorantes', 'minorantes']
+COLUNAS_CONCURSO = ['caso'] + COLUNAS_CASOS
+SEPARADOR_ROTULOS = ';'
+TAMANHO_BLOCO = 50_000
+# Casos por bloco na geração de relatórios (cada relatório tem dezenas de KB)
+TAMANHO_BLOCO_RELATORIOS = 500
+# Quantidade de opções de cada lista do simulador: limites da varredura de cenários
+LIMITES_VARREDURA = {'atenuantes': 12, 'agravantes': 21, 'majorantes': 7, 'minorantes': 5}
+TABELA_VARREDURA = 'varredura'
+# Tipos das colunas do CSV de resultados lidas por ler_resultados (hediondo e inicio são opcionais)
+TIPOS_RESULTADOS = {'pena_final': pa.float64(), 'tipo_pena': pa.string(), 'regime': pa.string(),
+                    'pode_substituir': pa.bool_(), 'aplicou_sumula_231': pa.bool_(), 'hediondo': pa.bool_(),
+                    'inicio': pa.int64()}
+# Faixas (anos) do histograma de penas do painel; penas acima do limite ficam na última faixa
+FAIXA_PAINEL_ANOS = 0.5
+LIMITE_PAINEL_ANOS = 30
+
+# Um rótulo é qualquer trecho entre separadores que contenha algum caractere visível
+_PADRAO_ROTULO = rf'[^{SEPARADOR_ROTULOS}\s][^{SEPARADOR_ROTULOS}]*'
+_PADRAO_REINCIDENCIA = rf'(?:^|{SEPARADOR_ROTULOS})\s*Reincidência\s*(?:{SEPARADOR_ROTULOS}|$)'
+_NIVEIS_CIRCUNSTANCIA = {nome: nivel for nivel, nome in enumerate(dosimetria.CIRCUNSTANCIAS)}
+_CODIGOS_CONCURSO = {'': dosimetria.MATERIAL, **{nome: codigo for codigo, nome in enumerate(dosimetria.CONCURSOS)}}
+
+
+def preparar_catalogo(caminho):
+    """Lê o catálogo (CSV ou compilado); retorna (índice das chaves, tabela para calcular_lote)"""
+    if caminho.endswith(catalogo.EXTENSAO_COMPILADO):
+        compilado = catalogo.ler_compilado(caminho)
+        tabela = {nome: compilado.column(nome).to_numpy() for nome in ('tipo_pena', 'violento')}
+        for nome in ('pena_min', 'pena_max'):
+            tabela[nome] = dosimetria.para_unidades(compilado.column(nome).to_numpy())
+        return pd.Index(compilado.column('chave').to_pylist()), tabela
+    with open(caminho, 'rb') as arquivo:
+        _, crimes_dict, _ = catalogo.carregar_catalogo(arquivo.read())
+    return pd.Index(list(crimes_dict)), dosimetria.tabela_crimes(crimes_dict)
+
+
+def contar_rotulos(coluna):
+    """Quantidade de rótulos em cada célula de uma coluna de listas separadas por ';'"""
+    return coluna.str.count(_PADRAO_ROTULO).to_numpy()
+
+
+def entradas_bloco(bloco, indice_chaves):
+    """Argumentos de dosimetria.calcular_lote para cada caso do bloco e os erros de validação
+
+    Retorna (crime_ids, níveis de circunstância, atenuantes, agravantes, majorantes, minorantes,
+    reincidente) e um array com a mensagem de erro de cada caso ('' nos casos válidos); casos
+    inválidos têm crime_id ou nível -1.
+    """
+    crime_ids = indice_chaves.get_indexer(bloco['crime'])
+    niveis = bloco['circunstancia'].map(_NIVEIS_CIRCUNSTANCIA).fillna(-1).to_numpy(dtype=np.int64)
+    agravantes = bloco['agravantes']
+    entradas = (
+        crime_ids,
+        niveis,
+        contar_rotulos(bloco['atenuantes']),
+        contar_rotulos(agravantes),
+        contar_rotulos(bloco['majorantes']),
+        contar_rotulos(bloco['minorantes']),
+        agravantes.str.contains(_PADRAO_REINCIDENCIA).to_numpy()
+    )
+    erros = np.full(len(bloco), '', dtype=object)
+    erros[niveis < 0] = 'circunstância inválida'
+    erros[crime_ids < 0] = 'crime não encontrado no catálogo'
+    return entradas, erros
+
+
+def calcular_bloco(bloco, indice_chaves, tabela):
+    """Calcula as fases 1 a 7 para um bloco de casos
+
+    Retorna um DataFrame com o número do registro no arquivo de entrada (`registro`, a partir de 1),
+    a chave do crime e as colunas de resultado.
+    """
+    entradas, erros = entradas_bloco(bloco, indice_chaves)
+    validos = erros == ''
+    resultado = dosimetria.calcular_lote(tabela, *(valores[validos] for valores in entradas))
+
+    saida = pd.DataFrame({'registro': bloco.index, 'crime': bloco['crime'].to_numpy()})
+    pena_final = np.full(len(bloco), np.nan)
+    pena_final[validos] = dosimetria.em_anos(resultado['pena_final'])
+    saida['pena_final'] = pena_final
+    for coluna, rotulos in (('tipo_pena', dosimetria.TIPOS_PENA), ('regime', dosimetria.REGIMES)):
+        valores = np.full(len(bloco), '', dtype=object)
+        valores[validos] = np.asarray(rotulos, dtype=object)[resultado[coluna]]
+        saida[coluna] = valores
+    for coluna in ('pode_substituir', 'aplicou_sumula_231', 'atingiu_minimo'):
+        valores = np.zeros(len(bloco), dtype=bool)
+        valores[validos] = resultado[coluna]
+        saida[coluna] = valores
+    saida['erro'] = erros
+    return saida
+
+
+def ler_blocos(caminho, tamanho_bloco):
+    """Divide o CSV de casos em blocos de bytes com até tamanho_bloco registros cada
+
+    Cada bloco é produzido como (registros anteriores ao bloco, cabeçalho + linhas). Uma quebra de
+    linha dentro de um campo entre aspas não encerra o registro.
+    """
+    with open(caminho, 'rb') as arquivo:
+        cabecalho = arquivo.readline()
+        linhas = []
+        registros = 0
+        inicio = 0
+        aspas = 0
+        for linha in arquivo:
+            linhas.append(linha)
+            aspas += linha.count(b'"')
+            if aspas % 2:
+                continue
+            registros += 1
+            if registros == tamanho_bloco:
+                yield inicio, cabecalho + b''.join(linhas)
+                inicio += registros
+                linhas, registros = [], 0
+        if linhas:
+            yield inicio, cabecalho + b''.join(linhas)
+
+
+def ler_bloco(dados, inicio, codificacao, colunas=COLUNAS_CASOS):
+    """DataFrame (de textos) de um bloco produzido por ler_blocos, indexado pelo número do registro (a partir de 1)
+
+    Como em catalogo.ler_csv, um bloco que não decodifica na codificação detectada no início do
+    arquivo (ex.: um byte cp1252 depois de um trecho só ASCII) é lido em latin-1.
+    """
+    try:
+        bloco = pd.read_csv(io.BytesIO(dados), dtype=str, keep_default_na=False, encoding=codificacao)
+    except UnicodeDecodeError:
+        if dados.startswith(codecs.BOM_UTF8):
+            dados = dados[len(codecs.BOM_UTF8):]
+        bloco = pd.read_csv(io.BytesIO(dados), dtype=str, keep_default_na=False, encoding='latin-1')
+    bloco.index = pd.RangeIndex(inicio + 1, inicio + 1 + len(bloco))
+    return validar_bloco(bloco, colunas)
+
+
+def tarefas_do_arquivo(caminho_casos, tamanho_bloco):
+    """Blocos do arquivo de casos como (dados, início, codificação), com a codificação detectada no primeiro"""
+    blocos = ler_blocos(caminho_casos, tamanho_bloco)
+    primeiro = next(blocos, None)
+    if primeiro is None:
+        raise ValueError("Arquivo de casos vazio")
+    codificacao = catalogo.detectar_codificacao(primeiro[1])
+    yield primeiro[1], primeiro[0], codificacao
+    for inicio, dados in blocos:
+        yield dados, inicio, codificacao
+
+
+def processar_bloco(dados, inicio, codificacao, incluir_cabecalho, indice_chaves, tabela):
+    """Lê, calcula e serializa um bloco; retorna (quantidade de casos, CSV de resultados em bytes)"""
+    bloco = ler_bloco(dados, inicio, codificacao)
+    saida = calcular_bloco(bloco, indice_chaves, tabela)
+    buffer = io.BytesIO()
+    opcoes = pa_csv.WriteOptions(include_header=incluir_cabecalho)
+    pa_csv.write_csv(pa.Table.from_pandas(saida, preserve_index=False), buffer, opcoes)
+    return len(bloco), buffer.getvalue()
+
+
+def validar_bloco(bloco, colunas=COLUNAS_CASOS):
+    """Confere se o bloco de casos tem todas as colunas esperadas"""
+    faltantes = [c for c in colunas if c not in bloco.columns]
+    if faltantes:
+        raise ValueError(f"Colunas ausentes no arquivo de casos: {', '.join(faltantes)}")
+    return bloco
+
+
+# Catálogo carregado uma única vez em cada processo do pool (ver _inicializar_processo)
+_catalogo_processo = None
+
+
+def _inicializar_processo(indice_chaves, tabela):
+    global _catalogo_processo
+    _catalogo_processo = (indice_chaves, tabela)
+
+
+def _processar_no_pool(funcao, *args):
+    return funcao(*args, *_catalogo_processo)
+
+
+def _processar_em_paralelo(funcao, tarefas, indice_chaves, tabela, processos):
+    """Aplica funcao(*tarefa, indice_chaves, tabela) em processos e devolve os resultados na ordem de entrada
+
+    No máximo 2 blocos por processo ficam em andamento, o que limita a memória usada.
+    """
+    with ProcessPoolExecutor(processos, initializer=_inicializar_processo,
+                             initargs=(indice_chaves, tabela)) as pool:
+        pendentes = deque()
+        for tarefa in tarefas:
+            pendentes.append(pool.submit(_processar_no_pool, funcao, *tarefa))
+            if len(pendentes) >= 2 * processos:
+                yield pendentes.popleft().result()
+        while pendentes:
+            yield pendentes.popleft().result()
+
+
+def processar_arquivo(caminho_catalogo, caminho_casos, caminho_saida, tamanho_bloco=TAMANHO_BLOCO, processos=1):
+    """Processa o arquivo de casos bloco a bloco, gravando cada bloco assim que é calculado
+
+    Com processos > 1 os blocos são calculados em um pool de processos; a saída mantém a
+    ordem do arquivo de entrada. Retorna o total de casos processados.
+    """
+    indice_chaves, tabela = preparar_catalogo(caminho_catalogo)
+    tarefas = ((dados, inicio, codificacao, inicio == 0)
+               for dados, inicio, codificacao in tarefas_do_arquivo(caminho_casos, tamanho_bloco))
+    if processos > 1:
+        resultados = _processar_em_paralelo(processar_bloco, tarefas, indice_chaves, tabela, processos)
+    else:
+        resultados = (processar_bloco(*tarefa, indice_chaves, tabela) for tarefa in tarefas)
+
+    total = 0
+    with open(caminho_saida, 'wb') as saida:
+        for quantidade, dados in resultados:
+            saida.write(dados)
+            total += quantidade
+    return total
+
+
+def calcular_bloco_concurso(bloco, indice_chaves, tabela):
+    """Calcula cada crime do bloco e combina os crimes de cada caso (ver dosimetria.calcular_concurso_lote)
+
+    Retorna um DataFrame com uma linha por caso, na ordem do arquivo. Um caso com algum crime
+    inválido, ou com concurso inválido ou diferente entre as linhas, não é calculado e traz em
+    `erro` o primeiro problema encontrado, com o número do registro.
+    """
+    entradas, erros = entradas_bloco(bloco, indice_chaves)
+    casos, identificadores = pd.factorize(bloco['caso'])
+    if 'concurso' in bloco.columns:
+        concurso = bloco['concurso'].str.strip().str.upper().map(_CODIGOS_CONCURSO).fillna(-1).to_numpy(dtype=np.int64)
+    else:
+        concurso = np.full(len(bloco), dosimetria.MATERIAL, dtype=np.int64)
+    _, primeiras = np.unique(casos, return_index=True)
+    concurso_caso = concurso[primeiras]
+    erros[(concurso != concurso_caso[casos]) & (erros == '')] = 'concurso diferente entre os crimes do caso'
+    erros[concurso < 0] = 'concurso inválido'
+
+    invalidos = erros != ''
+    erros_caso = np.full(len(identificadores), '', dtype=object)
+    if invalidos.any():
+        mensagens = pd.Series([f"registro {registro}: {erro}"
+                               for registro, erro in zip(bloco.index[invalidos], erros[invalidos])],
+                              index=casos[invalidos])
+        primeiros = mensagens.groupby(level=0, sort=False).first()
+        erros_caso[primeiros.index.to_numpy()] = primeiros.to_numpy()
+    validos = (erros_caso == '')[casos]
+    resultado = dosimetria.calcular_concurso_lote(tabela, casos[validos], concurso[validos],
+                                                  *(valores[validos] for valores in entradas))
+
+    calculados = resultado['caso']
+    saida = pd.DataFrame({
+        'caso': np.asarray(identificadores, dtype=object),
+        'crimes': np.bincount(casos, minlength=len(identificadores)),
+        'concurso': np.where(concurso_caso >= 0, np.asarray(dosimetria.CONCURSOS, dtype=object)[concurso_caso], '')
+    })
+    pena_final = np.full(len(saida), np.nan)
+    pena_final[calculados] = dosimetria.em_anos(resultado['pena_final'])
+    saida['pena_final'] = pena_final
+    for coluna, rotulos in (('tipo_pena', dosimetria.TIPOS_PENA), ('regime', dosimetria.REGIMES)):
+        valores = np.full(len(saida), '', dtype=object)
+        valores[calculados] = np.asarray(rotulos, dtype=object)[resultado[coluna]]
+        saida[coluna] = valores
+    pode_substituir = np.zeros(len(saida), dtype=bool)
+    pode_substituir[calculados] = resultado['pode_substituir']
+    saida['pode_substituir'] = pode_substituir
+    saida['erro'] = erros_caso
+    return saida
+
+
+def blocos_por_caso(caminho_casos, tamanho_bloco):
+    """Blocos do arquivo de crimes (ver ler_bloco) sem dividir nenhum caso entre dois blocos
+
+    As linhas do último caso de cada bloco são guardadas e juntadas ao bloco seguinte.
+    """
+    pendente = None
+    for dados, inicio, codificacao in tarefas_do_arquivo(caminho_casos, tamanho_bloco):
+        bloco = ler_bloco(dados, inicio, codificacao, COLUNAS_CONCURSO)
+        if pendente is not None:
+            bloco = pd.concat([pendente, bloco])
+        if len(bloco) == 0:
+            continue
+        identificadores = bloco['caso'].to_numpy()
+        outros = np.flatnonzero(identificadores != identificadores[-1])
+        corte = int(outros[-1]) + 1 if len(outros) else 0
+        pendente = bloco.iloc[corte:]
+        if corte:
+            yield bloco.iloc[:corte]
+    if pendente is not None and len(pendente):
+        yield pendente
+
+
+def processar_arquivo_concurso(caminho_catalogo, caminho_casos, caminho_saida, tamanho_bloco=TAMANHO_BLOCO):
+    """Processa um arquivo de crimes agrupados em casos, gravando uma linha de resultado por caso
+
+    Retorna (total de crimes, total de casos).
+    """
+    indice_chaves, tabela = preparar_catalogo(caminho_catalogo)
+    crimes = casos = 0
+    with open(caminho_saida, 'wb') as saida:
+        for bloco in blocos_por_caso(caminho_casos, tamanho_bloco):
+            resultado = calcular_bloco_concurso(bloco, indice_chaves, tabela)
+            opcoes = pa_csv.WriteOptions(include_header=casos == 0)
+            pa_csv.write_csv(pa.Table.from_pandas(resultado, preserve_index=False), saida, opcoes)
+            crimes += len(bloco)
+            casos += len(resultado)
+    return crimes, casos
+
+
+def relatorios_do_bloco(dados, inicio, codificacao, documento_por_caso, indice_chaves, tabela):
+    """Lê um bloco de casos e monta o relatório HTML de cada um (ver relatorios.secao_caso)
+
+    Com documento_por_caso cada relatório é um documento HTML completo; senão, só a seção do
+    caso, para compor um único documento. Retorna [(número do registro, HTML em bytes)].
+    """
+    bloco = ler_bloco(dados, inicio, codificacao)
+    entradas, erros = entradas_bloco(bloco, indice_chaves)
+    crime_ids, niveis, *quantidades, reincidente = entradas
+    penas_min = dosimetria.em_anos(tabela['pena_min'])
+    penas_max = dosimetria.em_anos(tabela['pena_max'])
+    rotulos = bloco[['atenuantes', 'agravantes', 'majorantes', 'minorantes']].to_numpy()
+    paginas = []
+    for k, (linha, crime, circunstancia) in enumerate(zip(bloco.index, bloco['crime'], bloco['circunstancia'])):
+        if erros[k]:
+            secao = relatorios.secao_erro(linha, crime, erros[k])
+        else:
+            i = crime_ids[k]
+            chave = (float(penas_min[i]), float(penas_max[i]), int(tabela['tipo_pena'][i]), bool(tabela['violento'][i]),
+                     circunstancia, *(int(q[k]) for q in quantidades), bool(reincidente[k]))
+            secao = relatorios.secao_caso(linha, crime, circunstancia, rotulos[k], chave)
+        if documento_por_caso:
+            secao = relatorios.inicio_documento(f"Dosimetria – caso {linha}") + secao + relatorios.FIM_DOCUMENTO
+        paginas.append((linha, secao.encode('utf-8')))
+    return paginas
+
+
+def gerar_relatorios(caminho_catalogo, caminho_casos, caminho_saida, tamanho_bloco=TAMANHO_BLOCO_RELATORIOS,
+                     processos=1):
+    """Grava o relatório de cada caso em um ZIP (um HTML por caso) ou, para outras extensões, em um único HTML
+
+    Os blocos são renderizados (em um pool com processos > 1) e gravados assim que ficam
+    prontos, na ordem do arquivo de casos, de modo que a memória depende do tamanho do bloco e
+    não da quantidade de casos. Retorna o total de relatórios.
+    """
+    indice_chaves, tabela = preparar_catalogo(caminho_catalogo)
+    em_zip = caminho_saida.endswith('.zip')
+    tarefas = ((dados, inicio, codificacao, em_zip)
+               for dados, inicio, codificacao in tarefas_do_arquivo(caminho_casos, tamanho_bloco))
+    if processos > 1:
+        blocos = _processar_em_paralelo(relatorios_do_bloco, tarefas, indice_chaves, tabela, processos)
+    else:
+        blocos = (relatorios_do_bloco(*tarefa, indice_chaves, tabela) for tarefa in tarefas)
+
+    total = 0
+    if em_zip:
+        with zipfile.ZipFile(caminho_saida, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as saida:
+            for paginas in blocos:
+                for linha, pagina in paginas:
+                    saida.writestr(f'caso_{linha:08d}.html', pagina)
+                total += len(paginas)
+        return total
+    with open(caminho_saida, 'wb') as saida:
+        saida.write(relatorios.inicio_documento(f"Dosimetria – {os.path.basename(caminho_casos)}").encode('utf-8'))
+        for paginas in blocos:
+            saida.write(b''.join(pagina for _, pagina in paginas))
+            total += len(paginas)
+        saida.write(relatorios.FIM_DOCUMENTO.encode('utf-8'))
+    return total
+
+
+def varrer_catalogo(caminho_catalogo, limites=LIMITES_VARREDURA):
+    """Desfechos alcançáveis por cada crime do catálogo (ver dosimetria.varrer_perfis) em um DataFrame"""
+    indice_chaves, tabela = preparar_catalogo(caminho_catalogo)
+    varredura = dosimetria.varrer_perfis(tabela, limites['atenuantes'], limites['agravantes'],
+                                         limites['majorantes'], limites['minorantes'])
+    saida = pd.DataFrame({
+        'crime': indice_chaves.to_numpy(),
+        'tipo_pena': np.asarray(dosimetria.TIPOS_PENA, dtype=object)[tabela['tipo_pena']],
+        'violento': tabela['violento'],
+        'pena_min': dosimetria.em_anos(tabela['pena_min']),
+        'pena_max': dosimetria.em_anos(tabela['pena_max'])
+    })
+    for coluna, valores in varredura.items():
+        saida[coluna] = valores
+    return saida
+
+
+def gravar_varredura(saida, caminho):
+    """Grava a varredura em CSV ou, para outras extensões, na tabela `varredura` de um banco SQLite"""
+    if caminho.endswith('.csv'):
+        saida.to_csv(caminho, index=False)
+        return
+    with closing(sqlite3.connect(caminho)) as conexao, conexao:
+        saida.to_sql(TABELA_VARREDURA, conexao, if_exists='replace', index=False)
+        for coluna in ('crime', 'tipo_pena'):
+            conexao.execute(f'CREATE INDEX idx_{TABELA_VARREDURA}_{coluna} ON {TABELA_VARREDURA} ({coluna})')
+
+
+def consultar_varredura(caminho, onde=None):
+    """Crimes da varredura gravada em SQLite que atendem à condição SQL `onde`
+
+    `onde` é SQL bruto, inserido na cláusula WHERE sem parâmetros (uso local, por quem já tem
+    acesso ao arquivo); o banco é aberto somente para leitura.
+    """
+    consulta = f'SELECT * FROM {TABELA_VARREDURA}' + (f' WHERE {onde}' if onde else '')
+    try:
+        with closing(sqlite3.connect(Path(caminho).absolute().as_uri() + '?mode=ro', uri=True)) as conexao:
+            return pd.read_sql_query(consulta, conexao)
+    except (sqlite3.Error, pd.errors.DatabaseError) as erro:
+        raise ValueError(f"Consulta à varredura falhou: {erro}")
+
+
+def agregar_resultados(pena_final, tipo_pena, regime, pode_substituir, aplicou_sumula_231):
+    """Contagens de tamanho fixo dos casos calculados, para o painel (somáveis entre blocos)
+
+    pena_final em unidades de ponto fixo; tipo_pena e regime são códigos. As faixas do histograma
+    incluem o limite superior, de modo que uma pena de exatamente 4 ou 8 anos fica na faixa que
+    termina no limite do regime correspondente.
+    """
+    largura = dosimetria.para_unidades(FAIXA_PAINEL_ANOS)
+    n_faixas = math.ceil(LIMITE_PAINEL_ANOS / FAIXA_PAINEL_ANOS)
+    n_tipos, n_regimes = len(dosimetria.TIPOS_PENA), len(dosimetria.REGIMES)
+    faixas = np.clip((np.asarray(pena_final, dtype=np.int64) - 1) // largura, 0, n_faixas)
+    return {
+        'penas': np.bincount(faixas, minlength=n_faixas + 1),
+        'regimes': np.bincount(tipo_pena * n_regimes + regime, minlength=n_tipos * n_regimes).reshape(n_tipos, n_regimes),
+        'substituicoes': np.bincount(tipo_pena[pode_substituir], minlength=n_tipos),
+        'sumula_231': np.bincount(tipo_pena[aplicou_sumula_231], minlength=n_tipos),
+        'erros': 0
+    }
+
+
+def somar_agregados(agregados):
+    """Soma campo a campo as contagens de agregar_resultados() de vários blocos"""
+    total = None
+    for agregado in agregados:
+        total = agregado if total is None else {campo: total[campo] + valor for campo, valor in agregado.items()}
+    return total
+
+
+def ler_resultados(caminho, colunas, tamanho_bloco=TAMANHO_BLOCO):
+    """Lê as colunas pedidas do CSV gravado por "calcular", em blocos (pa.RecordBatch) só com os casos calculados
+
+    Colunas opcionais (TIPOS_RESULTADOS) ausentes do arquivo vêm nulas. Produz (bloco, casos com
+    erro no bloco); a memória depende do tamanho do bloco.
+    """
+    leitor = pa_csv.open_csv(
+        caminho,
+        read_options=pa_csv.ReadOptions(block_size=tamanho_bloco * 64),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=['pena_final'] + colunas,
+            include_missing_columns=True,
+            column_types={nome: tipo for nome, tipo in TIPOS_RESULTADOS.items() if nome in colunas or nome == 'pena_final'}
+        )
+    )
+    for bloco in leitor:
+        validos = bloco.column('pena_final').is_valid().to_numpy(zero_copy_only=False)
+        yield bloco.filter(pa.array(validos)), int((~validos).sum())
+
+
+def _codigos(coluna, rotulos):
+    """Códigos (posição em rotulos) de uma coluna de textos, ex.: tipo_pena em dosimetria.TIPOS_PENA"""
+    return pc.index_in(coluna, value_set=pa.array(rotulos)).to_numpy()
+
+
+def _logicos(coluna):
+    """Coluna booleana como array NumPy, com os valores ausentes como False"""
+    return pc.fill_null(coluna, False).to_numpy(zero_copy_only=False)
+
+
+def agregar_arquivo_resultados(caminho, tamanho_bloco=TAMANHO_BLOCO):
+    """Lê o CSV gravado por "calcular" em blocos e devolve as contagens do painel (ver agregar_resultados)
+
+    Só as colunas usadas no painel são lidas; a memória depende do tamanho do bloco.
+    """
+    def agregados():
+        for bloco, erros in ler_resultados(caminho, ['tipo_pena', 'regime', 'pode_substituir', 'aplicou_sumula_231'],
+                                           tamanho_bloco):
+            agregado = agregar_resultados(
+                dosimetria.para_unidades(bloco.column('pena_final').to_numpy()),
+                _codigos(bloco.column('tipo_pena'), dosimetria.TIPOS_PENA),
+                _codigos(bloco.column('regime'), dosimetria.REGIMES),
+                _logicos(bloco.column('pode_substituir')),
+                _logicos(bloco.column('aplicou_sumula_231'))
+            )
+            agregado['erros'] = erros
+            yield agregado
+
+    total = somar_agregados(agregados())
+    if total is None:
+        vazio = np.zeros(0, dtype=np.int64)
+        total = agregar_resultados(vazio, vazio, vazio, vazio.astype(bool), vazio.astype(bool))
+    return total
+
+
+def projetar_arquivo(caminho, meses=progressao.MESES_PROJECAO, tamanho_bloco=TAMANHO_BLOCO):
+    """Ocupação mensal por regime (ver progressao.ocupacao_mensal) dos casos do CSV gravado por "calcular"
+
+    Colunas opcionais do CSV: hediondo (true/false, progressão com 2/5) e inicio (mês em que a
+    pessoa começa a cumprir a pena; negativo se já cumpria antes do início da projeção). As
+    ocupações dos blocos são somadas.
+    """
+    ocupacao = np.zeros((len(dosimetria.REGIMES), meses), dtype=np.int64)
+    for bloco, _ in ler_resultados(caminho, ['regime', 'hediondo', 'inicio'], tamanho_bloco):
+        projecao = progressao.projetar(
+            _codigos(bloco.column('regime'), dosimetria.REGIMES),
+            dosimetria.para_unidades(bloco.column('pena_final').to_numpy()),
+            _logicos(bloco.column('hediondo')),
+            pc.fill_null(bloco.column('inicio'), 0).to_numpy()
+        )
+        ocupacao += progressao.ocupacao_mensal(projecao, meses)
+    return ocupacao
+
+
+def gravar_ocupacao(ocupacao, caminho):
+    """Grava a ocupação mensal em CSV (uma linha por mês) ou, para outras extensões, em um gráfico HTML"""
+    if caminho.endswith('.csv'):
+        saida = pd.DataFrame(ocupacao.T, columns=list(dosimetria.REGIMES))
+        saida.insert(0, 'mes', np.arange(ocupacao.shape[1]))
+        saida.to_csv(caminho, index=False)
+        return
+    graficos.figura_ocupacao(ocupacao, dosimetria.REGIMES).write_html(caminho, include_plotlyjs=True)
+
+
+def html_painel(agregado, titulo, incluir_plotlyjs=True):
+    """Página HTML do painel: totais e um gráfico de um único trace para cada contagem
+
+    O custo depende só do tamanho das contagens, não da quantidade de casos agregados. Sem
+    incluir_plotlyjs a página carrega o plotly.js da CDN.
+    """
+    totais_tipo = agregado['regimes'].sum(axis=1)
+    calculados = int(totais_tipo.sum())
+    figuras = [
+        graficos.figura_histograma_penas(agregado['penas'], FAIXA_PAINEL_ANOS,
+                                         (dosimetria.LIMITE_SEMIABERTO, dosimetria.LIMITE_FECHADO)),
+        graficos.figura_regimes_por_tipo(agregado['regimes'], dosimetria.TIPOS_PENA, dosimetria.REGIMES),
+        graficos.figura_taxa_por_tipo(agregado['substituicoes'], totais_tipo, dosimetria.TIPOS_PENA,
+                                      "Substituição por restritiva de direitos (Art. 44)", "#44cc44"),
+        graficos.figura_taxa_por_tipo(agregado['sumula_231'], totais_tipo, dosimetria.TIPOS_PENA,
+                                      "Pena limitada ao mínimo legal (Súmula 231)", "#ff4444")
+    ]
+    # O plotly.js vai uma vez, com o primeiro gráfico
+    plotlyjs = True if incluir_plotlyjs else 'cdn'
+    graficos_html = ''.join(figura.to_html(full_html=False, include_plotlyjs=plotlyjs if i == 0 else False)
+                            for i, figura in enumerate(figuras))
+    resumo = (f"<p><strong>{calculados:,}</strong> casos calculados e <strong>{agregado['erros']:,}</strong> "
+              f"com erro.</p>\n")
+    return (relatorios.inicio_documento(titulo) + f"<h1>{html.escape(titulo)}</h1>\n" + resumo + graficos_html
+            + relatorios.FIM_DOCUMENTO)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p = sub.add_parser('calcular', help='calcula pena, regime e substituição para cada caso')
+    p.add_argument('catalogo', help=f'CSV de crimes (crimes_cp_final_sem_art68.csv) ou catálogo compilado ({catalogo.EXTENSAO_COMPILADO})')
+    p.add_argument('casos', help='CSV de casos')
+    p.add_argument('-o', '--saida', required=True, help='CSV de resultados')
+    p.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO, help='linhas lidas e gravadas por vez')
+    p.add_argument('-p', '--processos', type=int, default=1, help='processos usados no cálculo (padrão: 1)')
+
+    p = sub.add_parser('concurso', help='combina os crimes de cada caso (concurso material, formal ou continuado)')
+    p.add_argument('catalogo', help=f'CSV de crimes ou catálogo compilado ({catalogo.EXTENSAO_COMPILADO})')
+    p.add_argument('casos', help='CSV de crimes com as colunas caso e concurso (uma linha por crime)')
+    p.add_argument('-o', '--saida', required=True, help='CSV de resultados (uma linha por caso)')
+    p.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO, help='linhas lidas por vez')
+
+    p = sub.add_parser('relatorios', help='relatório HTML de cada caso (com o gráfico em SVG) em um ZIP ou HTML único')
+    p.add_argument('catalogo', help=f'CSV de crimes ou catálogo compilado ({catalogo.EXTENSAO_COMPILADO})')
+    p.add_argument('casos', help='CSV de casos')
+    p.add_argument('-o', '--saida', required=True, help='arquivo .zip (um HTML por caso) ou .html (todos os casos)')
+    p.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO_RELATORIOS, help='casos renderizados por vez')
+    p.add_argument('-p', '--processos', type=int, default=1, help='processos usados na renderização (padrão: 1)')
+
+    p = sub.add_parser('painel', help='painel HTML com as distribuições de um CSV de resultados')
+    p.add_argument('resultados', help='CSV gravado por "calcular"')
+    p.add_argument('-o', '--saida', required=True, help='arquivo HTML')
+    p.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO, help='linhas lidas por vez (aproximado)')
+
+    p = sub.add_parser('projetar', help='ocupação mensal por regime com a progressão (1/6 ou 2/5) de cada caso')
+    p.add_argument('resultados', help='CSV gravado por "calcular" (colunas opcionais: hediondo, inicio em meses)')
+    p.add_argument('-o', '--saida', required=True, help='CSV (uma linha por mês) ou HTML (gráfico)')
+    p.add_argument('--meses', type=int, default=progressao.MESES_PROJECAO, help='meses projetados (padrão: %(default)s)')
+    p.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO, help='linhas lidas por vez (aproximado)')
+
+    p = sub.add_parser('compilar', help='grava o catálogo processado em formato colunar para carga rápida')
+    p.add_argument('catalogo', help='CSV de crimes')
+    p.add_argument('-o', '--saida', required=True, help=f'arquivo compilado ({catalogo.EXTENSAO_COMPILADO})')
+    p.add_argument('--termos-violencia', default=SEPARADOR_ROTULOS.join(dosimetria.CRIMES_VIOLENTOS),
+                   help='termos que classificam o crime como violento, separados por ";" (padrão: %(default)s)')
+
+    p = sub.add_parser('varrer', help='desfechos alcançáveis e limiares de cada crime do catálogo')
+    p.add_argument('catalogo', help=f'CSV de crimes ou catálogo compilado ({catalogo.EXTENSAO_COMPILADO})')
+    p.add_argument('-o', '--saida', required=True, help='banco SQLite (tabela varredura) ou CSV')
+    for nome, limite in LIMITES_VARREDURA.items():
+        p.add_argument(f'--max-{nome}', type=int, default=limite, help=f'padrão: {limite}')
+
+    p = sub.add_parser('consultar', help='consulta a varredura gravada em SQLite; resultado em CSV')
+    p.add_argument('banco', help='banco SQLite gravado por "varrer"')
+    p.add_argument('--onde', help="condição SQL bruta da cláusula WHERE (banco aberto só para leitura), ex.: "
+                                  "\"tipo_pena = 'RECLUSÃO' AND aberto_sem_atenuantes\"")
+    p.add_argument('-o', '--saida', help='CSV de resultados (padrão: saída padrão)')
+
+    args = parser.parse_args(argv)
+    # Erros nos arquivos (ex.: inexistente, sem permissão, vazio, colunas ausentes) vão para a saída de erro
+    try:
+        if args.comando == 'compilar':
+            with open(args.catalogo, 'rb') as arquivo:
+                termos = [t for t in args.termos_violencia.split(SEPARADOR_ROTULOS) if t.strip()]
+                tabela = catalogo.compilar_catalogo(arquivo.read(), termos)
+            catalogo.gravar_compilado(tabela, args.saida)
+            print(f"{tabela.num_rows:,} crimes gravados em {args.saida}", file=sys.stderr)
+        elif args.comando == 'calcular':
+            inicio = time.perf_counter()
+            total = processar_arquivo(args.catalogo, args.casos, args.saida, args.tamanho_bloco, args.processos)
+            duracao = time.perf_counter() - inicio
+            print(f"{total:,} casos em {duracao:.2f} s ({total / duracao:,.0f} linhas/s)", file=sys.stderr)
+        elif args.comando == 'concurso':
+            inicio = time.perf_counter()
+            crimes, casos = processar_arquivo_concurso(args.catalogo, args.casos, args.saida, args.tamanho_bloco)
+            duracao = time.perf_counter() - inicio
+            print(f"{crimes:,} crimes em {casos:,} casos em {duracao:.2f} s ({crimes / duracao:,.0f} crimes/s)",
+                  file=sys.stderr)
+        elif args.comando == 'relatorios':
+            inicio = time.perf_counter()
+            total = gerar_relatorios(args.catalogo, args.casos, args.saida, args.tamanho_bloco, args.processos)
+            duracao = time.perf_counter() - inicio
+            print(f"{total:,} relatórios em {duracao:.2f} s ({total / duracao:,.0f} páginas/s)", file=sys.stderr)
+        elif args.comando == 'painel':
+            inicio = time.perf_counter()
+            agregado = agregar_arquivo_resultados(args.resultados, args.tamanho_bloco)
+            with open(args.saida, 'w', encoding='utf-8') as saida:
+                saida.write(html_painel(agregado, f"Painel – {os.path.basename(args.resultados)}"))
+            duracao = time.perf_counter() - inicio
+            total = int(agregado['regimes'].sum()) + agregado['erros']
+            print(f"{total:,} resultados agregados em {duracao:.2f} s", file=sys.stderr)
+        elif args.comando == 'projetar':
+            inicio = time.perf_counter()
+            ocupacao = projetar_arquivo(args.resultados, args.meses, args.tamanho_bloco)
+            gravar_ocupacao(ocupacao, args.saida)
+            duracao = time.perf_counter() - inicio
+            print(f"{args.meses} meses projetados em {duracao:.2f} s (pico de {ocupacao.sum(axis=0).max():,} pessoas)",
+                  file=sys.stderr)
+        elif args.comando == 'varrer':
+            inicio = time.perf_counter()
+            limites = {nome: getattr(args, f'max_{nome}') for nome in LIMITES_VARREDURA}
+            saida = varrer_catalogo(args.catalogo, limites)
+            gravar_varredura(saida, args.saida)
+            duracao = time.perf_counter() - inicio
+            print(f"{len(saida):,} crimes varridos em {duracao:.2f} s", file=sys.stderr)
+        elif args.comando == 'consultar':
+            resultado = consultar_varredura(args.banco, args.onde)
+            resultado.to_csv(args.saida or sys.stdout, index=False)
+            print(f"{len(resultado):,} crimes", file=sys.stderr)
+    except (OSError, UnicodeDecodeError, ValueError) as erro:
+        parser.error(str(erro))
+
+
+if __name__ == '__main__':
+    main()
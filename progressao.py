@@ -0,0 +1,91 @@
+"""Projeção da progressão de regime (FECHADO → SEMIABERTO → ABERTO) e da ocupação mensal por regime
+
+Cada pessoa cumpre, no regime em que está, a fração da pena remanescente exigida para progredir
+(1/6 na condenação comum, 2/5 nos crimes hediondos) e então passa ao regime seguinte, até o
+término da pena. As contas são em unidades de ponto fixo (ver dosimetria.UNIDADES_POR_DIA) e
+vetorizadas sobre a coorte.
+"""
+import numpy as np
+
+import dosimetria
+
+UNIDADES_POR_MES = dosimetria.DIAS_POR_MES * dosimetria.UNIDADES_POR_DIA
+# (numerador, denominador) da fração da pena remanescente cumprida antes de cada progressão
+FRACAO_COMUM = (1, 6)
+FRACAO_HEDIONDO = (2, 5)
+# Meses projetados por padrão (20 anos)
+MESES_PROJECAO = 240
+
+
+def _fracao(pena, numerador, denominador):
+    """Fração da pena em unidades, arredondada para cima (a progressão só ocorre com a fração cumprida)"""
+    return (pena * numerador + denominador - 1) // denominador
+
+
+def projetar(regime, pena_final, hediondo=None, inicio=None):
+    """Datas de progressão e de término de cada pessoa da coorte, em unidades desde o início da projeção
+
+    regime e pena_final (em unidades) são os de dosimetria.calcular_lote; inicio é o mês em
+    que cada pessoa começa a cumprir a pena (padrão: 0; negativo para quem já cumpria pena
+    antes do início da projeção). Cada pessoa fica no FECHADO de 'inicio'
+    até 'semiaberto', no SEMIABERTO até 'aberto' e no ABERTO até 'termino'; quem começa em um
+    regime mais brando tem os anteriores vazios (mesma data de entrada e de saída).
+    """
+    regime = np.asarray(regime)
+    pena = np.asarray(pena_final, dtype=np.int64)
+    hediondo = np.zeros(len(pena), dtype=bool) if hediondo is None else np.asarray(hediondo, dtype=bool)
+    numerador = np.where(hediondo, FRACAO_HEDIONDO[0], FRACAO_COMUM[0])
+    denominador = np.where(hediondo, FRACAO_HEDIONDO[1], FRACAO_COMUM[1])
+    comeco = np.zeros(len(pena), dtype=np.int64)
+    if inicio is not None:
+        comeco = np.asarray(inicio, dtype=np.int64) * UNIDADES_POR_MES
+
+    no_fechado = np.where(regime == dosimetria.FECHADO, _fracao(pena, numerador, denominador), 0)
+    restante = pena - no_fechado
+    no_semiaberto = np.where(regime <= dosimetria.SEMIABERTO, _fracao(restante, numerador, denominador), 0)
+    return {
+        'inicio': comeco,
+        'semiaberto': comeco + no_fechado,
+        'aberto': comeco + no_fechado + no_semiaberto,
+        'termino': comeco + pena
+    }
+
+
+def _primeiro_mes(datas, meses):
+    """Primeiro mês cujo início não é anterior a cada data; datas além do horizonte ficam no mês `meses`
+    e as anteriores ao início da projeção, no mês 0
+    """
+    return np.clip(-(-datas // UNIDADES_POR_MES), 0, meses)
+
+
+def ocupacao_mensal(projecao, meses=MESES_PROJECAO):
+    """Pessoas em cada regime no início de cada mês: array (regimes, meses) na ordem de dosimetria.REGIMES
+
+    Cada permanência soma 1 no primeiro mês em que a pessoa está no regime e subtrai 1 no
+    primeiro mês em que já saiu; a ocupação é a soma acumulada. O custo é linear na coorte mais
+    a quantidade de meses, e coortes processadas em blocos podem ter as ocupações somadas.
+    """
+    datas = [projecao['inicio'], projecao['semiaberto'], projecao['aberto'], projecao['termino']]
+    ocupacao = np.empty((len(dosimetria.REGIMES), meses), dtype=np.int64)
+    for codigo, (entrada, saida) in enumerate(zip(datas[:-1], datas[1:])):
+        variacao = (np.bincount(_primeiro_mes(entrada, meses), minlength=meses + 1)
+                    - np.bincount(_primeiro_mes(saida, meses), minlength=meses + 1))
+        ocupacao[codigo] = np.cumsum(variacao)[:meses]
+    return ocupacao
+
+
+def marcos_caso(regime, pena_final):
+    """Marcos de um caso na condenação comum e em crime hediondo: [(fração, semiaberto, aberto, término)]
+
+    regime é o código (dosimetria.REGIMES) e as datas são em unidades desde o início do
+    cumprimento; a progressão para um regime que não será cumprido vem como None.
+    """
+    projecao = projetar(np.full(2, regime), np.full(2, pena_final), np.array([False, True]))
+    fracoes = [f"{numerador}/{denominador}" for numerador, denominador in (FRACAO_COMUM, FRACAO_HEDIONDO)]
+    return [
+        (fracao,
+         int(projecao['semiaberto'][k]) if regime == dosimetria.FECHADO else None,
+         int(projecao['aberto'][k]) if regime <= dosimetria.SEMIABERTO else None,
+         int(projecao['termino'][k]))
+        for k, fracao in enumerate(fracoes)
+    ]
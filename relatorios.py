@@ -0,0 +1,207 @@
+"""Relatório da dosimetria por caso em HTML (com a composição da pena em SVG) e os cartões do app
+
+Os moldes são textos fixos preenchidos com str.format. O corpo do relatório depende só das
+entradas que alteram o cálculo (ver resultados.chave_canonica) e fica em cache, de modo que
+casos com as mesmas entradas diferem apenas no cabeçalho.
+"""
+import html
+from functools import lru_cache
+
+import dosimetria
+import graficos
+
+# Corpos de relatório mantidos em cache (por processo)
+TAMANHO_CACHE = 4096
+
+ESTILO_TIPO_PENA = {
+    "RECLUSÃO": ("#ff4444", "Pena mais grave - Regimes: Fechado, Semiaberto ou Aberto"),
+    "DETENÇÃO": ("#ffaa00", "Pena menos grave - Regimes: Semiaberto ou Aberto"),
+    "PENA PRIVATIVA DE LIBERDADE": ("#666666", "Tipo de pena a ser definido conforme a natureza do crime")
+}
+ESTILO_REGIME = {
+    "FECHADO": ("#ff4444", "Presídio de segurança máxima/média"),
+    "SEMIABERTO": ("#ffaa00", "Colônia agrícola, industrial ou similar"),
+    "ABERTO": ("#44cc44", "Casa de albergado, trabalho externo")
+}
+# Cor, título e fundamento do cartão da substituição, por pode_substituir
+ESTILO_SUBSTITUICAO = {
+    True: ("#44cc44", "CABE SUBSTITUIÇÃO por pena restritiva de direitos", "Art. 44 CP - Preenchidos os requisitos legais"),
+    False: ("#ff4444", "NÃO CABE SUBSTITUIÇÃO", "Art. 44 CP - Não preenchidos os requisitos legais")
+}
+
+_CARTAO_TIPO_PENA = """
+<div style="background-color: {cor}20; padding: 15px; border-radius: 10px; border-left: 5px solid {cor};">
+    <h3 style="color: {cor}; margin: 0;">📋 TIPO DE PENA: {tipo_pena}</h3>
+    <p style="margin: 5px 0 0 0;">{descricao}</p>
+</div>
+"""
+_CARTAO_REGIME = """
+<div style="background-color: {cor}20; padding: 20px; border-radius: 10px; border-left: 5px solid {cor};">
+    <h2 style="color: {cor}; margin: 0;">🔒 REGIME {regime}</h2>
+    <p style="margin: 10px 0 0 0; font-size: 16px;"><strong>{descricao}</strong></p>
+    <p style="margin: 5px 0 0 0; font-size: 12px; color: #666;"><em>{fundamento}</em></p>
+</div>
+"""
+_CARTAO_SUBSTITUICAO = """
+<div style="background-color: {cor}20; padding: 15px; border-radius: 10px; border-left: 5px solid {cor};">
+    <h3 style="color: {cor}; margin: 0;">{titulo}</h3>
+    <p style="margin: 5px 0 0 0;">{fundamento}</p>
+</div>
+"""
+_ITEM_RESUMO = """
+        <div style="background: rgba(255,255,255,0.9); padding: 15px; border-radius: 10px; margin: 5px; min-width: 200px;">
+            <div style="font-weight: bold; color: #333; font-size: 16px;">{rotulo}</div>
+            <div style="font-size: {tamanho}px; font-weight: bold; color: {cor};">{valor}</div>
+        </div>"""
+_CARTAO_RESUMO = """
+<div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 25px; border-radius: 15px; margin: 20px 0; text-align: center; box-shadow: 0 8px 25px rgba(0,0,0,0.2);">
+    <h3 style="color: white; margin: 0 0 15px 0; font-weight: 600;">🎯 RESUMO FINAL DA DOSIMETRIA</h3>
+    <div style="display: flex; justify-content: space-around; align-items: center; flex-wrap: wrap;">{itens}
+    </div>
+    {sumula}
+</div>
+"""
+_AVISO_SUMULA_RESUMO = ("<div style='background: rgba(255,255,255,0.9); padding: 10px; border-radius: 10px; margin: 10px;'>"
+                        "<div style='font-weight: bold; color: #ff4444;'>⚠️ APLICADA SÚMULA 231 - PENA LIMITADA AO MÍNIMO LEGAL</div></div>")
+
+# Documento (um por caso no ZIP, ou um só com todos os casos) e seções de cada caso
+_ESTILO_DOCUMENTO = """
+body { font-family: Arial, sans-serif; margin: 24px; color: #222; }
+section.caso { page-break-after: always; margin-bottom: 48px; }
+table { border-collapse: collapse; margin: 12px 0; }
+th, td { border: 1px solid #ccc; padding: 4px 10px; text-align: left; }
+.sumula { background: #fff3cd; padding: 10px; border-radius: 8px; margin: 12px 0; }
+.erro { color: #b00020; }
+"""
+_INICIO_DOCUMENTO = """<!DOCTYPE html>
+<html lang="pt-BR">
+<head><meta charset="utf-8"><title>{titulo}</title><style>{estilo}</style></head>
+<body>
+"""
+FIM_DOCUMENTO = "</body>\n</html>\n"
+_SECAO_CASO = """<section class="caso" id="caso-{linha}">
+<h1>Dosimetria – caso {linha}</h1>
+<table>
+<tr><th>Crime</th><td>{crime}</td></tr>
+<tr><th>Circunstâncias (Art. 59)</th><td>{circunstancia}</td></tr>
+<tr><th>Atenuantes</th><td>{atenuantes}</td></tr>
+<tr><th>Agravantes</th><td>{agravantes}</td></tr>
+<tr><th>Majorantes</th><td>{majorantes}</td></tr>
+<tr><th>Minorantes</th><td>{minorantes}</td></tr>
+</table>
+{corpo}</section>
+"""
+_SECAO_ERRO = """<section class="caso" id="caso-{linha}">
+<h1>Dosimetria – caso {linha}</h1>
+<p><strong>Crime:</strong> {crime}</p>
+<p class="erro">Caso não calculado: {erro}</p>
+</section>
+"""
+_CORPO = """<h2>📊 Detalhamento do Cálculo</h2>
+{tabela}{sumula}
+<h2>5️⃣ Fase 5: Tipo de Pena Privativa</h2>
+{tipo_pena}
+<h2>6️⃣ Fase 6: Regime de Cumprimento</h2>
+<p>✅ <strong>Condição:</strong> {condicao}</p>
+{regime}
+<h2>7️⃣ Fase 7: Substituição por Pena Restritiva de Direitos</h2>
+{substituicao}
+<p><strong>📝 Condições analisadas para substituição:</strong></p>
+<ul>{condicoes}</ul>
+<h2>🎯 Composição da Pena Final</h2>
+{grafico}
+{resumo}"""
+_AVISO_SUMULA = ('<div class="sumula"><strong>⚠️ APLICAÇÃO DA SÚMULA 231 DO STJ</strong><br>'
+                 '<em>"A incidência da circunstância atenuante não pode conduzir à redução da pena abaixo do mínimo '
+                 'legal."</em></div>\n')
+
+
+def cartao_tipo_pena(resultado):
+    """Cartão HTML da fase 5 (tipo de pena)"""
+    cor, descricao = ESTILO_TIPO_PENA[resultado['tipo_pena']]
+    return _CARTAO_TIPO_PENA.format(cor=cor, tipo_pena=resultado['tipo_pena'], descricao=descricao)
+
+
+def cartao_regime(resultado):
+    """Cartão HTML da fase 6 (regime inicial e fundamento)"""
+    cor, descricao = ESTILO_REGIME[resultado['regime']]
+    return _CARTAO_REGIME.format(cor=cor, regime=resultado['regime'], descricao=descricao,
+                                 fundamento=resultado['fundamento_regime'])
+
+
+def cartao_substituicao(resultado):
+    """Cartão HTML da fase 7 (substituição por restritiva de direitos)"""
+    cor, titulo, fundamento = ESTILO_SUBSTITUICAO[resultado['pode_substituir']]
+    return _CARTAO_SUBSTITUICAO.format(cor=cor, titulo=titulo, fundamento=fundamento)
+
+
+def cartao_resumo(resultado):
+    """Cartão HTML do resumo final: pena, tipo de pena, regime e substituição"""
+    itens = [
+        ("Pena Final", 24, "#2196F3", dosimetria.formatar_pena(resultado['pena_final_unidades'])),
+        ("Tipo de Pena", 16, ESTILO_TIPO_PENA[resultado['tipo_pena']][0], resultado['tipo_pena']),
+        ("Regime", 16, ESTILO_REGIME[resultado['regime']][0], resultado['regime']),
+        ("Substituição", 14, *ESTILO_SUBSTITUICAO[resultado['pode_substituir']][:2])
+    ]
+    return _CARTAO_RESUMO.format(
+        itens=''.join(_ITEM_RESUMO.format(rotulo=rotulo, tamanho=tamanho, cor=cor, valor=valor)
+                      for rotulo, tamanho, cor, valor in itens),
+        sumula=_AVISO_SUMULA_RESUMO if resultado['aplicou_sumula_231'] else "")
+
+
+def tabela_html(tabela_markdown):
+    """Tabela Markdown de dosimetria.tabela_calculo convertida em HTML"""
+    linhas = [linha.strip().strip('|').split('|') for linha in tabela_markdown.strip().split('\n')]
+    cabecalho, corpo = linhas[0], linhas[2:]
+
+    def celula(texto, tag):
+        texto = html.escape(texto.strip())
+        if texto.startswith('**') and texto.endswith('**'):
+            texto = f"<strong>{texto[2:-2]}</strong>"
+        return f"<{tag}>{texto}</{tag}>"
+
+    return ('<table>\n<tr>' + ''.join(celula(c, 'th') for c in cabecalho) + '</tr>\n'
+            + ''.join('<tr>' + ''.join(celula(c, 'td') for c in linha) + '</tr>\n' for linha in corpo)
+            + '</table>\n')
+
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def corpo_relatorio(chave):
+    """Fases 1 a 7, cartões e gráfico em HTML para uma chave canônica (ver resultados.chave_canonica)
+
+    A chave traz as quantidades de rótulos, não os rótulos: (pena mínima, pena máxima, tipo de
+    pena, violento, circunstância, atenuantes, agravantes, majorantes, minorantes, reincidente).
+    """
+    resultado = dosimetria.calcular_caso(*chave)
+    return _CORPO.format(
+        tabela=tabela_html(dosimetria.tabela_calculo(resultado)),
+        sumula=_AVISO_SUMULA if resultado['aplicou_sumula_231'] else '',
+        tipo_pena=cartao_tipo_pena(resultado),
+        condicao=html.escape(resultado['condicao_regime']),
+        regime=cartao_regime(resultado),
+        substituicao=cartao_substituicao(resultado),
+        condicoes=''.join(f"<li>{html.escape(condicao)}</li>" for condicao in resultado['condicoes_substituicao']),
+        grafico=graficos.svg_composicao(resultado),
+        resumo=cartao_resumo(resultado)
+    )
+
+
+def secao_caso(linha, crime, circunstancia, rotulos, chave):
+    """Seção do relatório de um caso: entradas (rótulos como informados) e corpo_relatorio(chave)
+
+    rotulos tem os textos de atenuantes, agravantes, majorantes e minorantes, nessa ordem.
+    """
+    atenuantes, agravantes, majorantes, minorantes = (html.escape(texto) or '—' for texto in rotulos)
+    return _SECAO_CASO.format(linha=linha, crime=html.escape(crime), circunstancia=html.escape(circunstancia),
+                              atenuantes=atenuantes, agravantes=agravantes, majorantes=majorantes,
+                              minorantes=minorantes, corpo=corpo_relatorio(chave))
+
+
+def secao_erro(linha, crime, erro):
+    """Seção de um caso que não pôde ser calculado"""
+    return _SECAO_ERRO.format(linha=linha, crime=html.escape(crime), erro=html.escape(erro))
+
+
+def inicio_documento(titulo):
+    """Início de um documento HTML de relatórios; as seções vêm em seguida e depois FIM_DOCUMENTO"""
+    return _INICIO_DOCUMENTO.format(titulo=html.escape(titulo), estilo=_ESTILO_DOCUMENTO)
@@ -0,0 +1,61 @@
+"""Cache LRU dos resultados da dosimetria, indexado por uma chave canônica das entradas"""
+from functools import lru_cache
+
+import dosimetria
+import graficos
+
+# Quantidade de resultados mantidos no cache (compartilhado por todas as sessões do processo)
+TAMANHO_CACHE = 1024
+
+
+def chave_canonica(crime_info, circunstancia, atenuantes, agravantes, majorantes, minorantes):
+    """Reduz as entradas ao que altera o resultado
+
+    Do crime importam só as penas, o tipo de pena e se é violento; dos rótulos selecionados,
+    só a quantidade em cada fase e a presença de "Reincidência" entre as agravantes.
+    """
+    return chave_crime(crime_info) + (
+        circunstancia,
+        len(atenuantes),
+        len(agravantes),
+        len(majorantes),
+        len(minorantes),
+        "Reincidência" in agravantes
+    )
+
+
+def chave_crime(crime_info):
+    """Dados do crime que alteram o resultado: (pena mínima, pena máxima, tipo de pena, violento)"""
+    return (
+        float(crime_info['pena_min']),
+        float(crime_info['pena_max']),
+        dosimetria.classificar_tipo_pena(crime_info.get('tipo_penal', '')),
+        dosimetria.violento_do_crime(crime_info)
+    )
+
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def calcular(chave):
+    """Resultado, tabela do cálculo e figura para uma chave canônica
+
+    Os objetos devolvidos são compartilhados entre as chamadas e não devem ser alterados.
+    """
+    resultado = dosimetria.calcular_caso(*chave)
+    return {
+        'resultado': resultado,
+        'tabela': dosimetria.tabela_calculo(resultado),
+        'figura': graficos.figura_composicao(resultado)
+    }
+
+
+def estatisticas():
+    """Acertos, falhas, descartes e ocupação do cache"""
+    info = calcular.cache_info()
+    return {
+        'acertos': info.hits,
+        'falhas': info.misses,
+        # Toda falha insere um resultado; os que não estão mais no cache foram descartados
+        'descartes': info.misses - info.currsize,
+        'tamanho': info.currsize,
+        'capacidade': info.maxsize
+    }
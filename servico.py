@@ -0,0 +1,336 @@
+"""Serviço HTTP/JSON da dosimetria sobre o catálogo carregado uma vez (uso: python servico.py --help)
+
+Rotas:
+- GET  /saude: crimes carregados e contadores do serviço
+- POST /calcular: um caso; ex.: {"crime": "<chave>", "circunstancia": "Neutra", "atenuantes": 1,
+  "agravantes": ["Reincidência"], "majorantes": 0, "minorantes": 0}
+- POST /lote: {"casos": [caso, ...]}; cada resultado com erro traz só o campo "erro"
+- GET  /buscar?consulta=...&artigo=...&tipo_penal=...&pagina=1&tamanho=20
+
+Atenuantes, agravantes, majorantes e minorantes aceitam a lista de rótulos ou a quantidade (até
+MAXIMO_MODIFICADORES de cada).
+"reincidente" é opcional: sem ele, vale a presença de "Reincidência" na lista de agravantes.
+Pedidos de /calcular que chegam juntos são calculados em uma só chamada a calcular_lote.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import catalogo
+import dosimetria
+
+PORTA = 8000
+# Tempo que um pedido de /calcular espera por outros para formar um lote (0: sem agrupamento)
+ESPERA_AGRUPAMENTO = 0.002
+MAXIMO_AGRUPAMENTO = 4096
+# Pedidos de /lote com mais casos que isto são calculados fora do loop de eventos
+LIMITE_LOTE_NO_LOOP = 1000
+RESULTADOS_POR_PAGINA = 20
+MAXIMO_POR_PAGINA = 200
+LIMITE_CORPO = 64 * 2**20
+# Maior quantidade aceita de cada modificador: o cálculo em lote faz um passo por modificador
+MAXIMO_MODIFICADORES = 100
+
+_NIVEIS_CIRCUNSTANCIA = {nome: nivel for nivel, nome in enumerate(dosimetria.CIRCUNSTANCIAS)}
+_MODIFICADORES = ('atenuantes', 'agravantes', 'majorantes', 'minorantes')
+_TIPOS_PENA = np.asarray(dosimetria.TIPOS_PENA, dtype=object)
+_REGIMES = np.asarray(dosimetria.REGIMES, dtype=object)
+
+
+class ErroRequisicao(Exception):
+    """Pedido inválido, respondido com o status HTTP indicado"""
+
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def _quantidade(caso, campo):
+    valor = caso.get(campo, 0)
+    if isinstance(valor, list):
+        valor = len(valor)
+    elif not isinstance(valor, int) or isinstance(valor, bool) or valor < 0:
+        raise ErroRequisicao(400, f"{campo}: informe a lista de rótulos ou a quantidade")
+    if valor > MAXIMO_MODIFICADORES:
+        raise ErroRequisicao(400, f"{campo}: no máximo {MAXIMO_MODIFICADORES}")
+    return valor
+
+
+def codificar_caso(caso, crimes):
+    """Converte um caso JSON em (id do crime, circunstância, quantidades..., reincidente)"""
+    if not isinstance(caso, dict):
+        raise ErroRequisicao(400, "cada caso deve ser um objeto JSON")
+    chave = caso.get('crime')
+    if not isinstance(chave, str) or chave not in crimes:
+        raise ErroRequisicao(404, f"crime não encontrado no catálogo: {chave!r}")
+    nivel = _NIVEIS_CIRCUNSTANCIA.get(caso.get('circunstancia', dosimetria.CIRCUNSTANCIAS[0]))
+    if nivel is None:
+        raise ErroRequisicao(400, f"circunstância inválida; use uma de: {', '.join(dosimetria.CIRCUNSTANCIAS)}")
+    quantidades = [_quantidade(caso, campo) for campo in _MODIFICADORES]
+    agravantes = caso.get('agravantes')
+    reincidente = caso.get('reincidente', isinstance(agravantes, list) and 'Reincidência' in agravantes)
+    if not isinstance(reincidente, bool):
+        raise ErroRequisicao(400, "reincidente deve ser true ou false")
+    return (crimes.id(chave), nivel, *quantidades, reincidente)
+
+
+def calcular_casos(tabela, casos):
+    """Calcula casos codificados por codificar_caso() com calcular_lote; retorna uma lista de dicionários"""
+    if not casos:
+        return []
+    colunas = np.array(casos, dtype=np.int64).T
+    resultado = dosimetria.calcular_lote(tabela, colunas[0], colunas[1], colunas[2], colunas[3], colunas[4],
+                                         colunas[5], colunas[6].astype(bool))
+    campos = ('pena_final', 'tipo_pena', 'regime', 'pode_substituir', 'aplicou_sumula_231', 'atingiu_minimo')
+    valores = (
+        dosimetria.em_anos(resultado['pena_final']).tolist(),
+        _TIPOS_PENA[resultado['tipo_pena']].tolist(),
+        _REGIMES[resultado['regime']].tolist(),
+        resultado['pode_substituir'].tolist(),
+        resultado['aplicou_sumula_231'].tolist(),
+        resultado['atingiu_minimo'].tolist()
+    )
+    return [dict(zip(campos, linha)) for linha in zip(*valores)]
+
+
+class AgrupadorCalculos:
+    """Junta os casos que chegam dentro de `espera` segundos em uma só chamada a calcular_lote
+
+    Um lote é calculado quando a espera do primeiro caso termina ou quando atinge `maximo`
+    casos. Com espera 0 cada caso é calculado assim que chega.
+    """
+
+    def __init__(self, tabela, espera=ESPERA_AGRUPAMENTO, maximo=MAXIMO_AGRUPAMENTO):
+        self.tabela = tabela
+        self.espera = espera
+        self.maximo = maximo
+        self.lotes = 0
+        self.casos = 0
+        self._pendentes = []
+        self._agendado = None
+
+    def calcular(self, caso):
+        """Agenda um caso codificado; retorna um future com o resultado"""
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendentes.append((caso, futuro))
+        if self.espera <= 0 or len(self._pendentes) >= self.maximo:
+            self._executar()
+        elif self._agendado is None:
+            self._agendado = asyncio.get_running_loop().call_later(self.espera, self._executar)
+        return futuro
+
+    def _executar(self):
+        if self._agendado is not None:
+            self._agendado.cancel()
+            self._agendado = None
+        pendentes, self._pendentes = self._pendentes, []
+        try:
+            resultados = calcular_casos(self.tabela, [caso for caso, _ in pendentes])
+        except Exception as erro:
+            # Nenhum pedido do lote pode ficar sem resposta
+            for _, futuro in pendentes:
+                if not futuro.cancelled():
+                    futuro.set_exception(erro)
+            return
+        for (_, futuro), resultado in zip(pendentes, resultados):
+            if not futuro.cancelled():
+                futuro.set_result(resultado)
+        self.lotes += 1
+        self.casos += len(pendentes)
+
+
+def _json(corpo):
+    try:
+        return json.loads(corpo)
+    except (UnicodeDecodeError, json.JSONDecodeError) as erro:
+        raise ErroRequisicao(400, f"JSON inválido: {erro}")
+
+
+def _inteiro(parametros, nome, padrao, minimo, maximo):
+    try:
+        valor = int(parametros.get(nome, [padrao])[0])
+    except ValueError:
+        raise ErroRequisicao(400, f"{nome} deve ser um número inteiro")
+    return min(max(valor, minimo), maximo)
+
+
+class ServicoDosimetria:
+    """Rotas do serviço sobre um catalogo.Catalogo carregado uma vez"""
+
+    def __init__(self, base, espera=ESPERA_AGRUPAMENTO):
+        self.base = base
+        self.tabela = base.tabela_lote()
+        self.agrupador = AgrupadorCalculos(self.tabela, espera)
+        self.requisicoes = 0
+        self.inicio = time.time()
+
+    async def responder(self, metodo, caminho, corpo):
+        """Atende um pedido; retorna (status HTTP, dados JSON)"""
+        self.requisicoes += 1
+        url = urlsplit(caminho)
+        rotas = {
+            ('GET', '/saude'): self.saude,
+            ('POST', '/calcular'): self.calcular,
+            ('POST', '/lote'): self.calcular_lote,
+            ('GET', '/buscar'): self.buscar
+        }
+        try:
+            rota = rotas.get((metodo, url.path))
+            if rota is None:
+                if any(caminho_rota == url.path for _, caminho_rota in rotas):
+                    raise ErroRequisicao(405, f"método {metodo} não permitido em {url.path}")
+                raise ErroRequisicao(404, f"rota não encontrada: {url.path}")
+            return 200, await rota(url.query, corpo)
+        except ErroRequisicao as erro:
+            return erro.status, {'erro': str(erro)}
+        except Exception as erro:
+            return 500, {'erro': f"erro interno: {erro}"}
+
+    async def saude(self, consulta, corpo):
+        agrupador = self.agrupador
+        return {
+            'crimes': len(self.base.crimes),
+            'requisicoes': self.requisicoes,
+            'lotes_agrupados': agrupador.lotes,
+            'casos_agrupados': agrupador.casos,
+            'ativo_ha_s': round(time.time() - self.inicio, 1)
+        }
+
+    async def calcular(self, consulta, corpo):
+        return await self.agrupador.calcular(codificar_caso(_json(corpo), self.base.crimes))
+
+    async def calcular_lote(self, consulta, corpo):
+        dados = _json(corpo)
+        casos = dados.get('casos') if isinstance(dados, dict) else None
+        if not isinstance(casos, list):
+            raise ErroRequisicao(400, 'informe {"casos": [...]}')
+        codificados, erros = [], {}
+        for posicao, caso in enumerate(casos):
+            try:
+                codificados.append(codificar_caso(caso, self.base.crimes))
+            except ErroRequisicao as erro:
+                erros[posicao] = {'erro': str(erro)}
+        if len(codificados) > LIMITE_LOTE_NO_LOOP:
+            calculados = await asyncio.get_running_loop().run_in_executor(None, calcular_casos, self.tabela, codificados)
+        else:
+            calculados = calcular_casos(self.tabela, codificados)
+        calculados = iter(calculados)
+        return {'resultados': [erros[p] if p in erros else next(calculados) for p in range(len(casos))]}
+
+    async def buscar(self, consulta, corpo):
+        parametros = parse_qs(consulta)
+        indice = self.base.indice_busca
+        posicoes = indice.filtrar(parametros.get('consulta', [''])[0], parametros.get('artigo', [''])[0],
+                                  parametros.get('tipo_penal', [''])[0] or None)
+        tamanho = _inteiro(parametros, 'tamanho', RESULTADOS_POR_PAGINA, 1, MAXIMO_POR_PAGINA)
+        pagina = _inteiro(parametros, 'pagina', 1, 1, max(1, -(-len(posicoes) // tamanho)))
+        inicio = (pagina - 1) * tamanho
+        crimes = self.base.crimes
+        encontrados = []
+        for posicao in posicoes[inicio:inicio + tamanho].tolist():
+            registro = crimes.registro(posicao)
+            encontrados.append({
+                'crime': crimes.chaves[posicao],
+                'artigo': registro['artigo'],
+                'tipo_penal': registro['tipo_penal'],
+                'pena_min': registro['pena_min'],
+                'pena_max': registro['pena_max'],
+                'violento': registro['violento']
+            })
+        return {'total': len(posicoes), 'pagina': pagina, 'crimes': encontrados}
+
+    async def tratar_conexao(self, leitor, escritor):
+        """Atende os pedidos de uma conexão (HTTP/1.1 com keep-alive) até o cliente encerrá-la"""
+        try:
+            while True:
+                try:
+                    pedido = await _ler_pedido(leitor)
+                except ErroRequisicao as erro:
+                    escritor.write(_resposta_http(erro.status, {'erro': str(erro)}, False))
+                    break
+                if pedido is None:
+                    break
+                metodo, caminho, cabecalhos, corpo = pedido
+                status, dados = await self.responder(metodo, caminho, corpo)
+                manter = cabecalhos.get('connection', '').lower() != 'close'
+                escritor.write(_resposta_http(status, dados, manter))
+                await escritor.drain()
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+
+async def _ler_pedido(leitor):
+    """Lê um pedido HTTP; retorna (método, caminho, cabeçalhos, corpo) ou None se a conexão terminou"""
+    linha = await leitor.readline()
+    if not linha.strip():
+        return None
+    partes = linha.decode('latin-1').split()
+    if len(partes) != 3:
+        raise ErroRequisicao(400, "linha de pedido inválida")
+    metodo, caminho, _ = partes
+    cabecalhos = {}
+    while True:
+        linha = await leitor.readline()
+        if linha in (b'\r\n', b'\n', b''):
+            break
+        nome, _, valor = linha.decode('latin-1').partition(':')
+        cabecalhos[nome.strip().lower()] = valor.strip()
+    try:
+        tamanho = int(cabecalhos.get('content-length', 0))
+    except ValueError:
+        raise ErroRequisicao(400, "Content-Length inválido")
+    if tamanho > LIMITE_CORPO:
+        raise ErroRequisicao(413, f"corpo maior que {LIMITE_CORPO // 2**20} MB")
+    corpo = await leitor.readexactly(tamanho) if tamanho > 0 else b''
+    return metodo, caminho, cabecalhos, corpo
+
+
+def _resposta_http(status, dados, manter_conexao):
+    corpo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+    cabecalho = (
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(corpo)}\r\n"
+        f"Connection: {'keep-alive' if manter_conexao else 'close'}\r\n\r\n"
+    )
+    return cabecalho.encode('latin-1') + corpo
+
+
+async def servir(servico, host, porta):
+    servidor = await asyncio.start_server(servico.tratar_conexao, host, porta)
+    async with servidor:
+        await servidor.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('catalogo', help=f'catálogo compilado ({catalogo.EXTENSAO_COMPILADO}) ou CSV de crimes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=PORTA)
+    parser.add_argument('--espera-ms', type=float, default=ESPERA_AGRUPAMENTO * 1000,
+                        help='espera para agrupar pedidos de /calcular (0: sem agrupamento; padrão: %(default)s)')
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    base = catalogo.Catalogo.do_arquivo(args.catalogo)
+    servico = ServicoDosimetria(base, args.espera_ms / 1000)
+    print(f"{len(base.crimes):,} crimes carregados em {time.perf_counter() - inicio:.2f} s; "
+          f"servindo em http://{args.host}:{args.porta}", file=sys.stderr, flush=True)
+    try:
+        asyncio.run(servir(servico, args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
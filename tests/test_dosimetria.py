@@ -0,0 +1,125 @@
+"""Cálculo em ponto fixo: fronteiras de regime e substituição, cálculo individual x em lote e formatação"""
+import numpy as np
+import pytest
+
+import dosimetria
+
+# Casos nas fronteiras de 4 e 8 anos: (pena mínima em anos, circunstância, atenuantes, agravantes,
+# majorantes, minorantes, pena final exata em dias). Em float64 as penas de 4 e 8 anos saíam
+# 4.000000000000001 e 8.000000000000002, e o regime e a substituição mudavam
+CASOS_FRONTEIRA = [
+    (2, 1, 0, 4, 2, 2, 4 * 360),
+    (4, 1, 0, 4, 2, 2, 8 * 360),
+    (20 / 12, 2, 2, 3, 3, 1, 4 * 360),
+    (40 / 12, 2, 2, 3, 3, 1, 8 * 360),
+    (20 / 12, 2, 3, 6, 3, 3, 4 * 360),
+]
+PENA_MAXIMA = 20.0
+
+
+def tabela_reclusao(penas_min, penas_max, violento=False):
+    """Tabela de calcular_lote com um crime de reclusão por pena mínima (em anos)"""
+    return {
+        'pena_min': dosimetria.para_unidades(penas_min),
+        'pena_max': dosimetria.para_unidades(penas_max),
+        'tipo_pena': np.full(len(penas_min), dosimetria.RECLUSAO, dtype=np.int8),
+        'violento': np.full(len(penas_min), violento)
+    }
+
+
+def calcular_fronteira(reincidente=False, violento=False):
+    colunas = np.array(CASOS_FRONTEIRA, dtype=float).T
+    tabela = tabela_reclusao(colunas[0], np.full(len(CASOS_FRONTEIRA), PENA_MAXIMA), violento)
+    resultado = dosimetria.calcular_lote(tabela, np.arange(len(CASOS_FRONTEIRA)), colunas[1].astype(int),
+                                         *(colunas[k].astype(int) for k in range(2, 6)),
+                                         np.full(len(CASOS_FRONTEIRA), reincidente))
+    return colunas[6], resultado
+
+
+def test_penas_exatas_de_4_e_8_anos():
+    dias, resultado = calcular_fronteira()
+    assert resultado['pena_final'].tolist() == (dias * dosimetria.UNIDADES_POR_DIA).astype(int).tolist()
+
+
+def test_regime_nas_fronteiras():
+    # Reclusão: até 4 anos aberto, até 8 anos semiaberto (Art. 33, § 2º)
+    dias, resultado = calcular_fronteira()
+    esperado = np.where(dias <= 4 * 360, dosimetria.ABERTO, dosimetria.SEMIABERTO)
+    assert resultado['regime'].tolist() == esperado.tolist()
+    # O reincidente sobe um regime
+    _, reincidente = calcular_fronteira(reincidente=True)
+    assert reincidente['regime'].tolist() == (esperado - 1).tolist()
+
+
+def test_limite_da_substituicao():
+    # Art. 44, I: pena não superior a 4 anos e crime sem violência
+    dias, resultado = calcular_fronteira()
+    assert resultado['pode_substituir'].tolist() == (dias <= 4 * 360).tolist()
+    _, violento = calcular_fronteira(violento=True)
+    assert not violento['pode_substituir'].any()
+
+    limite = dosimetria.LIMITE_SUBSTITUICAO * dosimetria.UNIDADES_POR_ANO
+    assert dosimetria.analisar_substituicao(limite, False, False)[0]
+    assert not dosimetria.analisar_substituicao(limite + 1, False, False)[0]
+
+
+@pytest.mark.parametrize('caso', CASOS_FRONTEIRA)
+def test_calculo_individual_igual_ao_lote(caso):
+    tabela = tabela_reclusao([caso[0]], [PENA_MAXIMA])
+    lote = dosimetria.calcular_lote(tabela, np.array([0]), np.array([caso[1]]),
+                                    *(np.array([q]) for q in caso[2:6]), np.array([False]))
+    individual = dosimetria.calcular_caso(caso[0], PENA_MAXIMA, dosimetria.RECLUSAO, False,
+                                          dosimetria.CIRCUNSTANCIAS[caso[1]], *caso[2:6])
+    assert individual['pena_final_unidades'] == lote['pena_final'][0]
+    assert individual['regime'] == dosimetria.REGIMES[lote['regime'][0]]
+    assert individual['pode_substituir'] == lote['pode_substituir'][0]
+
+
+def test_calculo_individual_igual_ao_lote_em_casos_variados():
+    rng = np.random.default_rng(0)
+    n = 500
+    penas_min = rng.integers(1, 20 * 12, n) / 12
+    tabela = tabela_reclusao(penas_min, penas_min * 3)
+    tabela['tipo_pena'] = rng.integers(0, len(dosimetria.TIPOS_PENA), n).astype(np.int8)
+    tabela['violento'] = rng.random(n) < 0.3
+    casos = [rng.integers(0, limite, n) for limite in (3, 4, 4, 3, 3)]
+    reincidente = rng.random(n) < 0.3
+    lote = dosimetria.calcular_lote(tabela, np.arange(n), *casos, reincidente)
+    for k in range(n):
+        individual = dosimetria.calcular_caso(
+            float(penas_min[k]), float(penas_min[k] * 3), int(tabela['tipo_pena'][k]), bool(tabela['violento'][k]),
+            dosimetria.CIRCUNSTANCIAS[casos[0][k]], *(int(c[k]) for c in casos[1:]), bool(reincidente[k]))
+        assert individual['pena_final_unidades'] == lote['pena_final'][k]
+        assert individual['regime'] == dosimetria.REGIMES[lote['regime'][k]]
+        assert individual['pode_substituir'] == lote['pode_substituir'][k]
+        assert individual['aplicou_sumula_231'] == lote['aplicou_sumula_231'][k]
+
+
+def test_formatar_pena_despreza_fracoes_de_dia():
+    # Art. 11 CP: 7 dias com 1/5 a mais são 8,4 dias, exibidos como 8 dias
+    resultado = dosimetria.calcular_caso(7 / 360, 1.0, dosimetria.RECLUSAO, False, 'Desfavorável')
+    assert resultado['pena_final_unidades'] == 504
+    assert dosimetria.formatar_pena(resultado['pena_final_unidades']) == '8 dias'
+    assert dosimetria.formatar_pena(dosimetria.UNIDADES_POR_DIA - 1) == '0 dias'
+
+
+def test_formatar_pena_em_anos_meses_e_dias():
+    assert dosimetria.formatar_pena(dosimetria.para_unidades(4 + 1 / 12 + 12 / 360)) == '4 anos, 1 mês e 12 dias'
+    assert dosimetria.formatar_pena(dosimetria.para_unidades(8)) == '8 anos'
+
+
+def test_penas_fora_de_int32_passam_a_int64():
+    tabela = tabela_reclusao([50_000.0], [90_000.0])
+    resultado = dosimetria.calcular_lote(tabela, np.array([0]), np.array([2]), np.array([0]), np.array([6]),
+                                         np.array([0]), np.array([0]), np.array([False]))
+    esperado = dosimetria.calcular_caso(50_000.0, 90_000.0, dosimetria.RECLUSAO, False, 'Gravemente Desfavorável',
+                                        0, 6)['pena_final_unidades']
+    assert resultado['pena_final'].dtype == np.int64
+    assert resultado['pena_final'][0] == esperado
+
+
+def test_penas_usuais_ficam_em_int32():
+    tabela = tabela_reclusao([2.0], [PENA_MAXIMA])
+    resultado = dosimetria.calcular_lote(tabela, np.array([0]), np.array([0]), np.array([0]), np.array([2]),
+                                         np.array([1]), np.array([0]), np.array([False]))
+    assert resultado['pena_final'].dtype == np.int32